@@ -1,57 +1,25 @@
 # import necessary packages
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn import datasets
-
-
-# ensure the same random numbers appear every time
-np.random.seed(0)
-
-# display images in notebook
-plt.rcParams['figure.figsize'] = (12,12)
-
-
-# download MNIST dataset
-digits = datasets.load_digits()
-
-# define inputs and labels
-inputs = digits.images
-labels = digits.target
-
-# RGB images have a depth of 3
-# our images are grayscale so they should have a depth of 1
-inputs = inputs[:,:,:,np.newaxis]
-
-print("inputs = (n_inputs, pixel_width, pixel_height, depth) = " + str(inputs.shape))
-print("labels = (n_inputs) = " + str(labels.shape))
-
-
-# choose some random images to display
-n_inputs = len(inputs)
-indices = np.arange(n_inputs)
-random_indices = np.random.choice(indices, size=5)
-
-for i, image in enumerate(digits.images[random_indices]):
-    plt.subplot(1, 5, i+1)
-    plt.axis('off')
-    plt.imshow(image, cmap=plt.cm.gray_r, interpolation='nearest')
-    plt.title("Label: %d" % digits.target[random_indices[i]])
-plt.show()
-
 from keras.utils import to_categorical
 from sklearn.model_selection import train_test_split
 
-# representation of labels
-labels = to_categorical(labels)
+import tensorflow as tf
 
-# split into train and test data
-# one-liner from scikit-learn library
-train_size = 0.8
-test_size = 1 - train_size
-X_train, X_test, Y_train, Y_test = train_test_split(inputs, labels, train_size=train_size,
-                                                    test_size=test_size)
+from keras import backend as K
+from keras.models import Sequential
+from keras.layers.convolutional import Conv2D
+from keras.layers.convolutional import MaxPooling2D
+from keras.layers import Flatten
+from keras.layers import Dense
+from keras.regularizers import l2
+from keras.optimizers import SGD
 
-import tensorflow as tf
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../VariousCodes'))
+from gridsearch import GridSearch, print_row
 
 class ConvolutionalNeuralNetworkTensorflow:
     def __init__(
@@ -174,85 +142,21 @@ class ConvolutionalNeuralNetworkTensorflow:
                     chosen_datapoints = np.random.choice(data_indices, size=self.batch_size, replace=False)
                     batch_X, batch_Y = self.X_train[chosen_datapoints], self.Y_train[chosen_datapoints]
             
-                    sess.run([CNN.loss, CNN.optimizer],
-                        feed_dict={CNN.X: batch_X,
-                                   CNN.Y: batch_Y})
-                    accuracy = sess.run(CNN.accuracy,
-                        feed_dict={CNN.X: batch_X,
-                                   CNN.Y: batch_Y})
-                    step = sess.run(CNN.global_step)
+                    sess.run([self.loss, self.optimizer],
+                        feed_dict={self.X: batch_X,
+                                   self.Y: batch_Y})
+                    accuracy = sess.run(self.accuracy,
+                        feed_dict={self.X: batch_X,
+                                   self.Y: batch_Y})
+                    step = sess.run(self.global_step)
     
-            self.train_loss, self.train_accuracy = sess.run([CNN.loss, CNN.accuracy],
-                feed_dict={CNN.X: self.X_train,
-                           CNN.Y: self.Y_train})
-        
-            self.test_loss, self.test_accuracy = sess.run([CNN.loss, CNN.accuracy],
-                feed_dict={CNN.X: self.X_test,
-                           CNN.Y: self.Y_test})
-
-epochs = 100
-batch_size = 100
-n_filters = 10
-n_neurons_connected = 50
-n_categories = 10
-
-eta_vals = np.logspace(-5, 1, 7)
-lmbd_vals = np.logspace(-5, 1, 7)
-CNN_tf = np.zeros((len(eta_vals), len(lmbd_vals)), dtype=object)
-        
-for i, eta in enumerate(eta_vals):
-    for j, lmbd in enumerate(lmbd_vals):
-        CNN = ConvolutionalNeuralNetworkTensorflow(X_train, Y_train, X_test, Y_test,
-                                      n_filters=n_filters, n_neurons_connected=n_neurons_connected,
-                                      n_categories=n_categories, epochs=epochs, batch_size=batch_size,
-                                      eta=eta, lmbd=lmbd)
-        CNN.fit()
+            self.train_loss, self.train_accuracy = sess.run([self.loss, self.accuracy],
+                feed_dict={self.X: self.X_train,
+                           self.Y: self.Y_train})
         
-        print("Learning rate = ", eta)
-        print("Lambda = ", lmbd)
-        print("Test accuracy: %.3f" % CNN.test_accuracy)
-        print()
-            
-        CNN_tf[i][j] = CNN
-
-# visual representation of grid search
-# uses seaborn heatmap, could probably do this in matplotlib
-import seaborn as sns
-
-sns.set()
-
-train_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-test_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-
-for i in range(len(eta_vals)):
-    for j in range(len(lmbd_vals)):
-        CNN = CNN_tf[i][j]
-
-        train_accuracy[i][j] = CNN.train_accuracy
-        test_accuracy[i][j] = CNN.test_accuracy
-
-        
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(train_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Training Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
-
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Test Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
-
-from keras.models import Sequential
-from keras.layers.convolutional import Conv2D
-from keras.layers.convolutional import MaxPooling2D
-from keras.layers import Flatten
-from keras.layers import Dense
-from keras.regularizers import l2
-from keras.optimizers import SGD
+            self.test_loss, self.test_accuracy = sess.run([self.loss, self.accuracy],
+                feed_dict={self.X: self.X_test,
+                           self.Y: self.Y_test})
 
 def create_convolutional_neural_network_keras(input_shape, receptive_field,
                                               n_filters, n_neurons_connected, n_categories,
@@ -272,59 +176,113 @@ def create_convolutional_neural_network_keras(input_shape, receptive_field,
 
 epochs = 100
 batch_size = 100
-input_shape = X_train.shape[1:4]
 receptive_field = 3
 n_filters = 10
 n_neurons_connected = 50
 n_categories = 10
 
-eta_vals = np.logspace(-5, 1, 7)
-lmbd_vals = np.logspace(-5, 1, 7)
-
-CNN_keras = np.zeros((len(eta_vals), len(lmbd_vals)), dtype=object)
-        
-for i, eta in enumerate(eta_vals):
-    for j, lmbd in enumerate(lmbd_vals):
-        CNN = create_convolutional_neural_network_keras(input_shape, receptive_field,
-                                              n_filters, n_neurons_connected, n_categories,
-                                              eta, lmbd)
-        CNN.fit(X_train, Y_train, epochs=epochs, batch_size=batch_size, verbose=0)
-        scores = CNN.evaluate(X_test, Y_test)
-        
-        CNN_keras[i][j] = CNN
-        
-        print("Learning rate = ", eta)
-        print("Lambda = ", lmbd)
-        print("Test accuracy: %.3f" % scores[1])
-        print()
-
-# visual representation of grid search
-# uses seaborn heatmap, could probably do this in matplotlib
-import seaborn as sns
-
-sns.set()
-
-train_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-test_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-
-for i in range(len(eta_vals)):
-    for j in range(len(lmbd_vals)):
-        CNN = CNN_keras[i][j]
-
-        train_accuracy[i][j] = CNN.evaluate(X_train, Y_train)[1]
-        test_accuracy[i][j] = CNN.evaluate(X_test, Y_test)[1]
-
-        
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(train_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Training Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
-
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Test Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
+# every training in a graph or keras session of its own, seeded from rng
+def fit_tensorflow(data, params, budget, rng):
+    seed = rng.integers(2**31)
+    np.random.seed(seed)
+    with tf.Graph().as_default():
+        tf.set_random_seed(seed)
+        CNN = ConvolutionalNeuralNetworkTensorflow(data['X_train'], data['Y_train'], data['X_test'], data['Y_test'],
+                                      n_filters=n_filters, n_neurons_connected=n_neurons_connected,
+                                      n_categories=n_categories, epochs=budget, batch_size=batch_size,
+                                      eta=params['eta'], lmbd=params['lmbd'])
+        CNN.fit()
+    return {'train_accuracy': CNN.train_accuracy, 'test_accuracy': CNN.test_accuracy}, CNN
+
+def fit_keras(data, params, budget, rng):
+    K.clear_session()
+    seed = rng.integers(2**31)
+    np.random.seed(seed)
+    tf.set_random_seed(seed)
+    input_shape = data['X_train'].shape[1:4]
+    CNN = create_convolutional_neural_network_keras(input_shape, receptive_field,
+                                          n_filters, n_neurons_connected, n_categories,
+                                          params['eta'], params['lmbd'])
+    CNN.fit(data['X_train'], data['Y_train'], epochs=budget, batch_size=batch_size, verbose=0)
+    return {'train_accuracy': CNN.evaluate(data['X_train'], data['Y_train'], verbose=0)[1],
+            'test_accuracy': CNN.evaluate(data['X_test'], data['Y_test'], verbose=0)[1]}, CNN
+
+if __name__ == '__main__':
+    # ensure the same random numbers appear every time
+    np.random.seed(0)
+
+    # display images in notebook
+    plt.rcParams['figure.figsize'] = (12,12)
+
+
+    # download MNIST dataset
+    digits = datasets.load_digits()
+
+    # define inputs and labels
+    inputs = digits.images
+    labels = digits.target
+
+    # RGB images have a depth of 3
+    # our images are grayscale so they should have a depth of 1
+    inputs = inputs[:,:,:,np.newaxis]
+
+    print("inputs = (n_inputs, pixel_width, pixel_height, depth) = " + str(inputs.shape))
+    print("labels = (n_inputs) = " + str(labels.shape))
+
+
+    # choose some random images to display
+    n_inputs = len(inputs)
+    indices = np.arange(n_inputs)
+    random_indices = np.random.choice(indices, size=5)
+
+    for i, image in enumerate(digits.images[random_indices]):
+        plt.subplot(1, 5, i+1)
+        plt.axis('off')
+        plt.imshow(image, cmap=plt.cm.gray_r, interpolation='nearest')
+        plt.title("Label: %d" % digits.target[random_indices[i]])
+    plt.show()
+
+
+    # representation of labels
+    labels = to_categorical(labels)
+
+    # split into train and test data
+    # one-liner from scikit-learn library
+    train_size = 0.8
+    test_size = 1 - train_size
+    X_train, X_test, Y_train, Y_test = train_test_split(inputs, labels, train_size=train_size,
+                                                        test_size=test_size)
+
+    data = {'X_train': X_train, 'Y_train': Y_train, 'X_test': X_test, 'Y_test': Y_test}
+    eta_vals = np.logspace(-5, 1, 7)
+    lmbd_vals = np.logspace(-5, 1, 7)
+
+    # grid searches in a pool of processes. TensorFlow needs workers started as fresh
+    # interpreters (spawn), and the networks are only scored, not sent back (keep=0)
+    for fit in [fit_tensorflow, fit_keras]:
+        search = GridSearch(fit, {'eta': eta_vals, 'lmbd': lmbd_vals}, data, metric='test_accuracy',
+                            keep=0, budgets=[epochs], seed=0, start_method='spawn',
+                            report=print_row).run()
+
+        # visual representation of grid search
+        # uses seaborn heatmap, could probably do this in matplotlib
+        import seaborn as sns
+
+        sns.set()
+
+        train_accuracy = search.grid('train_accuracy')
+        test_accuracy = search.grid('test_accuracy')
+
+        fig, ax = plt.subplots(figsize = (10, 10))
+        sns.heatmap(train_accuracy, annot=True, ax=ax, cmap="viridis")
+        ax.set_title("Training Accuracy")
+        ax.set_ylabel("$\eta$")
+        ax.set_xlabel("$\lambda$")
+        plt.show()
+
+        fig, ax = plt.subplots(figsize = (10, 10))
+        sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
+        ax.set_title("Test Accuracy")
+        ax.set_ylabel("$\eta$")
+        ax.set_xlabel("$\lambda$")
+        plt.show()
@@ -1,3 +1,4 @@
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -7,89 +8,85 @@ import itertools
 from PIL import Image
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report,confusion_matrix,accuracy_score,roc_curve,auc
+from sklearn.metrics import classification_report,confusion_matrix,roc_curve,auc
 from sklearn.neural_network import MLPClassifier
-from sklearn.metrics import accuracy_score
+sys.path.append('../VariousCodes')
+from datacache import cached
+from gridsearch import GridSearch, print_row
 warnings.filterwarnings("ignore")
 
-# Reading data using PANDA 
-data = pd.read_csv("pulsar_stars.csv")
-data.head()
-#DATA
-targets = data["target_class"]
-features = data.drop("target_class", axis = 1)
-np.random.seed(2018)
-#Split data
-X_train, X_test, y_train, y_test = train_test_split(features, targets, test_size = 0.2, random_state = 66)
-
-
-# Define the learning rate, hyperparameter using NUMPY 
-eta_vals = np.logspace(-5, 1, 7)
-lmbd_vals = np.logspace(-5, 1, 7)
+# Defining the neural network
 n_hidden_neurons = 50
 epochs = 100
 
-# Use scikit learn for neural network 
-DNN_scikit = np.zeros((len(eta_vals), len(lmbd_vals)), dtype=object)
-for i, eta in enumerate(eta_vals):
-    for j, lmbd in enumerate(lmbd_vals):
-        dnn = MLPClassifier(hidden_layer_sizes=(n_hidden_neurons), activation='logistic',
-                            alpha=lmbd, learning_rate_init=eta, max_iter=epochs, solver='adam')
-        dnn.fit(X_train, y_train)
-        DNN_scikit[i][j] = dnn
-        print("Learning rate  = ", eta)
-        print("Lambda = ", lmbd)
-        print("Accuracy score on test set: ", dnn.score(X_test, y_test))
-        print()
+def fit_scikit(data, params, budget, rng):
+    dnn = MLPClassifier(hidden_layer_sizes=(n_hidden_neurons), activation='logistic',
+                        alpha=params['lmbd'], learning_rate_init=params['eta'], max_iter=budget,
+                        solver='adam', random_state=rng.integers(2**31))
+    dnn.fit(data['X_train'], data['y_train'])
+    return {'train_accuracy': dnn.score(data['X_train'], data['y_train']),
+            'test_accuracy': dnn.score(data['X_test'], data['y_test'])}, dnn
+
+if __name__ == '__main__':
+    # Reading data using PANDA, parsed once and then loaded from a binary cache
+    data = cached("pulsar_stars.csv", pd.read_csv)
+    data.head()
+    #DATA
+    targets = data["target_class"]
+    features = data.drop("target_class", axis = 1)
+    #Split data
+    X_train, X_test, y_train, y_test = train_test_split(features.values, targets.values, test_size = 0.2, random_state = 66)
 
-        
-#Plot the accuracy as function of learning rate and hyperparameter        
-sns.set() 
-train_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-test_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
 
-for i in range(len(eta_vals)):
-    for j in range(len(lmbd_vals)):
-        dnn = DNN_scikit[i][j]
-        train_pred = dnn.predict(X_train) 
-        test_pred = dnn.predict(X_test)
-        train_accuracy[i][j] = accuracy_score(y_train, train_pred)
-        test_accuracy[i][j] = accuracy_score(y_test, test_pred)
+    # Define the learning rate, hyperparameter using NUMPY 
+    eta_vals = np.logspace(-5, 1, 7)
+    lmbd_vals = np.logspace(-5, 1, 7)
+
+    # Use scikit learn for neural network, with the 49 models trained in a pool of processes
+    # and only the best one kept
+    search = GridSearch(fit_scikit, {'eta': eta_vals, 'lmbd': lmbd_vals},
+                        {'X_train': X_train, 'y_train': y_train, 'X_test': X_test, 'y_test': y_test},
+                        metric='test_accuracy', keep=1, budgets=[epochs], seed=2018,
+                        report=print_row).run()
+
         
-fig, ax = plt.subplots(figsize = (10, 10))        
-sns.heatmap(train_accuracy, annot=True,annot_kws={"size": 18}, ax=ax, cmap="viridis")
-ax.set_title("Training Accuracy",fontsize=18)
-ax.set_ylabel("$\eta$",fontsize=18)
-ax.set_yticklabels(eta_vals)
-ax.set_xlabel("$\lambda$",fontsize=18)
-ax.set_xticklabels(lmbd_vals)
-plt.tick_params(labelsize=18)
+    #Plot the accuracy as function of learning rate and hyperparameter        
+    sns.set() 
+    train_accuracy = search.grid('train_accuracy')
+    test_accuracy = search.grid('test_accuracy')
+        
+    fig, ax = plt.subplots(figsize = (10, 10))        
+    sns.heatmap(train_accuracy, annot=True,annot_kws={"size": 18}, ax=ax, cmap="viridis")
+    ax.set_title("Training Accuracy",fontsize=18)
+    ax.set_ylabel("$\eta$",fontsize=18)
+    ax.set_yticklabels(eta_vals)
+    ax.set_xlabel("$\lambda$",fontsize=18)
+    ax.set_xticklabels(lmbd_vals)
+    plt.tick_params(labelsize=18)
  
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(test_accuracy, annot=True,annot_kws={"size": 18}, ax=ax, cmap="viridis")
-ax.set_title("Test Accuracy",fontsize=18)
-ax.set_ylabel("$\eta$",fontsize=18)
-ax.set_yticklabels(eta_vals)
-ax.set_xlabel("$\lambda$",fontsize=18)
-ax.set_xticklabels(lmbd_vals)
-plt.tick_params(labelsize=18)
-#plt.show()        
-
-#Plot confusion matrix at optimal values of learning rate and hyperameter
-dnn = MLPClassifier(hidden_layer_sizes=(n_hidden_neurons), activation='logistic',
+    fig, ax = plt.subplots(figsize = (10, 10))
+    sns.heatmap(test_accuracy, annot=True,annot_kws={"size": 18}, ax=ax, cmap="viridis")
+    ax.set_title("Test Accuracy",fontsize=18)
+    ax.set_ylabel("$\eta$",fontsize=18)
+    ax.set_yticklabels(eta_vals)
+    ax.set_xlabel("$\lambda$",fontsize=18)
+    ax.set_xticklabels(lmbd_vals)
+    plt.tick_params(labelsize=18)
+    #plt.show()        
 
-                            alpha=0.001, learning_rate_init=0.001, max_iter=epochs, solver='adam')
-dnn.fit(X_train,y_train)
-y_pred=dnn.predict(X_test)
-fig1, ax = plt.subplots(figsize = (13,10))
-sns.heatmap(confusion_matrix(y_test,y_pred),annot=True,fmt = "d",linecolor="k",linewidths=3)
-ax.set_xlabel('True label',fontsize=18)
-ax.set_ylabel('Predicted label',fontsize=18)
-ax.set_title("CONFUSION MATRIX",fontsize=20)
-plt.tick_params(labelsize=18)
-plt.show()
+    #Plot confusion matrix at optimal values of learning rate and hyperameter
+    test_score, params, dnn = search.best[0]
+    print("Best accuracy score on test set: ", test_score, " for ", params)
+    y_pred=dnn.predict(X_test)
+    fig1, ax = plt.subplots(figsize = (13,10))
+    sns.heatmap(confusion_matrix(y_test,y_pred),annot=True,fmt = "d",linecolor="k",linewidths=3)
+    ax.set_xlabel('True label',fontsize=18)
+    ax.set_ylabel('Predicted label',fontsize=18)
+    ax.set_title("CONFUSION MATRIX",fontsize=20)
+    plt.tick_params(labelsize=18)
+    plt.show()
 
-# Feature importance -->weights
-coef=dnn.coefs_[0]
-print (coef)
+    # Feature importance -->weights
+    coef=dnn.coefs_[0]
+    print (coef)
 
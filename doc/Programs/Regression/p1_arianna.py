@@ -6,10 +6,19 @@ Created on Fri Sep 20 15:53:35 2019
 @author: Ary
 """
 
+import sys
+sys.path.append('../VariousCodes')
+from designmatrix import design_matrix
+from degreesweep import DegreeSweep
+from solvers import SVDSolver
+from ridgepath import RidgePath
+from resampling import Resampler
+from crossvalidation import complement
 import numpy as np
 import pandas as pd
 import sklearn.linear_model as skl
 from sklearn.linear_model import LinearRegression
+from sklearn.base import clone
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import math
 from sklearn.model_selection import KFold
@@ -34,16 +43,8 @@ def FrankeFunction(x,y):
     return term1 + term2 + term3 + term4
 
 def Design_Matrix_X(x, y, n):
-	N = len(x)
-	l = int((n+1)*(n+2)/2)		
-	X = np.ones((N,l))
-
-	for i in range(1,n+1):
-		q = int((i)*(i+1)/2)
-		for k in range(i+1):
-			X[:,q+k] = x**(i-k) * y**k
-
-	return X
+	# shared, cached builder from ../VariousCodes
+	return design_matrix(x, y, n)
 
 n_x=1000
 m=5
@@ -65,7 +66,8 @@ DesignMatrix = pd.DataFrame(X)
 a = np.linalg.matrix_rank(X) #we check it is not a singular matrix
 #print(a)
 
-beta = np.linalg.inv(X.T.dot(X)).dot(X.T).dot(z_1)
+solver = SVDSolver() # thin SVD of X, reused for the Ridge fits below
+beta = solver.solve(X, z_1)
 ztilde = X @ beta
 #print(beta)
 
@@ -76,7 +78,7 @@ ztilde1 = beta1.predict(X)
 #print('--')
 #print(ztilde1)
 
-var_beta_OLS = 1*np.linalg.inv(X.T.dot(X))
+var_beta_OLS = 1*solver.inv_gram(X)
 var = pd.DataFrame(var_beta_OLS)
 #print(var)
 var_diag=np.diag(var_beta_OLS)
@@ -108,9 +110,10 @@ print('Variance score: %.2f' % r2_score(z_1, ztilde))
 
 def train_test_splitdata(x_,y_,z_,i):
 
-	x_learn=np.delete(x_,i)
-	y_learn=np.delete(y_,i)
-	z_learn=np.delete(z_,i)
+	learn = complement(i, len(x_))
+	x_learn=x_[learn]
+	y_learn=y_[learn]
+	z_learn=z_[learn]
 	x_test=np.take(x_,i)
 	y_test=np.take(y_,i)
 	z_test=np.take(z_,i)
@@ -118,6 +121,8 @@ def train_test_splitdata(x_,y_,z_,i):
 	return x_learn,y_learn,z_learn,x_test,y_test,z_test
 
 def k_fold(k,x,y,z,m,model):
+    # The folds are fitted in parallel on a pool of threads (see resampling.py),
+    # each with its own copy of model
     n=len(x)
     j=np.arange(n)
     np.random.shuffle(j)
@@ -126,32 +131,28 @@ def k_fold(k,x,y,z,m,model):
     R2_K_t = 0
     Variance_t=0
     Bias_t=0
-    betas = np.zeros((k,int((m+1)*(m+2)/2)))
-    z_pred = np.zeros((200,k))
-    z_test1 = np.zeros((200,k))
-    z_train1 = np.zeros((800,k))
-    z_pred_train = np.zeros((800,k))
+
+    # the design matrix is built once, the folds only select its rows
+    X_all = Design_Matrix_X(x,y,m)
+
+    def fit_fold(data, rng, i):
+        test = j[i*n_k:(i+1)*n_k]
+        learn = complement(test, n)
+        X, z_l = X_all[learn], z[learn]
+        X_test, z_test = X_all[test], z[test]
+        beta1= clone(model).fit(X,z_l)
+        return beta1.coef_, beta1.predict(X_test), beta1.predict(X), z_test, z_l
+
+    folds = Resampler('thread', chunksize=1).run(fit_fold, k)
+    betas, z_pred, z_pred_train, z_test1, z_train1 = zip(*folds)
+    betas = np.array(betas)
+    z_pred, z_pred_train, z_test1, z_train1 = [np.stack(a, axis=1) for a in (z_pred, z_pred_train, z_test1, z_train1)]
     for i in range(k):
-        x_l,y_l,z_l,x_test,y_test,z_test=train_test_splitdata(x,y,z,j[i*n_k:(i+1)*n_k])
-        z_test1[:,i]=z_test
-        z_train1[:,i]=z_l
-        X = Design_Matrix_X(x_l,y_l,m)
-        X_test= Design_Matrix_X(x_test,y_test,m)
-        #print(pd.DataFrame(X))
-        #print(pd.DataFrame(X_test))
-        beta1= model.fit(X,z_l)
-        beta = beta1.coef_
-        print(beta[0])
-        betas[i] = beta
-        ztilde1 = beta1.predict(X_test)
-        ztilde_l = beta1.predict(X)
-        #print(ztilde1)
-        z_pred[:,i] = ztilde1
-        z_pred_train[:,i] = ztilde_l
-       # MSE_K_t+=MSE(z_test,ztilde1)
-        R2_K_t+=R2(z_test,ztilde1)
-       # Bias_t+=bias(z_test,ztilde1)
-       # Variance_t+=variance(ztilde1)
+        print(betas[i][0])
+       # MSE_K_t+=MSE(z_test1[:,i],z_pred[:,i])
+        R2_K_t+=R2(z_test1[:,i],z_pred[:,i])
+       # Bias_t+=bias(z_test1[:,i],z_pred[:,i])
+       # Variance_t+=variance(z_pred[:,i])
 # check if the values computed with our function and using the methods in lines 161-163 are the same
     #error_t = MSE_K_t/k
     #bias_t = Bias_t/k
@@ -219,29 +220,40 @@ print(r2.mean())
 maxdegree = 20
 
 def fold_degree(maxdegree,x,y,z,k):
+    # Same statistics as k_fold for every degree, but each fold keeps one DegreeSweep:
+    # going from degree p to p+1 only appends the new columns to the QR factorization
+    n=len(x)
+    j=np.arange(n)
+    np.random.shuffle(j)
+    n_k=int(n/k)
+    folds = []
+    for i in range(k):
+        test = j[i*n_k:(i+1)*n_k]
+        train = np.concatenate((j[:i*n_k], j[(i+1)*n_k:]))
+        sweep = DegreeSweep(x[train], y[train], z[train], method='qr', max_degree=maxdegree-1)
+        sweep.extend(maxdegree-1)
+        folds.append((test, train, sweep))
+
     error__t = np.zeros(maxdegree)
     bias__t = np.zeros(maxdegree)
     variance__t = np.zeros(maxdegree)
     polydegree = np.zeros(maxdegree)
     var_score__t = np.zeros(maxdegree)
     error__l = np.zeros(maxdegree)
+    z_test1 = np.stack([z[test] for test, train, sweep in folds], axis=1)
+    z_train1 = np.stack([z[train] for test, train, sweep in folds], axis=1)
     for degree in range(maxdegree):
-        #z_pred = np.empty((2000, k))
-        degree_fold = k_fold(k, x, y, z, degree, LinearRegression())
-        error_t = degree_fold[0]
-        bias_t = degree_fold[1]
-        variance_t = degree_fold[2]
-        var_score_t = degree_fold[4]
-        error_l = degree_fold[3]
+        z_pred = np.stack([sweep.predict(degree, x[test], y[test]) for test, train, sweep in folds], axis=1)
+        z_pred_train = np.stack([sweep.predict(degree) for test, train, sweep in folds], axis=1)
         polydegree[degree] = degree
-        error__t[degree] = error_t
-        bias__t[degree] = bias_t
-        variance__t[degree] = variance_t
-        var_score__t[degree] = var_score_t
-        error__l[degree] = error_l
+        error__t[degree] = np.mean(np.mean((z_test1 - z_pred)**2 , axis=1, keepdims=True))
+        bias__t[degree] = np.mean( (z_test1 - np.mean(z_pred, axis=1, keepdims=True))**2 )
+        variance__t[degree] = np.mean( (z_pred - np.mean(z_pred, axis=1, keepdims=True))**2 )
+        var_score__t[degree] = np.mean([R2(z_test1[:,i], z_pred[:,i]) for i in range(k)])
+        error__l[degree] = np.mean(np.mean((z_train1 - z_pred_train)**2 , axis=1, keepdims=True))
         print(degree)
-        print(error_t)
-        print(variance_t)
+        print(error__t[degree])
+        print(variance__t[degree])
     return (polydegree, error__t, bias__t, variance__t, var_score__t, error__l)
 
 b = fold_degree(maxdegree, x, y, z, 5)
@@ -315,7 +327,7 @@ plt.show()
 lamdas = [0.001, 0.01, 0.1, 1]
 
 for lamda in lamdas:
-    beta_r = np.linalg.inv(X.T.dot(X)+lamda*np.identity(21)).dot(X.T).dot(z_1)
+    beta_r = solver.solve(X, z_1, lamda)
     zridge = X @ beta_r
     print("Beta parameters") 
     print(beta_r)
@@ -325,7 +337,7 @@ for lamda in lamdas:
     zridge1 = clf_ridge.predict(X)
 #print(zridge1)
 
-    M = np.linalg.inv(X.T.dot(X)+lamda*np.identity(21))
+    M = solver.inv_gram(X, lamda)
     var_beta_ridge = M.dot(X.T).dot(X).dot(M.T)
     var_b_ridge = np.diag(var_beta_ridge)
     print("Variance of betas")
@@ -347,13 +359,43 @@ for lamda in lamdas:
     
 
 
+def k_fold_ridge_path(k,x,y,z,m,lamdas):
+    # k_fold with skl.Ridge(alpha=lamda) for all lamdas at once: one SVD per fold gives every lamda
+    n=len(x)
+    j=np.arange(n)
+    np.random.shuffle(j)
+    n_k=int(n/k)
+    L=len(lamdas)
+    z_pred = np.zeros((n_k,k,L))
+    z_test1 = np.zeros((n_k,k))
+    z_train1 = np.zeros((n-n_k,k))
+    z_pred_train = np.zeros((n-n_k,k,L))
+    R2_K_t = np.zeros(L)
+    for i in range(k):
+        test = j[i*n_k:(i+1)*n_k]
+        train = np.concatenate((j[:i*n_k], j[(i+1)*n_k:]))
+        path = RidgePath(Design_Matrix_X(x[train],y[train],m), z[train], lamdas, fit_intercept=True)
+        z_pred[:,i] = path.predict(Design_Matrix_X(x[test],y[test],m))
+        z_pred_train[:,i] = path.fitted()
+        z_test1[:,i] = z[test]
+        z_train1[:,i] = z[train]
+        R2_K_t += [R2(z[test],z_pred[:,i,l]) for l in range(L)]
+    results = []
+    for l in range(L):
+        error_test = np.mean(np.mean((z_test1 - z_pred[:,:,l])**2 , axis=1, keepdims=True))
+        bias___ = np.mean( (z_test1 - np.mean(z_pred[:,:,l], axis=1, keepdims=True))**2 )
+        variance___ = np.mean( (z_pred[:,:,l] - np.mean(z_pred[:,:,l], axis=1, keepdims=True))**2 )
+        error_train = np.mean(np.mean((z_train1 - z_pred_train[:,:,l])**2 , axis=1, keepdims=True))
+        results.append((error_test, bias___, variance___, error_train, R2_K_t[l]/k))
+    return results
+
 def fold_degree_r(x,y,z,k,lamdas):
     error = np.zeros(len(lamdas))
     bias = np.zeros(len(lamdas))
     variance = np.zeros(len(lamdas))
     polylamda = np.zeros(len(lamdas))
-    for lamda in lamdas: 
-        lamda_fold = k_fold(k, x, y, z, 5, skl.Ridge(alpha=lamda))
+    folds = k_fold_ridge_path(k, x, y, z, 5, lamdas)
+    for lamda, lamda_fold in zip(lamdas, folds): 
         error_ = lamda_fold[0]
         bias_ = lamda_fold[2]
         #print(bias_)
@@ -5,6 +5,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FormatStrFormatter
 from matplotlib.font_manager import FontProperties
+from bootstrap import Bootstrap
+from jackknife import mean_estimates
+from autocorrelation import Autocovariance, integrated_time
+from blocking import Blocking
+from streaming import read_chunks, memory_map, Moments, Histogram
 
 # Timing Decorator
 def timeFunction(f):
@@ -18,25 +23,39 @@ def timeFunction(f):
 
 class dataAnalysisClass:
     # General Init functions
-    def __init__(self, fileName, size=0):
+    def __init__(self, fileName, size=0, maxLag=10000):
         self.inputFileName = fileName
-        self.loadData(size)
+        self.loadData(size, maxLag)
         self.createOutputFolder()
-        self.avg = np.average(self.data)
-        self.var = np.var(self.data)
-        self.std = np.std(self.data)
-
-    def loadData(self, size=0):
-        if size != 0:
-            self.data = np.loadtxt(self.inputFileName)[0:size]
-        else:
-            self.data = np.loadtxt(self.inputFileName)
+        self.avg = self.moments.mean
+        self.var = self.moments.variance
+        self.std = np.sqrt(self.var)
+
+    # Single pass over the file in chunks, stopping after size values (see streaming.py).
+    # .npy and .bin files are memory mapped, text files are kept in memory
+    def loadData(self, size=0, maxLag=10000):
+        self.moments = Moments()
+        self.blocks = Blocking()
+        self.autocov = Autocovariance(maxLag)
+        self.hist = None
+        self.data = memory_map(self.inputFileName, size)
+        chunks = []
+        for chunk in read_chunks(self.inputFileName, size):
+            if self.hist is None:
+                self.hist = Histogram(np.std(chunk)/1000 or 1.0)
+            self.moments.update(chunk)
+            self.blocks.update(chunk)
+            self.autocov.update(chunk)
+            self.hist.update(chunk)
+            if self.data is None:
+                chunks.append(chunk)
+        if self.data is None:
+            self.data = np.concatenate(chunks)
 
     # Statistical Analysis with Multiple Methods
     def runAllAnalyses(self):
-        if len(self.data) <= 100000:
-            print "Autocorrelation..."
-            self.autocorrelation()
+        print "Autocorrelation..."
+        self.autocorrelation()
         print "Bootstrap..."
         self.bootstrap()
         print "Jackknife..."
@@ -44,63 +63,37 @@ class dataAnalysisClass:
         print "Blocking..."
         self.blocking()
 
-    # Standard Autocorrelation
+    # Autocorrelation up to maxLag, accumulated with FFTs in loadData (see autocorrelation.py)
     @timeFunction
     def autocorrelation(self):
-        self.acf = np.zeros(len(self.data)/2)
-        for k in range(0, len(self.data)/2):
-            self.acf[k] = np.corrcoef(np.array([self.data[0:len(self.data)-k], \
-                                            self.data[k:len(self.data)]]))[0,1]
+        acov = self.autocov.result()[:len(self.data)//2 + 1]
+        self.acf = acov/acov[0]
+        self.autocorrTime, self.autocorrWindow = integrated_time(self.acf)
+        self.autocorrStd = np.sqrt(self.autocorrTime*self.var/len(self.data))
 
-    # Bootstrap
+    # Bootstrap, drawing the resamples in chunks (see bootstrap.py)
     @timeFunction
     def bootstrap(self, nBoots = 1000):
-        bootVec = np.zeros(nBoots)
-        for k in range(0,nBoots):
-            bootVec[k] = np.average(np.random.choice(self.data, len(self.data)))
-        self.bootAvg = np.average(bootVec)
-        self.bootVar = np.var(bootVec)
-        self.bootStd = np.std(bootVec)
-
-    # Jackknife
+        boot = Bootstrap(self.data, np.mean)
+        boot.run(nBoots)
+        self.bootAvg = boot.avg
+        self.bootVar = boot.var
+        self.bootStd = boot.std
+        self.bootPercentile = boot.percentile_interval()
+        self.bootBCa = boot.bca_interval()
+
+    # Jackknife of the mean, from the moments of the data (see jackknife.py)
     @timeFunction
     def jackknife(self):
-        jackknVec = np.zeros(len(self.data))
-        for k in range(0,len(self.data)):
-            jackknVec[k] = np.average(np.delete(self.data, k))
-        self.jackknAvg = self.avg - (len(self.data) - 1) * (np.average(jackknVec) - self.avg)
-        self.jackknVar = float(len(self.data) - 1) * np.var(jackknVec)
-        self.jackknStd = np.sqrt(self.jackknVar)
-
-    # Blocking
+        self.jackknAvg, self.jackknVar, self.jackknStd = mean_estimates(len(self.data), self.avg, self.var)
+
+    # Blocking, halving the data level by level in loadData (see blocking.py)
     @timeFunction
-    def blocking(self, blockSizeMax = 500):
-        blockSizeMin = 1
-
-        self.blockSizes = []
-        self.meanVec = []
-        self.varVec = []
-
-        for i in range(blockSizeMin, blockSizeMax):
-            if(len(self.data) % i != 0):
-                pass#continue
-            blockSize = i
-            meanTempVec = []
-            varTempVec = []
-            startPoint = 0
-            endPoint = blockSize
-
-            while endPoint <= len(self.data):
-                meanTempVec.append(np.average(self.data[startPoint:endPoint]))
-                startPoint = endPoint
-                endPoint += blockSize
-            mean, var = np.average(meanTempVec), np.var(meanTempVec)/len(meanTempVec)
-            self.meanVec.append(mean)
-            self.varVec.append(var)
-            self.blockSizes.append(blockSize)
-
-        self.blockingAvg = np.average(self.meanVec[-200:])
-        self.blockingVar = (np.average(self.varVec[-200:]))
+    def blocking(self):
+        n, self.meanVec, var, gamma = self.blocks.levels()
+        self.blockSizes = 2**np.arange(len(n))
+        self.varVec = var/n
+        self.blockingAvg, self.blockingVar, self.blockingLevel = self.blocks.result()
         self.blockingStd = np.sqrt(self.blockingVar)
 
 
@@ -108,8 +101,7 @@ class dataAnalysisClass:
     # Plot of Data, Autocorrelation Function and Histogram
     def plotAll(self):
         self.createOutputFolder()
-        if len(self.data) <= 100000:
-            self.plotAutocorrelation()
+        self.plotAutocorrelation()
         self.plotData()
         self.plotHistogram()
         self.plotBlocking()
@@ -124,7 +116,9 @@ class dataAnalysisClass:
     def plotData(self):
         # Far away plot
         font = {'fontname':'serif'}
-        plt.plot(range(0, len(self.data)), self.data, 'r-', linewidth=1)
+        # at most about 10^5 points of long chains are drawn
+        step = max(1, len(self.data)//100000)
+        plt.plot(range(0, len(self.data), step), self.data[::step], 'r-', linewidth=1)
         plt.plot([0, len(self.data)], [self.avg, self.avg], 'b-', linewidth=1)
         plt.plot([0, len(self.data)], [self.avg + self.std, self.avg + self.std], 'g--', linewidth=1)
         plt.plot([0, len(self.data)], [self.avg - self.std, self.avg - self.std], 'g--', linewidth=1)
@@ -142,7 +136,7 @@ class dataAnalysisClass:
     def plotHistogram(self):
         binNumber = 50
         font = {'fontname':'serif'}
-        count, bins, ignore = plt.hist(self.data, bins=np.linspace(self.avg - 5*self.std, self.avg + 5*self.std, binNumber))
+        count, bins, ignore = plt.hist(self.hist.centers(), weights=self.hist.counts, bins=np.linspace(self.avg - 5*self.std, self.avg + 5*self.std, binNumber))
         plt.plot([self.avg, self.avg], [0,np.max(count)+10], 'b-', linewidth=1)
         plt.ylim(0,np.max(count)+10)
         plt.ylabel(self.outName.title() + ' Histogram', **font)
@@ -161,9 +155,9 @@ class dataAnalysisClass:
     # Plot the Autocorrelation Function
     def plotAutocorrelation(self):
         font = {'fontname':'serif'}
-        plt.plot(range(1, len(self.data)/2), self.acf[1:], 'r-')
+        plt.plot(range(1, len(self.acf)), self.acf[1:], 'r-')
         plt.ylim(-1, 1)
-        plt.xlim(0, len(self.data)/2)
+        plt.xlim(0, len(self.acf))
         plt.ylabel('Autocorrelation Function', **font)
         plt.xlabel('Lag', **font)
         plt.title('Autocorrelation', **font)
@@ -173,7 +167,8 @@ class dataAnalysisClass:
 
     def plotBlocking(self):
         font = {'fontname':'serif'}
-        plt.plot(self.blockSizes, self.varVec, 'r-')
+        plt.semilogx(self.blockSizes, self.varVec, 'r-')
+        plt.plot([self.blockSizes[self.blockingLevel]], [self.blockingVar], 'bo')
         plt.ylabel('Variance', **font)
         plt.xlabel('Block Size', **font)
         plt.title('Blocking', **font)
@@ -189,9 +184,14 @@ class dataAnalysisClass:
         print "Sample Variance:\t", self.var
         print "Sample Std:     \t", self.std
         print "\n=========================================\n"
+        print "Autocorrelation Time:\t", self.autocorrTime
+        print "Autocorrelation Error:\t", self.autocorrStd
+        print "\n=========================================\n"
         print "Bootstrap Average: \t", self.bootAvg
         print "Bootstrap Variance:\t", self.bootVar
         print "Bootstrap Error:   \t", self.bootStd
+        print "Bootstrap 95% Percentile:\t", self.bootPercentile
+        print "Bootstrap 95% BCa:       \t", self.bootBCa
         print "\n=========================================\n"
         print "Jackknife Average: \t", self.jackknAvg
         print "Jackknife Variance:\t", self.jackknVar
@@ -0,0 +1,148 @@
+"""
+Autocovariance, autocorrelation and integrated autocorrelation time of a
+Monte Carlo chain from zero-padded FFTs.
+
+With y_i = x_i - mean the autocovariance at lag k is
+
+    C(k) = (1/n) sum_{i=0}^{n-1-k} y_i y_{i+k},
+
+a correlation of y with itself. Padding y with zeros to at least 2n - 1
+points turns the circular correlation of the FFT into this linear one,
+
+    C(k) = (1/n) IFFT(|FFT(y)|^2)[k],
+
+which costs O(n log n) instead of the O(n^2) of a loop over lags. When only
+lags k <= max_lag are wanted, the chain is cut into segments of L points,
+and each segment is correlated with itself and the following max_lag points
+by an FFT of length about L + max_lag. This is O(n log L) time with O(L)
+memory, so 10^8 points (also memory mapped from disk) are no problem.
+
+Autocovariance accumulates the same C(k), k <= max_lag, from chunks of
+the chain as they are read: each chunk is correlated together with the last
+max_lag points before it, and the sums needed to subtract the mean at the
+end are kept alongside.
+
+The integrated autocorrelation time
+
+    tau(M) = 1 + 2 sum_{k=1}^{M} rho(k),   rho(k) = C(k)/C(0),
+
+is summed up to the automatic window of Sokal: the smallest M with
+M >= c tau(M). The error of the mean of correlated data is then
+sqrt(tau C(0)/n).
+
+Works with python 2 and 3.
+"""
+from __future__ import division
+import numpy as np
+
+
+# Segment length of the blocked computation with max_lag
+SEGMENT = 2**20
+# Window constant c of the automatic windowing
+WINDOW_C = 5.0
+
+
+def _fft_size(n):
+    """
+    Smallest power of two >= n.
+    """
+    return 1 << int(np.ceil(np.log2(max(n, 1))))
+
+
+def autocovariance(x, max_lag=None, mean=None, segment=SEGMENT):
+    """
+    C(k) for k = 0,...,max_lag (all lags n-1 by default). mean is the mean
+    of x if known (e.g. from an earlier pass over a memory mapped chain).
+    """
+    n = len(x)
+    if mean is None:
+        mean = np.mean(x)
+    if max_lag is None or max_lag >= n - 1:
+        max_lag = n - 1
+    if max_lag + 1 >= segment or 2*n <= segment:
+        # one FFT of the whole chain
+        y = np.asarray(x, dtype=np.float64) - mean
+        f = np.fft.rfft(y, _fft_size(2*n - 1))
+        return np.fft.irfft(f*np.conj(f))[:max_lag + 1]/n
+    size = _fft_size(segment + max_lag)
+    acov = np.zeros(max_lag + 1)
+    for start in range(0, n, segment):
+        stop = min(start + segment, n)
+        a = np.asarray(x[start:stop], dtype=np.float64) - mean
+        b = np.asarray(x[start:min(stop + max_lag, n)], dtype=np.float64) - mean
+        # sum_i a_i b_{i+k}; a is zero beyond its L points, so nothing wraps around
+        corr = np.fft.irfft(np.conj(np.fft.rfft(a, size))*np.fft.rfft(b, size), size)
+        acov += corr[:max_lag + 1]
+    return acov/n
+
+
+def autocorrelation(x, max_lag=None, mean=None):
+    """
+    rho(k) = C(k)/C(0) for k = 0,...,max_lag.
+    """
+    acov = autocovariance(x, max_lag, mean)
+    return acov/acov[0]
+
+
+class Autocovariance(object):
+    """
+    C(k), k = 0,...,max_lag, of a chain fed incrementally with update(chunk).
+    The lagged products sum_i y_i y_{i+k} are accumulated for y = x - shift,
+    shift being the first value seen, and the mean is subtracted in result.
+    """
+    def __init__(self, max_lag):
+        self.max_lag = max_lag
+        self.n = 0
+        self.sum = 0.0
+        self.products = np.zeros(max_lag + 1)
+        self.head = np.zeros(0)
+        self.tail = np.zeros(0)
+        self.shift = None
+
+    def _lagged(self, y):
+        # sum_i y_i y_{i+k} for k = 0,...,max_lag
+        f = np.fft.rfft(y, _fft_size(len(y) + self.max_lag))
+        return np.fft.irfft(f*np.conj(f))[:self.max_lag + 1]
+
+    def update(self, chunk):
+        chunk = np.ravel(chunk).astype(np.float64)
+        if len(chunk) == 0:
+            return
+        if self.shift is None:
+            self.shift = chunk[0]
+        y = chunk - self.shift
+        # products with both points in the tail were counted with the previous chunk
+        z = np.concatenate((self.tail, y))
+        self.products += self._lagged(z)
+        if len(self.tail) > 0:
+            self.products -= self._lagged(self.tail)
+        self.n += len(y)
+        self.sum += np.sum(y)
+        if len(self.head) < self.max_lag:
+            self.head = np.concatenate((self.head, y[:self.max_lag - len(self.head)]))
+        self.tail = z[max(len(z) - self.max_lag, 0):] if self.max_lag > 0 else self.tail
+
+    def result(self):
+        """
+        C(k) for k = 0,...,min(max_lag, n - 1).
+        """
+        n = self.n
+        k = np.arange(min(self.max_lag, n - 1) + 1)
+        mean = self.sum/n
+        # sums of the first k and of the last k points
+        first = np.concatenate(([0.0], np.cumsum(self.head)))[k]
+        last = np.concatenate(([0.0], np.cumsum(self.tail[::-1])))[k]
+        products = self.products[k] - mean*(2*self.sum - first - last) + (n - k)*mean**2
+        return products/n
+
+
+def integrated_time(rho, c=WINDOW_C):
+    """
+    Integrated autocorrelation time tau and window M from the
+    autocorrelation function rho (starting at lag 0), see the module
+    docstring. If no lag of rho satisfies M >= c tau(M), the last one is used.
+    """
+    tau = 2*np.cumsum(rho) - 1
+    window = np.flatnonzero(np.arange(len(rho)) >= c*tau)
+    M = window[0] if len(window) > 0 else len(rho) - 1
+    return tau[M], M
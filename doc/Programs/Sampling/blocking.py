@@ -0,0 +1,138 @@
+"""
+Automatic blocking analysis of correlated Monte Carlo data (Flyvbjerg and
+Petersen, with the automatic choice of the block level of Jonsson, Phys.
+Rev. E 98, 043304 (2018)).
+
+Blocking transformation: level i + 1 holds the averages of consecutive
+pairs of level i, starting from the data at level 0, so level i consists of
+blocks of 2^i points. For each level we need only its number of points n_i,
+the variance s_i and the lag-one autocovariance
+
+    gamma_i = (1/n_i) sum_j (x_j - mean)(x_{j+1} - mean),
+
+which follow from running sums of x, x^2 and x_j x_{j+1}. The blocks are
+formed as the data arrive, so the whole analysis is a single O(n) pass with
+O(log n) state, and a chain can be fed chunk by chunk as it is produced.
+
+The variance of the mean estimated at level i, s_i/n_i, grows with i until
+the blocks are longer than the correlation time. Jonsson picks the first
+level k for which the remaining levels show no significant correlation,
+
+    M_k = sum_{i>=k} n_i (gamma_i/s_i)^2 < chi^2_{0.99}(number of levels >= k),
+
+and returns s_k/n_k as the variance of the mean.
+
+Works with python 2 and 3.
+"""
+from __future__ import division
+import numpy as np
+from scipy.stats import chi2
+
+
+# Confidence of the chi^2 test for the block level
+QUANTILE = 0.99
+
+
+class _Level(object):
+    """
+    Running sums of one blocking level.
+    """
+    def __init__(self):
+        self.n = 0
+        self.sum = 0.0
+        self.sum2 = 0.0
+        self.lag1 = 0.0
+        self.first = 0.0
+        self.last = 0.0
+        self.pending = None
+
+
+class Blocking(object):
+    """
+    Blocking analysis fed incrementally with update(chunk). Use as
+
+        blocks = Blocking()
+        for chunk in chunks:
+            blocks.update(chunk)
+        mean, var, k = blocks.result()
+
+    The data are shifted by the first value seen, to keep the running sums
+    of squares free of cancellation.
+    """
+    def __init__(self):
+        self._levels = []
+        self.shift = None
+
+    def update(self, chunk):
+        """
+        Adds the next consecutive points of the chain.
+        """
+        chunk = np.ravel(chunk).astype(np.float64)
+        if len(chunk) == 0:
+            return
+        if self.shift is None:
+            self.shift = chunk[0]
+        self._add(0, chunk - self.shift)
+
+    def _add(self, i, x):
+        if len(x) == 0:
+            return
+        if i == len(self._levels):
+            self._levels.append(_Level())
+        level = self._levels[i]
+        if level.n == 0:
+            level.first = x[0]
+        else:
+            level.lag1 += level.last*x[0]
+        level.n += len(x)
+        level.sum += np.sum(x)
+        level.sum2 += np.dot(x, x)
+        level.lag1 += np.dot(x[:-1], x[1:])
+        level.last = x[-1]
+        # pair up with the point left over from the previous chunk
+        if level.pending is not None:
+            x = np.concatenate(([level.pending], x))
+        m = len(x) - len(x) % 2
+        level.pending = x[m] if m < len(x) else None
+        self._add(i + 1, 0.5*(x[0:m:2] + x[1:m:2]))
+
+    def levels(self):
+        """
+        Arrays with n_i, the mean, the variance s_i and the lag-one
+        autocovariance gamma_i of every level with at least two points.
+        """
+        levels = [level for level in self._levels if level.n >= 2]
+        n = np.array([level.n for level in levels], dtype=np.float64)
+        mean = np.array([level.sum for level in levels])/n
+        var = np.array([level.sum2 for level in levels])/n - mean**2
+        lag1 = np.array([level.lag1 - mu*(2*level.sum - level.first - level.last)
+                         for level, mu in zip(levels, mean)])
+        gamma = (lag1 + (n - 1)*mean**2)/n
+        return n, mean + self.shift, var, gamma
+
+    def result(self, quantile=QUANTILE):
+        """
+        Mean, variance of the mean and the chosen level k. If no level passes
+        the test the last one is used, and more data are needed.
+        """
+        n, mean, var, gamma = self.levels()
+        d = len(n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            terms = np.where(var > 0, n*(gamma/var)**2, 0.0)
+        M = np.cumsum(terms[::-1])[::-1]
+        q = chi2.ppf(quantile, np.arange(d, 0, -1))
+        passed = np.flatnonzero(M < q)
+        k = passed[0] if len(passed) > 0 else d - 1
+        return mean[0], var[k]/n[k], k
+
+
+def blocking(x, chunksize=None):
+    """
+    Mean, variance of the mean and block level of the chain x, fed in chunks
+    of chunksize points (all at once by default).
+    """
+    blocks = Blocking()
+    chunksize = chunksize or len(x)
+    for start in range(0, len(x), chunksize):
+        blocks.update(x[start:start + chunksize])
+    return blocks.result()
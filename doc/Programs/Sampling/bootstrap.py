@@ -0,0 +1,176 @@
+"""
+Batched bootstrap for a statistic of a one-dimensional sample.
+
+Instead of drawing one resample per Python iteration, the replicates are
+drawn a chunk at a time as a (B_chunk, n) matrix of indices into the data,
+and the statistic is evaluated on all rows of the chunk at once. The chunk
+size is chosen so that no more than max_elements indices (or weights) are
+held in memory, whatever the number of replicates B.
+
+Two ways of evaluating the statistic on a chunk are supported:
+
+    index     statistic(samples, axis=1), samples being data[indices],
+              e.g. np.mean, np.median or np.var.
+    weighted  statistic(data, weights), weights being the (B_chunk, n)
+              multinomial counts of how often each point is drawn. For the
+              mean and other moments this is a single matrix-vector product
+              per chunk, see weighted_mean and weighted_var.
+
+From the B replicates theta*_b of the statistic theta we get the bootstrap
+mean and standard error, and three confidence intervals at level 1 - alpha:
+
+    standard     theta +- z_{1-alpha/2} se
+    percentile   the alpha/2 and 1-alpha/2 quantiles of theta*
+    BCa          the quantiles Phi(z0 + (z0 + z_a)/(1 - a (z0 + z_a))) of
+                 theta*, with the bias correction z0 = Phi^-1(#{theta* < theta}/B)
+                 and the acceleration a from jackknife values of theta.
+
+Works with python 2 and 3.
+"""
+from __future__ import division
+import numpy as np
+from scipy.special import ndtr, ndtri
+from jackknife import blocked_values, leave_one_out_mean
+
+
+# Largest number of indices (or weights) of one chunk of replicates
+MAX_ELEMENTS = 2**24
+# Number of groups of the delete-d jackknife used for the BCa acceleration
+JACKKNIFE_GROUPS = 1000
+
+
+def weighted_mean(data, weights):
+    """
+    Means of the data with one row of weights (counts) per replicate.
+    """
+    return np.dot(weights, data)/np.sum(weights, axis=1)
+
+
+def weighted_var(data, weights):
+    """
+    Variances (normalized like np.var) with one row of weights per replicate.
+    """
+    n = np.sum(weights, axis=1)
+    mean = np.dot(weights, data)/n
+    return np.dot(weights, data**2)/n - mean**2
+
+
+class Bootstrap(object):
+    """
+    Bootstrap of statistic on the one-dimensional sample data, see the module
+    docstring. Use as
+
+        boot = Bootstrap(data, np.median, seed=2018)
+        boot.run(10000)
+        print(boot.std, boot.percentile_interval(0.05), boot.bca_interval(0.05))
+
+    seed is an int, None or a np.random.RandomState.
+    """
+    def __init__(self, data, statistic=np.mean, weighted=False, seed=None,
+                 max_elements=MAX_ELEMENTS):
+        self.data = np.ravel(data)
+        self.n = len(self.data)
+        self.statistic = statistic
+        self.weighted = weighted
+        if isinstance(seed, np.random.RandomState):
+            self.rng = seed
+        else:
+            self.rng = np.random.RandomState(seed)
+        self.chunk = max(1, max_elements//self.n)
+        weights = np.ones((1, self.n)) if weighted else None
+        self.estimate = self._evaluate(self.data[np.newaxis, :], weights)[0]
+        self.replicates = None
+        self._jackknife = None
+
+    def _evaluate(self, samples, weights):
+        if self.weighted:
+            return np.asarray(self.statistic(self.data, weights))
+        return np.asarray(self.statistic(samples, axis=1))
+
+    def _chunk(self, size):
+        """
+        Statistic of size new bootstrap samples.
+        """
+        indices = self.rng.randint(0, self.n, size=(size, self.n))
+        if not self.weighted:
+            return self._evaluate(self.data[indices], None)
+        # counts of each point in each row, from one bincount over the whole chunk
+        indices += self.n*np.arange(size)[:, np.newaxis]
+        counts = np.bincount(indices.ravel(), minlength=size*self.n)
+        return self._evaluate(None, counts.reshape(size, self.n).astype(np.float64))
+
+    def run(self, n_boots=1000):
+        """
+        Draws n_boots bootstrap samples and returns the replicates of the
+        statistic.
+        """
+        self.replicates = np.empty(n_boots)
+        for start in range(0, n_boots, self.chunk):
+            stop = min(start + self.chunk, n_boots)
+            self.replicates[start:stop] = self._chunk(stop - start)
+        self.avg = np.average(self.replicates)
+        self.var = np.var(self.replicates)
+        self.std = np.std(self.replicates)
+        return self.replicates
+
+    def standard_interval(self, alpha=0.05):
+        """
+        Normal interval estimate +- z_{1-alpha/2} times the bootstrap error.
+        """
+        z = ndtri(1 - alpha/2)
+        return self.estimate - z*self.std, self.estimate + z*self.std
+
+    def percentile_interval(self, alpha=0.05):
+        """
+        Interval between the alpha/2 and 1-alpha/2 quantiles of the replicates.
+        """
+        low, high = np.percentile(self.replicates, [50*alpha, 100 - 50*alpha])
+        return low, high
+
+    def jackknife_values(self):
+        """
+        Statistic with each of (at most) JACKKNIFE_GROUPS consecutive groups of
+        points left out; for n <= JACKKNIFE_GROUPS, and always for np.mean,
+        the leave-one-out values.
+        """
+        if self._jackknife is not None:
+            return self._jackknife
+        if self.statistic in (np.mean, np.average):
+            self._jackknife = leave_one_out_mean(self.data)
+        elif not self.weighted:
+            statistic = lambda sample: self._evaluate(sample[np.newaxis, :], None)[0]
+            self._jackknife = blocked_values(self.data, statistic, JACKKNIFE_GROUPS)
+        else:
+            # one row of weights per left out group, a chunk of rows at a time
+            bounds = np.linspace(0, self.n, min(self.n, JACKKNIFE_GROUPS) + 1).astype(int)
+            groups = len(bounds) - 1
+            values = []
+            for first in range(0, groups, self.chunk):
+                rows = range(first, min(first + self.chunk, groups))
+                weights = np.ones((len(rows), self.n))
+                for row, group in enumerate(rows):
+                    weights[row, bounds[group]:bounds[group + 1]] = 0.0
+                values.extend(self._evaluate(None, weights))
+            self._jackknife = np.array(values)
+        return self._jackknife
+
+    def acceleration(self):
+        """
+        Acceleration a = sum d^3/(6 (sum d^2)^(3/2)), d being the deviations of
+        the jackknife values from their mean.
+        """
+        d = np.mean(self.jackknife_values()) - self.jackknife_values()
+        denominator = 6*np.sum(d**2)**1.5
+        return np.sum(d**3)/denominator if denominator > 0 else 0.0
+
+    def bca_interval(self, alpha=0.05):
+        """
+        Bias-corrected and accelerated percentile interval.
+        """
+        below = np.mean(self.replicates < self.estimate)
+        z0 = ndtri(np.clip(below, 0.5/len(self.replicates), 1 - 0.5/len(self.replicates)))
+        a = self.acceleration()
+        z = ndtri(np.array([alpha/2, 1 - alpha/2]))
+        levels = ndtr(z0 + (z0 + z)/(1 - a*(z0 + z)))
+        low, high = np.percentile(self.replicates, 100*levels)
+        return low, high
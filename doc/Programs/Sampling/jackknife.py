@@ -0,0 +1,123 @@
+"""
+Jackknife in O(n) for means, moments and ratios, and delete-d blocked
+jackknife for arbitrary statistics.
+
+Deleting x_k one at a time and recomputing the statistic costs O(n^2) and a
+copy of the data per point. For statistics built from sums the leave-one-out
+values follow from the totals instead: with S = sum_i x_i
+
+    mean_(k)     = (S - x_k)/(n - 1)
+    var_(k)      = (Q - (x_k - c)^2)/(n - 1) - (mean_(k) - c)^2,
+                   Q = sum_i (x_i - c)^2, c = mean (centering against cancellation)
+    ratio_(k)    = (S_y - y_k)/(S_x - x_k)
+
+which is O(n) for all k at once. For other statistics the data are cut into
+g consecutive blocks of d points, and the statistic is recomputed g times
+with one block left out (cost O(g n)); blocks of correlated data should be
+longer than the correlation time.
+
+From the estimate theta and the g leave-out values theta_(k) we get
+
+    theta_jack = theta - (g - 1) (mean(theta_(k)) - theta)     (bias corrected)
+    var_jack   = (g - 1)/g sum_k (theta_(k) - mean(theta_(k)))^2
+
+Works with python 2 and 3.
+"""
+from __future__ import division
+import numpy as np
+
+
+def leave_one_out_sum(data):
+    """
+    Sums of the data with each point left out.
+    """
+    data = np.ravel(data)
+    return np.sum(data) - data
+
+
+def leave_one_out_mean(data):
+    """
+    Means of the data with each point left out.
+    """
+    data = np.ravel(data)
+    return (np.sum(data) - data)/(len(data) - 1)
+
+
+def leave_one_out_var(data):
+    """
+    Variances (normalized like np.var) of the data with each point left out.
+    """
+    data = np.ravel(data)
+    n = len(data)
+    deviation = data - np.mean(data)
+    mean = -deviation/(n - 1)
+    return (np.sum(deviation**2) - deviation**2)/(n - 1) - mean**2
+
+
+def leave_one_out_ratio(y, x):
+    """
+    Ratio estimators sum(y)/sum(x) with each pair (x_k, y_k) left out.
+    """
+    y = np.ravel(y); x = np.ravel(x)
+    return (np.sum(y) - y)/(np.sum(x) - x)
+
+
+def blocked_values(data, statistic, n_blocks=None, block_size=None):
+    """
+    statistic(sample) of the data with each of n_blocks consecutive blocks
+    left out (or blocks of block_size points, the last one taking the rest).
+    Without either this is the leave-one-out jackknife, O(n^2).
+    """
+    data = np.ravel(data)
+    n = len(data)
+    if block_size is not None:
+        bounds = np.append(np.arange(0, max(n - block_size, 0) + 1, block_size), n)
+    else:
+        bounds = np.linspace(0, n, min(n, n_blocks or n) + 1).astype(int)
+    values = np.empty(len(bounds) - 1)
+    sample = np.empty(n)
+    for k, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+        # the kept points, written into one buffer instead of a new copy per block
+        m = n - (stop - start)
+        sample[:start] = data[:start]
+        sample[start:m] = data[stop:]
+        values[k] = statistic(sample[:m])
+    return values
+
+
+def estimates(theta, values):
+    """
+    Bias-corrected jackknife estimate, variance and standard error of the
+    statistic with value theta on the whole data and leave-out values values.
+    """
+    g = len(values)
+    avg = theta - (g - 1)*(np.average(values) - theta)
+    var = (g - 1)*np.var(values)
+    return avg, var, np.sqrt(var)
+
+
+def mean_estimates(n, mean, var):
+    """
+    Jackknife (avg, var, std) of the mean from the count, mean and variance
+    of the data alone: the leave-one-out means average to the mean and have
+    variance var/(n - 1)^2, so this equals
+    estimates(mean, leave_one_out_mean(data)) without the n values.
+    """
+    var = var/(n - 1)
+    return mean, var, np.sqrt(var)
+
+
+def jackknife(data, statistic=np.mean, n_blocks=None, block_size=None):
+    """
+    Jackknife (avg, var, std) of statistic on the data. The mean and np.var
+    use the O(n) leave-one-out formulas, other statistics the blocked
+    jackknife of blocked_values.
+    """
+    data = np.ravel(data)
+    if statistic in (np.mean, np.average) and n_blocks is None and block_size is None:
+        values = leave_one_out_mean(data)
+    elif statistic is np.var and n_blocks is None and block_size is None:
+        values = leave_one_out_var(data)
+    else:
+        values = blocked_values(data, statistic, n_blocks, block_size)
+    return estimates(statistic(data), values)
@@ -0,0 +1,193 @@
+"""
+Chunked readers and single-pass accumulators for Monte Carlo output files.
+
+The readers yield consecutive chunks of at most chunksize values and stop
+after size values (size = 0 reads everything), so a prefix of a large file
+is all that is ever parsed:
+
+    text     one value per line, parsed chunksize lines at a time
+    .npy     numpy array files, memory mapped
+    .bin     raw float64 values (.raw as well), memory mapped
+
+The accumulators are updated one chunk at a time and can be merged, e.g.
+the results of several runs or of chunks analysed in parallel, so the
+memory does not grow with the length of the chain:
+
+    Moments    count, mean and sum of squared deviations. A chunk is reduced
+               with numpy and merged into the totals with the pairwise
+               formula of Chan et al., the chunkwise form of Welford's update.
+    Histogram  counts on a uniform grid of bin width w, anchored at zero so
+               that histograms with the same w add up bin by bin. The grid
+               grows as new values arrive; when it would exceed max_bins the
+               width is doubled by adding neighbouring bins.
+
+Blocking (blocking.py) and Autocovariance (autocorrelation.py) take the
+chunks in the same way.
+
+Works with python 2 and 3.
+"""
+from __future__ import division
+from itertools import islice
+from os import path
+import numpy as np
+
+
+# Number of values per chunk of the readers
+CHUNKSIZE = 2**16
+# Largest number of bins of a Histogram
+MAX_BINS = 2**16
+
+
+def read_text(fileName, size=0, chunksize=CHUNKSIZE):
+    """
+    Chunks of a text file with one value per line.
+    """
+    with open(fileName) as f:
+        lines = islice(f, size) if size > 0 else f
+        while True:
+            block = list(islice(lines, chunksize))
+            if not block:
+                break
+            yield np.loadtxt(block, ndmin=1)
+
+
+def memory_map(fileName, size=0):
+    """
+    The values of a .npy, .bin or .raw file as a read-only memory map
+    (without copying), or None for a text file.
+    """
+    extension = path.splitext(fileName)[1]
+    if extension == '.npy':
+        data = np.load(fileName, mmap_mode='r')
+    elif extension in ('.bin', '.raw'):
+        data = np.memmap(fileName, dtype=np.float64, mode='r')
+    else:
+        return None
+    data = data.reshape(-1)
+    return data[:size] if size > 0 else data
+
+
+def read_chunks(fileName, size=0, chunksize=CHUNKSIZE):
+    """
+    Chunks of any of the supported files, see the module docstring.
+    """
+    data = memory_map(fileName, size)
+    if data is None:
+        for chunk in read_text(fileName, size, chunksize):
+            yield chunk
+        return
+    for start in range(0, len(data), chunksize):
+        yield np.asarray(data[start:start + chunksize], dtype=np.float64)
+
+
+class Moments(object):
+    """
+    Count, mean and sum of squared deviations m2 of all values seen.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, chunk):
+        chunk = np.ravel(chunk)
+        if len(chunk) == 0:
+            return self
+        other = Moments()
+        other.count = len(chunk)
+        other.mean = np.mean(chunk)
+        other.m2 = np.sum((chunk - other.mean)**2)
+        return self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta*other.count/count
+        self.m2 = self.m2 + other.m2 + delta**2*self.count*other.count/count
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        """
+        Variance normalized by count, like np.var.
+        """
+        return self.m2/self.count
+
+
+class Histogram(object):
+    """
+    Counts of the values in the bins [i w, (i+1) w) for the integers i
+    between offset and offset + len(counts) - 1.
+    """
+    def __init__(self, width, max_bins=MAX_BINS):
+        self.width = width
+        self.max_bins = max_bins
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _coarsen(self):
+        # bin i becomes bin floor(i/2) of twice the width
+        bins = self.offset + np.arange(len(self.counts))
+        offset = self.offset//2
+        self.counts = np.bincount(bins//2 - offset, weights=self.counts).astype(np.int64)
+        self.offset = offset
+        self.width *= 2
+
+    def _extend(self, low, high):
+        # makes room for the bins low,...,high
+        if len(self.counts) == 0:
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.int64)
+            return
+        offset = min(self.offset, low)
+        end = max(self.offset + len(self.counts) - 1, high)
+        counts = np.zeros(end - offset + 1, dtype=np.int64)
+        counts[self.offset - offset:self.offset - offset + len(self.counts)] = self.counts
+        self.offset, self.counts = offset, counts
+
+    def _span(self, low, high):
+        # number of bins needed to cover the current bins and [low, high]
+        if len(self.counts) > 0:
+            low = min(low, self.offset*self.width)
+            high = max(high, (self.offset + len(self.counts))*self.width)
+        return (high - low)/self.width + 2
+
+    def update(self, chunk):
+        chunk = np.ravel(chunk)
+        if len(chunk) == 0:
+            return self
+        low, high = np.min(chunk), np.max(chunk)
+        while self._span(low, high) > self.max_bins:
+            self._coarsen()
+        bins = np.floor(chunk/self.width).astype(np.int64)
+        self._extend(int(bins.min()), int(bins.max()))
+        self.counts += np.bincount(bins - self.offset, minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of other, whose width must differ from ours by a
+        power of two.
+        """
+        other_counts, other_offset, other_width = other.counts, other.offset, other.width
+        while self.width < other_width:
+            self._coarsen()
+        while other_width < self.width:
+            bins = other_offset + np.arange(len(other_counts))
+            other_offset //= 2
+            other_counts = np.bincount(bins//2 - other_offset, weights=other_counts).astype(np.int64)
+            other_width *= 2
+        if not np.isclose(self.width, other_width):
+            raise ValueError('histogram widths differ by more than a power of two')
+        if len(other_counts) == 0:
+            return self
+        self._extend(other_offset, other_offset + len(other_counts) - 1)
+        start = other_offset - self.offset
+        self.counts[start:start + len(other_counts)] += other_counts
+        return self
+
+    def centers(self):
+        return (self.offset + np.arange(len(self.counts)) + 0.5)*self.width
@@ -5,6 +5,13 @@ import numpy as np
 from scipy import linalg
 import matplotlib.pyplot as plt
 import time
+from functools import partial
+from designmatrix import design_matrix, n_terms, poly_powers
+from degreesweep import DegreeSweep
+from solvers import get_solver
+from lasso import CoordinateDescent
+from crossvalidation import FoldStatistics
+from resampling import Resampler
 
 # Variance
 def var(f_model):
@@ -45,12 +52,8 @@ def SVDinv(A):
     SVD is numerically more stable (at least in our case) than the inversion algorithms provided by
     numpy and scipy.linalg at the cost of being slower.
     '''
-    U, s, VT = linalg.svd(A)
-    D = np.zeros((len(U),len(VT)))
-    for i in range(0,len(VT)):
-        D[i,i]=s[i]
-    UT = np.transpose(U); V = np.transpose(VT); invD = np.linalg.inv(D)
-    return np.matmul(V,np.matmul(invD,UT))
+    U, s, VT = linalg.svd(A, full_matrices=False) # thin SVD, no dense diagonal matrix to invert
+    return np.matmul(np.transpose(VT)/s, np.transpose(U))
 
 #================================================================================================================
 
@@ -76,13 +79,8 @@ def R2(x_true,x_predict):
 def get_subset(A,indices):
     '''given an indexing set "indices", return the vector consisting of 
     entries A[i,j] where (i,j) is an entry in indices.'''
-    N = len(indices)
-    B = np.zeros(N)
-    for k in range(0,N):
-        i = indices[k][0]
-        j = indices[k][1]
-        B[k] = A[j,i]
-    return B
+    indices = np.asarray(indices).reshape(-1, 2)
+    return np.asarray(A[indices[:,1], indices[:,0]], dtype=np.float64)
 
 
 #============================================================================================================================
@@ -92,7 +90,8 @@ class k_cross_validation:
     and a paritition of the data. The class function R2 calculates the mean R2 scores
     of test and training data for the given model. The function MSE calculates the mean MSE, bias,
     variance and error terms of the test data for the given model. These quantities are stored
-    as self variables.'''
+    as self variables. No fold builds its own training set: the fold models are found from block downdates
+    of X^T X and X^T z (see crossvalidation.py), and the folds are index arrays into data.X and data.z.'''
 
     def __init__(self, data, partition,*args):
         self.data = data; self.partition = partition; self.args = args;
@@ -100,119 +99,98 @@ class k_cross_validation:
         self.k = len(partition)
         self.test_R2, self.test_var, self.test_bias, self.test_MSE, self.test_extra_terms = 0, 0, 0, 0, 0
         self.train_R2 = 0
+        self.stats = None
         
         #self.train_var, self.train_bias, self.train_MSE, self.train_extra_terms = 0, 0, 0, 0
 
+    def fold_statistics(self):
+        '''Per-fold sufficient statistics of the data, computed once in a single pass.'''
+        if self.stats is None:
+            self.stats = FoldStatistics(self.data.X, self.data.z, self.partition)
+        return self.stats
+
     def R2(self):
-        data = self.data
-        f = data.f; X = data.X; z = data.z; correspondence = data.correspondence; partition = self.partition
+        z = self.data.z; partition = self.partition
         k = self.k
         args = self.args
         
         test_R2, train_R2 = 0, 0
 
-        for i, test_data in enumerate(partition):
-            train_data = [x for j,x in enumerate(partition) if j!=i]
-            train_data = sum(train_data, [])
-            beta = data.get_beta(X[train_data],z[train_data],*args)
-            freg = data.model(beta)
-            test_data = [correspondence[j] for j in test_data]
-            train_data = [correspondence[j] for j in train_data]
-
+        stats = self.fold_statistics()
+        for i, fregtest in enumerate(stats.fold_predictions(*args)):
             # test errors:
-            ftest = get_subset(f,test_data); fregtest = get_subset(freg,test_data)
-            test_R2 +=  R2(ftest,fregtest)
-
-            #training errors:
-            ftrain = get_subset(f,train_data); fregtrain = get_subset(freg,train_data)
-            train_R2 +=  R2(ftrain,fregtrain)
+            test_R2 += R2(z[partition[i]],fregtest)
+        #training errors:
+        train_R2 = np.sum(stats.train_r2(*args))
 
         # self variables
         self.test_R2 = test_R2/k
         self.train_R2 = train_R2/k
 
     def MSE(self):
-        data = self.data
-        f = data.f; X = data.X; z = data.z; correspondence = data.correspondence; partition = self.partition
+        z = self.data.z; partition = self.partition
         k = self.k
         args = self.args
 
         test_var, test_bias, test_MSE, test_extra_terms = 0, 0, 0, 0
         #train_var, train_bias, train_MSE, train_extra_terms = 0, 0, 0, 0
 
-        for i, test_data in enumerate(partition):
-            train_data = [x for j,x in enumerate(partition) if j!=i]
-            train_data = sum(train_data, [])
-            beta = data.get_beta(X[train_data],z[train_data],*args)
-            freg = data.model(beta)
-            test_data = [correspondence[j] for j in test_data]
-            # train_data = [correspondence[j] for j in train_data]
-
+        for i, fregtest in enumerate(self.fold_statistics().fold_predictions(*args)):
             # test errors:
-            ftest = get_subset(f,test_data); fregtest = get_subset(freg,test_data)
+            ftest = z[partition[i]]
             test_var += var(fregtest) 
             test_bias += bias(ftest,fregtest)
             test_MSE += MSE(ftest,fregtest)
             test_extra_terms += extra_term(ftest,fregtest)
 
-            ##training errors:
-            #ftrain = get_subset(f,train_data); fregtrain = get_subset(freg,train_data)
-            #train_var += var(fregtrain) 
-            #train_bias += bias(ftrain,fregtrain)
-            #train_MSE += MSE(ftrain,fregtrain)
-            #train_extra_terms += extra_term(ftrain,fregtrain)
-
         # self variables
         self.test_var = test_var/k
         self.test_bias = test_bias/k
         self.test_MSE = test_MSE/k
         self.test_extra_terms = test_extra_terms/k
 
-        #self.train_var = train_var/k
-        #self.train_bias = train_bias/k
-        #self.train_MSE = train_MSE/k
-        #self.train_extra_terms = train_extra_terms/k
+#================================================================================================================
+
+def bootstrap_beta(data, rng, i, samplesize, args, solver):
+    ''' One bootstrap fit for regdata.bootstrap: draws samplesize points of data['X'], data['z'] with the
+    generator rng and returns the coefficients (OLS, Ridge or Lasso depending on args, as in regdata.get_beta).
+    Every call has its own solver, so calls may run in parallel.
+    '''
+    X = data['X']; z = data['z']
+    integers = rng.integers(low=0, high=len(z), size=samplesize)
+    Xnew = X[integers,:]; znew = z[integers]
+    if len(args)>=2: #Lasso
+        return CoordinateDescent(Xnew,znew).fit(args[0],tol=args[1])
+    LAMBDA = args[0] if len(args)>=1 else 0.0
+    return get_solver(solver).solve(Xnew,znew,LAMBDA)
 
 #================================================================================================================
 
 class regdata:
-    def __init__(self, f, degree):
+    '''Polynomial fits of the grid data f. The OLS and Ridge coefficients are found with the given
+    solver backend ('svd', 'qr', 'cholesky' or 'lsqr', see solvers.py), which caches the factorization
+    of X between calls.'''
+    def __init__(self, f, degree, solver = 'svd'):
         # initializing variables
         m = len(f[0,:]); n = len(f);  mn = m*n; 
-        x = np.linspace(0, 1, m); y = np.linspace(0, 1, n); z = np.zeros(mn); xy = np.zeros((mn,2)); 
+        x = np.linspace(0, 1, m); y = np.linspace(0, 1, n)
 
         # initializing some self variables
-        self.f = f; self.degree = degree; self.xm, self.ym = np.meshgrid(x,y); self.n=n;self.m=m;  self.mn = mn; self.correspondence = []
+        self.f = f; self.degree = degree; self.xm, self.ym = np.meshgrid(x,y); self.n=n;self.m=m;  self.mn = mn
         
         # Making a sequence xy containing the pairs (x_i,y_j) for i,j=0,...,n, and a sequence z with matching pairs z_ij = f(x_i, y_j)
-        counter = 0
-        for i in range(0,m):
-            for j in range(0,n):
-                z[counter]=f[j,i] #wtf
-                xy[counter,:] = [x[i],y[j]]
-                self.correspondence.append([i,j]) #Saves the 1-1 correspondence: {counter} <-> {(i,j)} for later
-                counter+=1
-        self.z = z
-
-        # Make X
-        number_basis_elts=int((degree+2)*(degree+1)/2) #(degree+1)th triangular number (number of basis elements for R[x,y] of degree <= degree)
-        X = np.zeros((mn,number_basis_elts))
-        powers = []
-        for i in range(0,mn):
-            counter = 0
-            for j in range(0,degree+1):
-                k = 0
-                while j+k <= degree:
-                    xi = xy[i,0]
-                    yi = xy[i,1]
-                    X[i,counter]= (xi**j)*(yi**k)
-                    powers.append([j , k])
-                    k+=1
-                    counter+=1
+        # The points are ordered with i as the slow index, counter = i*n + j
+        self.z = z = np.ravel(np.transpose(f))
+        self.correspondence = np.stack(np.meshgrid(np.arange(m), np.arange(n), indexing='ij'), axis=-1).reshape(mn, 2)
+        xy = np.stack(np.meshgrid(x, y, indexing='ij'), axis=-1).reshape(mn, 2)
+
+        # Make X, columns ordered by total degree: 1, x, y, x^2, xy, y^2, ...
+        X = design_matrix(xy[:,0], xy[:,1], degree)
         self.X = X
-        self.powers = powers
-        self.number_basis_elts = number_basis_elts
-        self.invXTX = linalg.inv(np.matmul(np.transpose(X),X))
+        self.powers = poly_powers(degree)
+        self.number_basis_elts = n_terms(degree) #(degree+1)th triangular number (number of basis elements for R[x,y] of degree <= degree)
+        self.solver = get_solver(solver); self.solver_name = solver
+        self.invXTX = self.solver.inv_gram(X)
 
     # Regression
     def get_reg(self, *args):
@@ -231,54 +209,34 @@ class regdata:
         Ridge or Lasso regression depending on the arguments. If *args is empty, then beta is found using
         ordinary least square. If *args contains a number it will be treated as a bias LAMBDA for a Ridge regression.
         If *args contains two numbers, then the first will count as a LAMBDA and the second as a tolerance epsilon.
-        In this case beta is found using a shooting algorithm that runs until it converges up to the set tolerance.
+        In this case beta is found by coordinate descent (see lasso.py), epsilon being the tolerance of its sweeps.
         '''
 
-        XT = np.transpose(X)
-        beta = np.matmul(XT,X)                   
+        LAMBDA = 0.0
         if len(args) >= 1: #Ridge parameter LAMBDA
             LAMBDA = args[0] 
-            beta[np.diag_indices_from(beta)]+=LAMBDA
-        beta = SVDinv(beta)
-        beta = np.matmul(beta,XT)
-        beta = np.matmul(beta,z)
-
-        #Shooting algorithm for Lasso
-        if len(args)>=2:
+        if len(args)>=2: #Lasso, tolerance epsilon
             epsilon = args[1]
-            D = self.number_basis_elts
-            ints = np.arange(0,D,1)
-            beta_old = 0.0
-            while np.linalg.norm(beta-beta_old)>=epsilon:
-                beta_old = np.copy(beta)
-                for j in range(0,D):
-                    aj = 2*np.sum(X[:,j]**2)
-                    no_j = ints[np.arange(D)!=j]
-                    cj = 2*np.sum(np.multiply(X[:,j],(z-np.matmul(X[:,no_j],beta[no_j]))))
-                    if cj<-LAMBDA:
-                        beta[j]=(cj+LAMBDA)/aj
-                    elif cj > LAMBDA:
-                        beta[j]=(cj-LAMBDA)/aj
-                    else:
-                        beta[j]=0.0
+            return CoordinateDescent(X,z).fit(LAMBDA,tol=epsilon)
+        beta = self.solver.solve(X,z,LAMBDA)
         return beta
 
+    # Lasso fits for many LAMBDA
+    def get_lasso_path(self, lambdas, epsilon):
+        '''Returns the list of Lasso fits for each LAMBDA in lambdas. The fits are computed from the largest
+        to the smallest LAMBDA, each one starting from the previous solution.
+        '''
+        lambdas, betas = CoordinateDescent(self.X,self.z).path(lambdas,tol=epsilon)
+        return [self.model(betas[:,i]) for i in range(len(lambdas))]
+
     # Get model given beta
     def model(self,beta):
         '''Returns heigh values based on the coefficients beta as a matrix
         that matches the grid xm, ym. The degree of the polynomial equals self.degree.
         '''
-        xm = self.xm; ym = self.ym; degree = self.degree #relabeling self variables
-        s=0
-        counter = 0
-        # loop that adds terms of the form beta*x^j*y^k such that j+k<=5
-        for j in range(0,degree + 1):
-            k = 0
-            while j+k <= degree: 
-                s+= beta[counter]*(xm**j)*(ym**k)
-                counter +=1
-                k+=1
-        return s
+        m = self.m; n = self.n #relabeling self variables
+        # the rows of X run over the grid with x as the slow index
+        return np.transpose(np.reshape(np.matmul(self.X, beta), (m, n)))
 
     def get_data_partition(self,k):
         ''' Creates a random partition of k (almost) equally sized parts of the array
@@ -290,7 +248,7 @@ class regdata:
         np.random.shuffle(indices_shuffle)
         partition = []
         for step in range(0,k):
-            part = list(indices_shuffle[step:mn:k])
+            part = indices_shuffle[step:mn:k] # an index array (a view, no copy)
             #part = [correspondence[i] for i in part]
             partition.append(part) 
         return partition
@@ -306,6 +264,15 @@ class regdata:
         betanew = self.get_beta(Xnew,znew,*args)
         return betanew
 
+    def bootstrap(self, N, samplesize, *args, **kwargs):
+        '''Returns the coefficients of N bootstrap fits as the rows of an array, see bootstrap_step.
+        The fits run in parallel on a resampling.Resampler, kwargs (backend, n_workers, seed) are passed on to it.
+        Every sample is drawn with its own generator spawned from seed, so the result does not depend on the
+        number of workers.
+        '''
+        step = partial(bootstrap_beta, samplesize=samplesize, args=args, solver=self.solver_name)
+        return np.array(Resampler(**kwargs).run(step, N, {'X': self.X, 'z': self.z}))
+
     # Variance/ covariance matrix
     def var_covar_matrix(self,reg):
         ''' Returns the variance/covariance matrix for beta based on the given data.
@@ -399,12 +366,13 @@ def plot_R2_scores(data,Nstart,Nstop,name, epsilon = 0.001):
     R2_ols = np.zeros(N)
     R2_Ridge = np.zeros(N)
     R2_Lasso = np.zeros(N)
+    lasso_fits = data.get_lasso_path(10.0**np.arange(Nstart,Nstop),epsilon) # warm started Lasso path
     for i in range(0,N):
         LAMBDA = 10**(Nstart+i)
         lambdas[i]=LAMBDA
         R2_ols[i]=R2(f, data.get_reg())
         R2_Ridge[i]=R2(f, data.get_reg(LAMBDA))
-        R2_Lasso[i]=R2(f, data.get_reg(LAMBDA,epsilon))
+        R2_Lasso[i]=R2(f, lasso_fits[i])
         print("Completed lambda: ", LAMBDA, " Completion: {:.1%}".format(float(i)/(N-1)))
     plotitle = '$R^2$ score of degree {} polynomial fit on {}'.format(degree,name)
     plt.figure()
@@ -494,6 +462,24 @@ def plot_R2_scores_k_cross_validation(data,Nstart,Nstop,k,name, epsilon = 0.001)
 
 #================================================================================================================
 
+def grid_sweep(f, max_degree, LAMBDA = 0.0):
+    ''' Returns a DegreeSweep (see degreesweep.py) for OLS (or Ridge if LAMBDA > 0) fits of the grid data f
+    of all degrees up to max_degree, with the points ordered as in regdata.
+    '''
+    m = len(f[0,:]); n = len(f)
+    xm, ym = np.meshgrid(np.linspace(0, 1, m), np.linspace(0, 1, n), indexing='ij')
+    # OLS with QR: the normal equations of the high degree monomials are too ill-conditioned
+    method = 'qr' if LAMBDA == 0 else 'cholesky'
+    return DegreeSweep(xm, ym, np.transpose(f), method = method, lambda_ = LAMBDA, max_degree = max_degree)
+
+def grid_reg(sweep, f, degree):
+    ''' Returns the polynomial fit of the given degree from grid_sweep(f, ...) as a matrix matching f.
+    '''
+    m = len(f[0,:]); n = len(f)
+    return np.transpose(np.reshape(sweep.predict(degree), (m, n)))
+
+#================================================================================================================
+
 def plot_R2_complexity(degstart,degend,degstep,f,name, LAMBDA = 0.00001, epsilon = 0.001):
     ''' Comparing R2 scores, regression with fixed LAMBDA, variable degree as well as variance and Bias
     Plotting the result.
@@ -501,10 +487,12 @@ def plot_R2_complexity(degstart,degend,degstep,f,name, LAMBDA = 0.00001, epsilon
     degrees = np.arange(degstart,degend+1,degstep)
     N = len(degrees)
     R2_ols, R2_Ridge, R2_Lasso = np.zeros(N), np.zeros(N), np.zeros(N)
+    # OLS and Ridge fits of all degrees share one growing factorization
+    sweep_ols, sweep_ridge = grid_sweep(f,degend), grid_sweep(f,degend,LAMBDA)
     for i, degree in enumerate(degrees):
         data_f = regdata(f,degree)
-        R2_ols[i]=R2(f, data_f.get_reg())
-        R2_Ridge[i]=R2(f, data_f.get_reg(LAMBDA))
+        R2_ols[i]=R2(f, grid_reg(sweep_ols,f,degree))
+        R2_Ridge[i]=R2(f, grid_reg(sweep_ridge,f,degree))
         R2_Lasso[i]=R2(f, data_f.get_reg(LAMBDA,epsilon))
         print("Completed degree: ", degree, " Completion: {:.1%}".format(float(i)/(N-1)))
     plotitle = '$R^2$ score of polynomial fit on {} with $\lambda=${}'.format(name,LAMBDA)
@@ -532,10 +520,12 @@ def plot_MSE_variance(degstart, degend, degstep, f, LAMBDA = 0.01, epsilon = 0.0
     # function for plotting
     def makeplot(methodname, *args, partition = None):
         print(methodname)
+        if partition == None and len(args) < 2:
+            sweep = grid_sweep(f,degend,*args) # OLS/Ridge: one factorization for all degrees
         for i, degree in enumerate(degrees):
             data = regdata(f,degree)
             if partition == None:
-                freg = data.get_reg(*args)
+                freg = grid_reg(sweep,f,degree) if len(args) < 2 else data.get_reg(*args)
                 fvar[i], fbias[i], fMSE[i], fextra_terms[i] =  var(freg), bias(f,freg), MSE(f,freg), extra_term(f,freg)
             else:
                 kval = k_cross_validation(data, partition, *args)
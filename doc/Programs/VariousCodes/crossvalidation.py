@@ -0,0 +1,177 @@
+"""
+Cross-validation of OLS, Ridge and Lasso without building a training set
+for every fold.
+
+Leave-one-out: for a linear smoother z_hat = H z the leave-one-out residual
+of point i is (z_i - z_hat_i)/(1 - h_ii), so the exact LOOCV error follows
+from one fit and the leverages h_ii (see ridgepath.py, which gives them for
+many lambdas from one SVD).
+
+k-fold: with the rows of fold k collected in X_k, z_k, the coefficients of
+the model trained on all other folds solve
+
+    (X^T X - X_k^T X_k + lambda I) beta_k = X^T z - X_k^T z_k.
+
+FoldStatistics makes a single pass over the data to get the per-fold blocks
+X_k^T X_k and X_k^T z_k; after that every fold costs O(p^3) for the p x p
+solve plus O(n_k p) for its test predictions, independent of n, and the
+training errors follow from the same blocks. The total cost no longer grows
+with the number of folds as k refits on n - n_k points do. Lasso fits are
+still iterative, but coordinate descent only needs the same two blocks (see
+lasso.py), so no fold ever builds its training design matrix, and the
+memory is O(k p^2) for the blocks whatever n is. Since this works with the
+normal equations it squares the condition number of X; use it for the
+moderate degrees where that is harmless.
+
+Folds are arrays of row indices; complement gives the training rows of a
+fold when a model really needs them.
+"""
+import numpy as np
+from scipy import linalg
+from ridgepath import RidgePath
+from lasso import CoordinateDescent
+
+
+def loocv(X, z, lambdas=0.0, fit_intercept=False):
+    """
+    Exact leave-one-out mean squared error of OLS (lambda = 0) or Ridge,
+    for each value in lambdas.
+    """
+    return RidgePath(X, z, lambdas, fit_intercept=fit_intercept).loocv
+
+
+def complement(test, n):
+    """
+    Indices 0,...,n-1 which are not in test, in increasing order.
+    """
+    mask = np.ones(n, dtype=bool)
+    mask[test] = False
+    return np.flatnonzero(mask)
+
+
+def _solve_gram(G, b, lambda_):
+    """
+    Solves (G + lambda I) beta = b, falling back to least squares if the
+    matrix is singular (e.g. more parameters than training points).
+    """
+    A = G.copy()
+    A[np.diag_indices_from(A)] += lambda_
+    try:
+        return linalg.cho_solve(linalg.cho_factor(A), b)
+    except linalg.LinAlgError:
+        return linalg.lstsq(A, b)[0]
+
+
+class FoldStatistics:
+    """
+    Per-fold sufficient statistics of the design matrix X and data z for the
+    folds given as a list of index arrays. Points which are in no fold are
+    always part of the training data. Use as
+
+        cv = FoldStatistics(X, z, folds)
+        betas = cv.coef(lambda_)              # one row per fold
+        z_cv = cv.predict(lambda_)            # each point predicted without its fold
+        test_mse, train_mse = cv.mse(lambda_)
+
+    All methods take lambda_ and an optional tolerance epsilon, as the
+    arguments of Methods.regdata.get_beta: OLS for lambda_ = 0, Ridge for
+    lambda_ > 0, and Lasso (by coordinate descent) when epsilon is given.
+    """
+    def __init__(self, X, z, folds):
+        self.X = X
+        self.z = z = np.ravel(z).astype(np.float64)
+        self.folds = [np.asarray(fold, dtype=int) for fold in folds]
+        self.k = len(self.folds)
+        p = X.shape[1]
+        self.G = np.dot(X.T, X)
+        self.b = np.dot(X.T, z)
+        self.zz = np.dot(z, z)
+        self.zsum = np.sum(z)
+        self.n = len(z)
+        self.G_k = np.zeros((self.k, p, p))
+        self.b_k = np.zeros((self.k, p))
+        self.zz_k = np.zeros(self.k)
+        self.zsum_k = np.zeros(self.k)
+        self.n_k = np.array([len(fold) for fold in self.folds])
+        for i, fold in enumerate(self.folds):
+            X_k = X[fold]; z_k = z[fold]
+            self.G_k[i] = np.dot(X_k.T, X_k)
+            self.b_k[i] = np.dot(X_k.T, z_k)
+            self.zz_k[i] = np.dot(z_k, z_k)
+            self.zsum_k[i] = np.sum(z_k)
+        self._coef = {}
+
+    def train_statistics(self, i):
+        """
+        Returns X^T X, X^T z, z^T z, sum(z) and the number of points of the
+        training data of fold i (all points not in fold i).
+        """
+        return (self.G - self.G_k[i], self.b - self.b_k[i], self.zz - self.zz_k[i],
+                self.zsum - self.zsum_k[i], self.n - self.n_k[i])
+
+    def coef(self, lambda_=0.0, epsilon=None):
+        """
+        Coefficients of the models trained without each fold, one row per fold.
+        """
+        key = (lambda_, epsilon)
+        if key not in self._coef:
+            betas = []
+            for i in range(self.k):
+                G, b = self.train_statistics(i)[:2]
+                if epsilon is None:
+                    betas.append(_solve_gram(G, b, lambda_))
+                else:
+                    betas.append(CoordinateDescent(XTX=G, XTz=b).fit(lambda_, tol=epsilon))
+            self._coef[key] = np.array(betas)
+        return self._coef[key]
+
+    def fold_predictions(self, lambda_=0.0, epsilon=None):
+        """
+        List with the predictions for the points of each fold from the model
+        trained without that fold.
+        """
+        betas = self.coef(lambda_, epsilon)
+        return [np.dot(self.X[fold], betas[i]) for i, fold in enumerate(self.folds)]
+
+    def predict(self, lambda_=0.0, epsilon=None):
+        """
+        Cross-validated predictions: each point of a fold is predicted by the
+        model trained without that fold (NaN for points in no fold).
+        """
+        z_cv = np.full(self.n, np.nan)
+        for fold, z_fold in zip(self.folds, self.fold_predictions(lambda_, epsilon)):
+            z_cv[fold] = z_fold
+        return z_cv
+
+    def train_rss(self, lambda_=0.0, epsilon=None):
+        """
+        Residual sums of squares of each fold model on its own training data,
+        |z - X beta|^2 = z^T z - 2 beta^T X^T z + beta^T X^T X beta.
+        """
+        betas = self.coef(lambda_, epsilon)
+        rss = np.zeros(self.k)
+        for i in range(self.k):
+            G, b, zz = self.train_statistics(i)[:3]
+            beta = betas[i]
+            rss[i] = zz - 2*np.dot(beta, b) + np.dot(beta, np.dot(G, beta))
+        return rss
+
+    def train_r2(self, lambda_=0.0, epsilon=None):
+        """
+        R2 score of each fold model on its own training data.
+        """
+        rss = self.train_rss(lambda_, epsilon)
+        r2 = np.zeros(self.k)
+        for i in range(self.k):
+            zz, zsum, n = self.train_statistics(i)[2:]
+            r2[i] = 1.0 - rss[i]/(zz - zsum**2/n)
+        return r2
+
+    def mse(self, lambda_=0.0, epsilon=None):
+        """
+        Mean over the folds of the test and of the training mean squared errors.
+        """
+        test = [np.mean((self.z[fold] - z_fold)**2)
+                for fold, z_fold in zip(self.folds, self.fold_predictions(lambda_, epsilon))]
+        train = self.train_rss(lambda_, epsilon)/(self.n - self.n_k)
+        return np.mean(test), np.mean(train)
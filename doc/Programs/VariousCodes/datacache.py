@@ -0,0 +1,126 @@
+"""
+Parse-once cache for the text data files read by the scripts.
+
+    data = cached(path, pd.read_csv, names=('ID', 'Age', 'Agegroup', 'CHD'))
+
+calls the reader (pd.read_csv, pd.read_fwf, np.loadtxt, ...) with the given
+arguments only the first time. The result, a DataFrame or an array, is stored
+column by column as .npy files in the folder
+
+    <folder of the file>/.datacache/<file name>.<hash of reader and arguments>/
+
+together with meta.json, which records the modification time, size and
+SHA-1 hash of the text file. On later runs the columns are memory mapped
+(read-only, without parsing or copying). The cache is rebuilt when the file
+has changed. If only the modification time differs (a fresh checkout or a
+copy) the hash decides, so an unchanged file is not parsed again.
+
+Numeric columns keep their dtype. Text (object) columns are stored as
+fixed-width unicode strings, so missing values in them come back as 'nan'.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+CACHE_DIR = '.datacache'
+
+
+def file_hash(path, blocksize=2**20):
+    """
+    SHA-1 hex digest of the contents of a file.
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_folder(path, reader, args, kwargs):
+    """
+    Folder of the cache of path read by reader(path, *args, **kwargs).
+    """
+    call = repr((getattr(reader, '__module__', None), getattr(reader, '__name__', repr(reader)),
+                 args, sorted(kwargs.items())))
+    key = hashlib.sha1(call.encode()).hexdigest()[:12]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR,
+                        os.path.basename(path) + '.' + key)
+
+
+def _read_meta(folder):
+    try:
+        with open(os.path.join(folder, 'meta.json')) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _write_meta(folder, meta):
+    tmp = os.path.join(folder, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(folder, 'meta.json'))
+
+
+def _column(values):
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values
+
+
+def _store(folder, data, meta):
+    """
+    Writes the columns of data and then meta.json, which marks the cache as
+    complete.
+    """
+    os.makedirs(folder, exist_ok=True)
+    if os.path.exists(os.path.join(folder, 'meta.json')):
+        os.remove(os.path.join(folder, 'meta.json'))
+    if isinstance(data, pd.DataFrame):
+        meta['kind'] = 'frame'
+        meta['columns'] = [c if isinstance(c, (int, str)) else str(c) for c in data.columns]
+        for i in range(data.shape[1]):
+            np.save(os.path.join(folder, '%d.npy' % i), _column(data.iloc[:, i]))
+        meta['index'] = not data.index.equals(pd.RangeIndex(len(data)))
+        if meta['index']:
+            np.save(os.path.join(folder, 'index.npy'), _column(data.index))
+    else:
+        meta['kind'] = 'array'
+        np.save(os.path.join(folder, 'array.npy'), _column(data))
+    _write_meta(folder, meta)
+
+
+def _load(folder, meta):
+    def column(name):
+        return np.load(os.path.join(folder, name), mmap_mode='r')
+    if meta['kind'] == 'array':
+        return column('array.npy')
+    columns = dict((i, column('%d.npy' % i)) for i in range(len(meta['columns'])))
+    index = column('index.npy') if meta['index'] else None
+    frame = pd.DataFrame(columns, index=index, copy=False)
+    frame.columns = meta['columns']
+    return frame
+
+
+def cached(path, reader, *args, **kwargs):
+    """
+    reader(path, *args, **kwargs), parsed once and then served from the
+    cache, see the module docstring.
+    """
+    folder = cache_folder(path, reader, args, kwargs)
+    stat = os.stat(path)
+    meta = _read_meta(folder)
+    if meta is not None and (meta['mtime'], meta['size']) != (stat.st_mtime_ns, stat.st_size):
+        if meta['size'] == stat.st_size and meta['sha1'] == file_hash(path):
+            meta['mtime'] = stat.st_mtime_ns
+            _write_meta(folder, meta)
+        else:
+            meta = None
+    if meta is None:
+        meta = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': file_hash(path)}
+        _store(folder, reader(path, *args, **kwargs), meta)
+    return _load(folder, meta)
@@ -0,0 +1,190 @@
+"""
+Least squares fits of 2D polynomials over a range of degrees.
+
+Going from degree p to p+1 only adds the p+2 monomials of total degree p+1
+as new columns of the design matrix. DegreeSweep appends these columns,
+updates X^T X and X^T z by block and extends the factorization in place,
+
+    cholesky:  [L11  0 ] [L11^T L21^T]   [G11 G12]
+               [L21 L22] [ 0    L22^T] = [G21 G22],   L21 = G21 L11^-T,
+                                                      L22 L22^T = G22 - L21 L21^T
+
+    qr:        [X1 X2] = [Q1 Q2] [R11 R12]
+                                 [ 0  R22],   R12 = Q1^T X2, Q2 R22 = X2 - Q1 R12
+
+so a whole complexity sweep costs about one factorization of the largest
+model. Since the leading blocks of the factors are the factors of the
+leading blocks, any degree up to the largest one built can be solved
+without further work.
+"""
+import numpy as np
+from scipy import linalg
+from designmatrix import design_matrix, n_terms
+
+
+class DegreeSweep:
+    """
+    Polynomial fits of z(x, y) for increasing degree. method is 'cholesky'
+    (normal equations, also used for Ridge with lambda_ > 0) or 'qr' (better
+    conditioned, OLS only). An OLS sweep whose normal equations break down
+    goes on with 'qr' from that degree. Use as
+
+        sweep = DegreeSweep(x, y, z, max_degree=20)
+        for degree in range(21):
+            beta = sweep.fit(degree)
+            ztilde = sweep.predict(degree)
+    """
+    def __init__(self, x, y, z, method='cholesky', lambda_=0.0, max_degree=None, dtype=np.float64):
+        if method not in ('cholesky', 'qr'):
+            raise ValueError("method must be 'cholesky' or 'qr'")
+        if method == 'qr' and lambda_ != 0:
+            raise ValueError("Ridge (lambda_ > 0) is only supported with method='cholesky'")
+        self.x = np.ravel(x)
+        self.y = np.ravel(y)
+        self.z = np.ravel(z)
+        self.method = method
+        self.lambda_ = lambda_
+        self.max_degree = max_degree
+        self.dtype = dtype
+        self.degree = -1
+        self.X = None
+        p = n_terms(max_degree) if max_degree is not None else 0
+        # X^T X, X^T z and the factors are kept in buffers sized for max_degree
+        self.XTX = np.zeros((p, p))
+        self.XTz = np.zeros(p)
+        self.L = np.zeros((p, p))
+        self.Q = np.zeros((len(self.z), p if method == 'qr' else 0), order='F')
+        self.QTz = np.zeros(p)
+
+    def design_matrix(self, degree=None):
+        """
+        Design matrix for the given degree (default: the largest one built).
+        """
+        if degree is None:
+            degree = self.degree
+        if degree <= self.degree:
+            # our own reference stays valid even if the shared cache drops the matrix
+            return self.X[:, :n_terms(degree)]
+        return design_matrix(self.x, self.y, degree, dtype=self.dtype, max_degree=self.max_degree)
+
+    def _reserve(self, p):
+        """
+        Makes room for p columns in the Gram and factor buffers.
+        """
+        if len(self.XTz) >= p:
+            return
+        p_old = len(self.XTz)
+        for name in ('XTX', 'L'):
+            new = np.zeros((p, p))
+            new[:p_old, :p_old] = getattr(self, name)
+            setattr(self, name, new)
+        if self.method == 'qr':
+            # grow geometrically, copying the orthonormal columns is O(n p)
+            new = np.zeros((len(self.z), max(p, 2*self.Q.shape[1])), order='F')
+            new[:, :p_old] = self.Q[:, :p_old]
+            self.Q = new
+        for name in ('XTz', 'QTz'):
+            new = np.zeros(p)
+            new[:p_old] = getattr(self, name)
+            setattr(self, name, new)
+
+    def _switch_to_qr(self, p1):
+        """
+        Replaces the Cholesky factor of the first p1 columns by their QR
+        factors, so that an OLS sweep continues with method='qr'.
+        """
+        self.method = 'qr'
+        self.Q = np.zeros((len(self.z), len(self.XTz)), order='F')
+        if p1 > 0:
+            Q1, R11 = linalg.qr(self.X[:, :p1], mode='economic')
+            self.Q[:, :p1] = Q1
+            self.L[:p1, :p1] = R11.T
+            self.QTz[:p1] = np.dot(Q1.T, self.z)
+
+    def extend(self, degree):
+        """
+        Adds the monomials of degree self.degree+1,...,degree to the model.
+        """
+        if degree <= self.degree:
+            return
+        p1 = n_terms(self.degree)
+        p = n_terms(degree)
+        self._reserve(p)
+        self.X = X = self.design_matrix(degree)
+        X1 = X[:, :p1]; X2 = X[:, p1:]
+
+        # Block update of X^T X and X^T z
+        G12 = np.dot(X1.T, X2)
+        G22 = np.dot(X2.T, X2)
+        self.XTX[:p1, p1:p] = G12
+        self.XTX[p1:p, :p1] = G12.T
+        self.XTX[p1:p, p1:p] = G22
+        self.XTz[p1:p] = np.dot(X2.T, self.z)
+
+        if self.method == 'cholesky':
+            L11 = self.L[:p1, :p1]
+            L21 = linalg.solve_triangular(L11, G12, lower=True).T if p1 > 0 else np.zeros((p-p1, 0))
+            S = G22 - np.dot(L21, L21.T)
+            S[np.diag_indices_from(S)] += self.lambda_
+            try:
+                L22 = linalg.cholesky(S, lower=True)
+            except linalg.LinAlgError:
+                # X^T X squares the condition number of X, and for high degrees it is no longer
+                # positive definite in floating point. OLS goes on with QR, which works on X
+                if self.lambda_ != 0:
+                    raise linalg.LinAlgError("X^T X + lambda I is not positive definite at degree %d, "
+                                             "use a larger lambda_" % degree)
+                self._switch_to_qr(p1)
+            else:
+                self.L[p1:p, :p1] = L21
+                self.L[p1:p, p1:p] = L22
+        if self.method == 'qr':
+            # Block Gram-Schmidt with one reorthogonalization, R is stored transposed in L
+            W = np.array(X2, dtype=np.float64)
+            R12 = np.zeros((p1, p-p1))
+            if p1 > 0:
+                Q1 = self.Q[:, :p1]
+                for _ in range(2):
+                    C = np.dot(Q1.T, W)
+                    W -= np.dot(Q1, C)
+                    R12 += C
+            Q2, R22 = linalg.qr(W, mode='economic')
+            self.Q[:, p1:p] = Q2
+            self.L[p1:p, :p1] = R12.T
+            self.L[p1:p, p1:p] = R22.T
+            self.QTz[p1:p] = np.dot(Q2.T, self.z)
+        self.degree = degree
+
+    def fit(self, degree=None):
+        """
+        Returns the coefficients beta of the fit of the given degree,
+        extending the factorization if needed.
+        """
+        if degree is None:
+            degree = self.degree
+        self.extend(degree)
+        p = n_terms(degree)
+        L = self.L[:p, :p]
+        if self.method == 'cholesky':
+            w = linalg.solve_triangular(L, self.XTz[:p], lower=True)
+        else:
+            w = self.QTz[:p]
+        return linalg.solve_triangular(L.T, w, lower=False)
+
+    def predict(self, degree=None, x=None, y=None):
+        """
+        Fitted values of the given degree, on the training points or on (x, y).
+        """
+        if degree is None:
+            degree = self.degree
+        beta = self.fit(degree)
+        if x is None:
+            return np.dot(self.design_matrix(degree), beta)
+        return np.dot(design_matrix(x, y, degree, cache=False), beta)
+
+    def sweep(self, degrees):
+        """
+        Returns the list of coefficients for each degree in degrees.
+        """
+        self.extend(max(degrees))
+        return [self.fit(degree) for degree in degrees]
@@ -0,0 +1,168 @@
+"""
+Polynomial design matrices in two variables, shared by the regression codes.
+
+The columns are ordered by total degree,
+
+    1, x, y, x^2, xy, y^2, x^3, x^2y, xy^2, y^3, ...
+
+so the design matrix of degree p is the first (p+1)(p+2)/2 columns of the
+design matrix of any degree q >= p. We exploit this by caching, for each
+data set, the largest matrix built so far. Asking for a lower degree returns
+a column slice (a view, no copy), asking for a higher degree only computes
+the missing columns.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# Number of cached data sets kept in memory
+CACHE_SIZE = 4
+# Minimal growth factor of the number of columns when a cached matrix is extended
+GROWTH = 1.5
+
+_cache = OrderedDict()
+# The cache may be used from several threads (see resampling.py)
+_lock = threading.RLock()
+
+
+def n_terms(degree):
+    """
+    Number of monomials x^i y^j with i + j <= degree.
+    """
+    return (degree+1)*(degree+2)//2
+
+
+def poly_powers(degree):
+    """
+    Returns the list of exponents (i, j) of the monomials x^i y^j,
+    in the same order as the columns of design_matrix.
+    """
+    return [(d-k, k) for d in range(degree+1) for k in range(d+1)]
+
+
+def power_table(x, degree, dtype=np.float64):
+    """
+    Returns the array P with P[k] = x**k for k = 0,...,degree,
+    computed by repeated multiplication.
+    """
+    P = np.empty((degree+1, len(x)), dtype=dtype)
+    P[0] = 1
+    if degree > 0:
+        P[1] = x
+    for k in range(2, degree+1):
+        np.multiply(P[k-1], x, out=P[k])
+    return P
+
+
+def fingerprint(*arrays):
+    """
+    Hash of the contents of the given arrays, used as cache key for the
+    design matrix (and for cached factorizations, see solvers.py).
+    """
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.asarray(a)
+        if a.flags.f_contiguous and not a.flags.c_contiguous:
+            a = a.T
+        a = np.ascontiguousarray(a)
+        h.update(str((a.shape, a.dtype.str)).encode())
+        h.update(a.view(np.uint8))
+    return h.hexdigest()
+
+
+def _extend_powers(P, x, degree):
+    """
+    Returns the power table of x up to degree, reusing the rows of P.
+    """
+    if len(P) > degree:
+        return P
+    Pnew = np.empty((degree+1, len(x)), dtype=P.dtype)
+    Pnew[:len(P)] = P
+    for k in range(len(P), degree+1):
+        np.multiply(Pnew[k-1], x, out=Pnew[k])
+    return Pnew
+
+
+def _fill(X, Px, Py, start_degree, degree):
+    """
+    Writes the columns of total degree start_degree,...,degree into X,
+    given the power tables Px and Py.
+    """
+    for d in range(start_degree, degree+1):
+        q = n_terms(d-1)
+        for k in range(d+1):
+            np.multiply(Px[d-k], Py[k], out=X[:, q+k])
+
+
+def _capacity_degree(degree, built_degree):
+    """
+    Degree to allocate for when the cached matrix of degree built_degree must
+    grow to degree. The number of columns grows at least geometrically, so a
+    sweep over increasing degrees copies every column only O(1) times.
+    """
+    cap = degree
+    while built_degree >= 0 and n_terms(cap) < GROWTH*n_terms(built_degree):
+        cap += 1
+    return cap
+
+
+def design_matrix(x, y, degree=5, dtype=np.float64, cache=True, max_degree=None):
+    """
+    Creates the design matrix with rows [1, x, y, x^2, xy, y^2, ...] up to the
+    given polynomial degree. x and y may be meshes, they are raveled.
+
+    The matrix is stored column by column (Fortran order) and may be float32
+    by passing dtype=np.float32. With cache=True the result is memoized on
+    (data fingerprint, dtype) and is returned read-only, since it may be
+    shared with other callers; take a copy if you need to modify it.
+    Passing max_degree reserves room for a later sweep up to that degree,
+    so no column is ever computed or copied twice.
+    """
+    x = np.ravel(x)
+    y = np.ravel(y)
+    if x.shape != y.shape:
+        raise ValueError("x and y must have the same number of points")
+    dtype = np.dtype(dtype)
+    l = n_terms(degree)
+
+    if not cache:
+        X = np.empty((len(x), l), dtype=dtype, order='F')
+        _fill(X, power_table(x, degree, dtype), power_table(y, degree, dtype), 0, degree)
+        return X
+
+    key = (fingerprint(x, y), dtype.str)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            entry = _cache[key] = [None, -1, power_table(x, 0, dtype), power_table(y, 0, dtype)]
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        _cache.move_to_end(key)
+        buf, built_degree, Px, Py = entry
+
+        if degree > built_degree:
+            if buf is None or buf.shape[1] < l:
+                # Grow the buffer and the power tables, keeping what is computed so far
+                cap = _capacity_degree(max(degree, max_degree or 0), built_degree)
+                new = np.empty((len(x), n_terms(cap)), dtype=dtype, order='F')
+                if buf is not None:
+                    new[:, :n_terms(built_degree)] = buf[:, :n_terms(built_degree)]
+                buf = new
+                Px = _extend_powers(Px, x, cap)
+                Py = _extend_powers(Py, y, cap)
+            _fill(buf, Px, Py, built_degree+1, degree)
+            entry[:] = buf, degree, Px, Py
+
+        X = buf[:, :l]
+    X.flags.writeable = False
+    return X
+
+
+def clear_cache():
+    """
+    Drops all cached design matrices.
+    """
+    with _lock:
+        _cache.clear()
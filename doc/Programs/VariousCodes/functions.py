@@ -1,6 +1,8 @@
 import sys
 import numpy as np
 from matplotlib import cm
+from designmatrix import design_matrix
+from crossvalidation import FoldStatistics, complement
 """
 A file for all common functions used in project 1
 """
@@ -32,21 +34,9 @@ def create_X(x, y, n = 5):
 	"""
 	Function for creating a X-matrix with rows [1, x, y, x^2, xy, xy^2 , etc.]
 	Input is x and y mesh or raveled mesh, keyword agruments n is the degree of the polinomial you want to fit.
+	The matrix is built (and cached) by designmatrix.design_matrix, so it is read-only.
 	"""
-	if len(x.shape) > 1:
-		x = np.ravel(x)
-		y = np.ravel(y)
-
-	N = len(x)
-	l = int((n+1)*(n+2)/2)		# Number of elements in beta
-	X = np.ones((N,l))
-
-	for i in range(1,n+1):
-		q = int((i)*(i+1)/2)
-		for k in range(i+1):
-			X[:,q+k] = (x**(i-k))*(y**k)
-
-	return X
+	return design_matrix(x, y, n)
 
 
 def plot_surface(x, y, z, title = "", show = False, cmap=cm.coolwarm, figsize = None):
@@ -97,9 +87,10 @@ def train_test_data(x_,y_,z_,i):
 	returns learning arrays for x, y and z with (N-len(i)) dimetions
 	and test data with length (len(i))
 	"""
-	x_learn=np.delete(x_,i)
-	y_learn=np.delete(y_,i)
-	z_learn=np.delete(z_,i)
+	learn = complement(i, len(x_))
+	x_learn=x_[learn]
+	y_learn=y_[learn]
+	z_learn=z_[learn]
 	x_test=np.take(x_,i)
 	y_test=np.take(y_,i)
 	z_test=np.take(z_,i)
@@ -110,6 +101,8 @@ def train_test_data(x_,y_,z_,i):
 def K_fold(x,y,z,k,alpha,model,m=5, ret_std = False):
 	"""Function to who calculate the average MSE and R2 using k-fold.
 	Takes in x,y and z varibles for a dataset, k number of folds, alpha and which method beta shall use. (OLS,Ridge or Lasso)
+	With model = None the folds are fitted with Ridge (OLS for alpha = 0) without any refits, from block
+	downdates of X^T X (see crossvalidation.py).
 	Returns average MSE and average R2"""
 	print(m)
 	if len(x.shape) > 1:
@@ -128,11 +121,25 @@ def K_fold(x,y,z,k,alpha,model,m=5, ret_std = False):
 	Variance_=0
 	Bias_=0
 	betas = np.zeros((k,int((m+1)*(m+2)/2)))
+	if model is None:
+		folds = [i[t*n_k:(t+1)*n_k] for t in range(k)]
+		stats = FoldStatistics(create_X(x,y,n=m), z, folds)
+		betas = stats.coef(alpha)
+		for t, z_predict in enumerate(stats.fold_predictions(alpha)):
+			z_test = z[folds[t]]
+			MSE_+=MSE(z_test,z_predict)
+			R2_+=R2_Score(z_test,z_predict)
+			Bias_+=bias(z_test,z_predict)
+			Variance_+=variance(z_predict)
+		return (MSE_/k, R2_/k, Bias_/k, Variance_/k, np.std(betas, axis = 0), np.mean(betas, axis = 0))
+
+	# The design matrix is built once, the folds only select its rows
+	X_all = create_X(x,y,n=m)
 	for t in range(k):
-		x_,y_,z_,x_test,y_test,z_test=train_test_data(x,y,z,i[t*n_k:(t+1)*n_k])
-		X= create_X(x_,y_,n=m)
-		X_test= create_X(x_test,y_test,n=m)
-
+		test = i[t*n_k:(t+1)*n_k]
+		learn = complement(test, n)
+		X, z_ = X_all[learn], z[learn]
+		X_test, z_test = X_all[test], z[test]
 
 		model.fit(X,z_)
 		betas[t] = model.beta
@@ -0,0 +1,248 @@
+"""
+Parallel grid search over hyperparameters, with successive halving.
+
+The configurations are all combinations of the values of a grid, e.g.
+{'eta': eta_vals, 'lmbd': lmbd_vals}, numbered c = 0,...,n-1 in the order of
+itertools.product (the last parameter varies fastest, like the inner loop of
+the nested eta/lambda loops). One training is
+
+    scores, model = func(data, params, budget, rng)
+
+where data is a dict of read-only arrays, params the dict of one
+configuration, budget the amount of training (epochs, max_iter, boosting
+rounds, ...) and rng a numpy Generator. scores is a number or a dict of
+numbers (e.g. train and test accuracy), and metric names the one that ranks
+the configurations. Configuration c always gets generator c spawned from one
+SeedSequence, so a search is reproducible from one seed whatever the number
+of workers and the order in which the trainings finish.
+
+The trainings run in a pool of n_workers workers (threads, or processes
+which map the arrays of data from shared memory as in resampling.py). Every
+finished training is appended at once to the results table, one row
+(config, params, budget, scores, seconds) per training, and with
+log=fileName also written as a line of a CSV file, so a long sweep can be
+followed while it runs. Of the fitted models only the keep best are kept;
+the others are dropped as soon as they are scored, so a sweep never holds
+more than keep models (keep=0 keeps none, and the workers do not even send
+them back).
+
+Successive halving (Jamieson and Talwalkar 2016, the inner loop of
+Hyperband) stops hopeless configurations early. With budgets
+b_0 < b_1 < ... < b_R all configurations are trained with b_0, the best
+1/reduction of them are trained again with b_1, and so on up to b_R. A
+diverged learning rate or a far too strong penalty is then paid for with
+b_0 only, and the whole search costs about R + 1 full trainings per
+reduction^R configurations instead of one per configuration. Models are
+ranked first by the rung they reached and then by their score, so the kept
+models are those of the last rung. budgets=[epochs] is a plain grid search,
+and halving=True turns it into successive halving over the budgets
+halving_budgets(epochs, reduction) (epochs/9, epochs/3 and epochs by default).
+
+The math libraries (BLAS, OpenMP, TensorFlow) start as many threads as
+there are cores, so n_workers processes would run about cores^2 threads.
+Every worker is therefore limited to threads_per_worker threads (default
+1, so that the default n_workers = number of cores uses every core once):
+through OMP_NUM_THREADS and its relatives for the libraries a process
+worker loads later, and through threadpoolctl (installed with
+scikit-learn) for those already loaded. With the thread backend the limit
+holds for the whole process while the search runs. threads_per_worker=None
+leaves the libraries alone.
+
+Scripts using the process backend must guard their main code with
+if __name__ == '__main__'. Libraries that start threads when imported
+(TensorFlow) need start_method='spawn', which starts every worker as a fresh
+interpreter instead of a copy (fork) of the main process.
+"""
+import os
+import csv
+import time
+import heapq
+import itertools
+import multiprocessing
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from resampling import share_arrays, release_arrays, attach_arrays, shared_arrays
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+# Environment variables read by the math libraries when they start their thread pools
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                    'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS')
+
+
+def halving_budgets(max_budget, reduction=3, n_rungs=3):
+    """
+    The budgets max_budget/reduction^(n_rungs-1), ..., max_budget/reduction,
+    max_budget of successive halving, rounded to integers.
+    """
+    return [max(1, int(round(max_budget/reduction**(n_rungs - 1 - r)))) for r in range(n_rungs)]
+
+
+def print_row(row):
+    """
+    Prints a row of the results table, for report=print_row.
+    """
+    for name, value in row.items():
+        if name not in ('config', 'seconds'):
+            print(name, "=", value)
+    print()
+
+
+def _init_worker(specs, threads):
+    """
+    Process worker initializer: limits the math libraries to threads threads
+    and maps the shared arrays.
+    """
+    if threads is not None:
+        for name in THREAD_VARIABLES:
+            os.environ[name] = str(threads)
+        if threadpool_limits is not None:
+            threadpool_limits(threads)
+    attach_arrays(specs)
+
+
+def _train(func, data, params, budget, seed, send_model):
+    """
+    One training in a worker. data is None in process workers, which use
+    the arrays attached by attach_arrays.
+    """
+    if data is None:
+        data = shared_arrays()
+    start = time.perf_counter()
+    scores, model = func(data, params, budget, np.random.default_rng(seed))
+    seconds = time.perf_counter() - start
+    if not isinstance(scores, dict):
+        scores = {'score': scores}
+    return {name: float(value) for name, value in scores.items()}, model if send_model else None, seconds
+
+
+class GridSearch:
+    """
+    Grid search of func over grid, see the module docstring. metric is the
+    score that ranks the configurations (higher is better unless
+    greater_is_better=False), keep the number of models kept, budgets the
+    budgets of successive halving (with halving=True only the largest one
+    counts, the others are halving_budgets of it) and reduction the factor by
+    which the number of configurations shrinks from one rung to the next.
+    threads_per_worker limits the threads of every worker. report, if
+    given, is called with every row of the results table as it arrives.
+
+    After run, results holds the rows of the results table and best the
+    keep best (score, params, model), best first.
+    """
+    def __init__(self, func, grid, data=None, metric='score', greater_is_better=True, keep=1,
+                 budgets=(100,), halving=False, reduction=3, backend='process', n_workers=None,
+                 threads_per_worker=1, seed=None, start_method=None, log=None, report=None):
+        if backend not in ('thread', 'process'):
+            raise ValueError("backend must be 'thread' or 'process'")
+        if list(budgets) != sorted(budgets):
+            raise ValueError("budgets must be increasing")
+        self.func = func
+        self.names = list(grid)
+        # numpy scalars as plain Python numbers, for the table and the log
+        self.values = [[v.item() if isinstance(v, np.generic) else v for v in grid[name]] for name in self.names]
+        self.shape = tuple(len(values) for values in self.values)
+        self.configs = [dict(zip(self.names, values)) for values in itertools.product(*self.values)]
+        self.data = {} if data is None else data
+        self.metric = metric
+        self.greater_is_better = greater_is_better
+        self.keep = keep
+        self.budgets = halving_budgets(max(budgets), reduction) if halving else list(budgets)
+        self.reduction = reduction
+        self.backend = backend
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker
+        self.seed = seed
+        self.start_method = start_method
+        self.log = log
+        self.report = report
+
+    def _rank(self, scores):
+        # nan (a diverged training) ranks last
+        score = scores[self.metric]
+        if np.isnan(score):
+            return -np.inf
+        return score if self.greater_is_better else -score
+
+    def run(self):
+        n = len(self.configs)
+        seeds = np.random.SeedSequence(self.seed).spawn(n)
+        self.results, self._heap = [], []
+        self._writer = None
+        self.rung = np.zeros(n, dtype=int)
+        self.last = [None]*n
+        logfile = open(self.log, 'w', newline='') if self.log is not None else None
+        blocks, limits = [], None
+        try:
+            if self.backend == 'thread' or self.n_workers == 1:
+                if self.threads_per_worker is not None and threadpool_limits is not None:
+                    limits = threadpool_limits(self.threads_per_worker)
+                pool = ThreadPoolExecutor(self.n_workers)
+                data = self.data
+            else:
+                blocks, specs = share_arrays(self.data)
+                context = multiprocessing.get_context(self.start_method)
+                pool = ProcessPoolExecutor(self.n_workers, mp_context=context, initializer=_init_worker,
+                                           initargs=(specs, self.threads_per_worker))
+                data = None
+            with pool:
+                alive = list(range(n))
+                for r, budget in enumerate(self.budgets):
+                    futures = {pool.submit(_train, self.func, data, self.configs[c], budget, seeds[c],
+                                           self.keep > 0): c for c in alive}
+                    ranks = {}
+                    for future in as_completed(futures):
+                        c = futures[future]
+                        scores, model, seconds = future.result()
+                        ranks[c] = self._rank(scores)
+                        self._add(c, r, budget, scores, model, seconds, logfile)
+                    # the best 1/reduction of the configurations go on to the next rung
+                    n_next = int(np.ceil(len(alive)/self.reduction))
+                    alive = sorted(sorted(alive, key=lambda c: (-ranks[c], c))[:n_next])
+        finally:
+            if logfile is not None:
+                logfile.close()
+            release_arrays(blocks)
+            if limits is not None:
+                limits.restore_original_limits()
+        self.best = [(self.last[-neg_c][self.metric], self.configs[-neg_c], model)
+                     for rung, rank, neg_c, model in sorted(self._heap, reverse=True)]
+        del self._heap, self._writer
+        return self
+
+    def _add(self, c, r, budget, scores, model, seconds, logfile):
+        row = {'config': c, **self.configs[c], 'budget': budget, **scores, 'seconds': seconds}
+        self.results.append(row)
+        self.rung[c], self.last[c] = r, row
+        if logfile is not None:
+            if self._writer is None:
+                self._writer = csv.DictWriter(logfile, list(row))
+                self._writer.writeheader()
+            self._writer.writerow(row)
+            logfile.flush()
+        if self.keep > 0:
+            # min-heap of the kept models, the worst on top; -c breaks ties in favour of low c.
+            # A configuration retrained with a larger budget replaces its earlier model
+            self._heap = [entry for entry in self._heap if entry[2] != -c]
+            heapq.heapify(self._heap)
+            entry = (r, self._rank(scores), -c, model)
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, entry)
+            elif entry[:3] > self._heap[0][:3]:
+                heapq.heapreplace(self._heap, entry)
+        if self.report is not None:
+            self.report(row)
+
+    def grid(self, column=None):
+        """
+        The column (default metric) of the last row of every configuration,
+        i.e. at the largest budget it reached, as an array of the grid's shape.
+        With successive halving the configurations stopped early show their
+        score after a smaller budget.
+        """
+        column = self.metric if column is None else column
+        return np.array([row[column] for row in self.last], dtype=np.float64).reshape(self.shape)
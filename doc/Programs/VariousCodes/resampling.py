@@ -0,0 +1,208 @@
+"""
+Parallel bootstrap and cross-validation.
+
+A resampling study runs the same function for many replicates (bootstrap
+samples or folds) i = 0,...,n-1,
+
+    result_i = func(data, rng_i, i),
+
+where data is a dict of read-only arrays (e.g. the design matrix and the
+targets) and rng_i is a numpy Generator. The generators are spawned from one
+SeedSequence, so replicate i sees the same random numbers whatever the number
+of workers or the backend, and the whole study is reproducible from one seed.
+
+Replicates are handed out in chunks to a pool of workers:
+
+    thread   the workers share the arrays directly. Good when func spends its
+             time in numpy/scipy/sklearn code that releases the GIL.
+    process  the arrays are copied once into shared memory, and every worker
+             maps them when it starts, so they are never pickled per task.
+             func must be a module-level function (picklable), and scripts
+             must guard their main code with if __name__ == '__main__'.
+             Set OMP_NUM_THREADS=1 so the workers do not oversubscribe the
+             cores with BLAS threads.
+
+With aggregate=StreamingMoments each worker reduces its chunk to the
+running mean and sum of squared deviations of the results (Welford), and the
+chunks are merged in order (Chan et al.), so a bias-variance study over many
+replicates never holds more than one prediction vector per chunk:
+
+    moments = Resampler(seed=2018).run(bootstrap_predict, 1000, data, aggregate=StreamingMoments)
+    error, bias, variance = bias_variance(y_test, moments)
+"""
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+class StreamingMoments:
+    """
+    Running count, mean and sum of squared deviations M2 of arrays of a fixed
+    shape, updated one array at a time (Welford) or merged with another
+    accumulator (Chan et al.).
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        self.count += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta/self.count
+        self.m2 = self.m2 + delta*(x - self.mean)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta*other.count/count
+        self.m2 = self.m2 + other.m2 + delta**2*self.count*other.count/count
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        """
+        Variance (normalized by count, like np.var) of every entry.
+        """
+        return self.m2/self.count
+
+
+def bias_variance(y_test, moments):
+    """
+    Mean squared error, bias^2 and variance of predictions of y_test over the
+    replicates, from the StreamingMoments of the predictions. With the
+    variance normalized by the number of replicates error = bias + variance.
+    """
+    y_test = np.ravel(y_test)
+    bias = np.mean((y_test - np.ravel(moments.mean))**2)
+    variance = np.mean(moments.variance)
+    return bias + variance, bias, variance
+
+
+def spawn_generators(seed, n):
+    """
+    n independent generators, one per replicate, spawned from seed
+    (an int, None or a SeedSequence).
+    """
+    ss = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return [np.random.default_rng(s) for s in ss.spawn(n)]
+
+
+# Arrays shared with the process workers, set up by attach_arrays in each worker
+_shared = {}
+
+
+def share_arrays(data):
+    """
+    Copies the arrays of the dict data into new shared memory blocks. Returns
+    the blocks, to be released with release_arrays, and the specs that
+    attach_arrays maps in the workers.
+    """
+    blocks, specs = [], {}
+    try:
+        for name, a in data.items():
+            a = np.ascontiguousarray(a)
+            shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+            blocks.append(shm)
+            specs[name] = (shm.name, a.shape, a.dtype.str)
+    except BaseException:
+        release_arrays(blocks)
+        raise
+    return blocks, specs
+
+
+def release_arrays(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+def attach_arrays(specs):
+    """
+    Worker initializer: maps the shared memory blocks as read-only arrays.
+    """
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        a = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        a.flags.writeable = False
+        _shared[name] = (shm, a)
+
+
+def shared_arrays():
+    """
+    The arrays attached by attach_arrays, as a dict.
+    """
+    return {name: a for name, (shm, a) in _shared.items()}
+
+
+def _run_chunk(func, data, indices, seeds, aggregate):
+    """
+    Runs the replicates of one chunk. data is None in process workers,
+    which use the arrays attached by attach_arrays.
+    """
+    if data is None:
+        data = shared_arrays()
+    results = aggregate() if aggregate is not None else []
+    for i, seed in zip(indices, seeds):
+        result = func(data, np.random.default_rng(seed), i)
+        if aggregate is not None:
+            results.update(result)
+        else:
+            results.append(result)
+    return results
+
+
+class Resampler:
+    """
+    Pool of workers for resampling studies, see the module docstring.
+    n_workers defaults to the number of cores; chunksize replicates are sent
+    to a worker at a time.
+    """
+    def __init__(self, backend='thread', n_workers=None, seed=None, chunksize=10):
+        if backend not in ('thread', 'process'):
+            raise ValueError("backend must be 'thread' or 'process'")
+        self.backend = backend
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.seed = seed
+        self.chunksize = chunksize
+
+    def run(self, func, n, data=None, aggregate=None):
+        """
+        Runs func(data, rng, i) for i = 0,...,n-1. Returns the list of results
+        in replicate order, or, with an aggregate class such as
+        StreamingMoments, the merged aggregate of all results.
+        """
+        data = {} if data is None else data
+        seeds = np.random.SeedSequence(self.seed).spawn(n)
+        chunks = [range(start, min(start + self.chunksize, n)) for start in range(0, n, self.chunksize)]
+        if self.backend == 'thread' or self.n_workers == 1:
+            with ThreadPoolExecutor(self.n_workers) as pool:
+                parts = pool.map(lambda c: _run_chunk(func, data, c, seeds[c.start:c.stop], aggregate), chunks)
+                return self._collect(parts, aggregate)
+
+        blocks, specs = share_arrays(data)
+        try:
+            with ProcessPoolExecutor(self.n_workers, initializer=attach_arrays, initargs=(specs,)) as pool:
+                parts = pool.map(_run_chunk, [func]*len(chunks), [None]*len(chunks), chunks,
+                                 [seeds[c.start:c.stop] for c in chunks], [aggregate]*len(chunks))
+                return self._collect(parts, aggregate)
+        finally:
+            release_arrays(blocks)
+
+    def _collect(self, parts, aggregate):
+        # the chunks arrive in order, and are merged as soon as they arrive
+        if aggregate is None:
+            return [result for part in parts for result in part]
+        total = aggregate()
+        for part in parts:
+            total.merge(part)
+        return total
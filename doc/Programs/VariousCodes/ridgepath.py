@@ -0,0 +1,114 @@
+"""
+Ridge regression for many values of lambda from one thin SVD of X.
+
+With X = U diag(s) V^T the Ridge solution for any lambda is
+
+    beta(lambda) = V diag(s/(s^2+lambda)) U^T z,
+
+and the hat matrix H(lambda) = U diag(s^2/(s^2+lambda)) U^T gives the
+effective degrees of freedom df = trace H, the residual sum of squares and
+the leverages h_ii without any refits. From these we get the closed-form
+generalized cross-validation and leave-one-out scores
+
+    GCV   = (1/n) |z - H z|^2 / (1 - df/n)^2
+    LOOCV = (1/n) sum_i ((z_i - (Hz)_i)/(1 - h_ii))^2
+
+All quantities are computed for all lambdas at once, as arrays with one
+column (or entry) per lambda.
+"""
+import numpy as np
+from solvers import SVDSolver
+
+
+class RidgePath:
+    """
+    Ridge fits of z on X for every lambda in lambdas. With fit_intercept=True
+    the columns of X and z are centered first and the intercept is not
+    penalized (as in sklearn's Ridge); a constant column in X then gets a zero
+    coefficient. Use as
+
+        path = RidgePath(X_train, z_train, np.logspace(-4, 0, 100))
+        mse = path.mse(X_test, z_test)
+        best = path.lambdas[np.argmin(path.gcv)]
+    """
+    def __init__(self, X, z, lambdas, fit_intercept=False, solver=None):
+        X = np.asarray(X, dtype=np.float64)
+        z = np.ravel(z).astype(np.float64)
+        self.lambdas = np.atleast_1d(np.asarray(lambdas, dtype=np.float64))
+        self.fit_intercept = fit_intercept
+        self.n = len(z)
+        if fit_intercept:
+            self.X_mean = np.mean(X, axis=0)
+            self.z_mean = np.mean(z)
+            X = X - self.X_mean
+            z = z - self.z_mean
+        self.z = z
+        # the solver caches the SVD, so several paths on the same X share it
+        self.solver = solver if solver is not None else SVDSolver()
+        factors = self.solver.factorize(X)
+        self.U, self.s, self.VT = factors['U'], factors['s'], factors['VT']
+
+        s = self.s[:, np.newaxis]; lmbd = self.lambdas[np.newaxis, :]
+        s2 = s**2
+        # numerically zero singular values (e.g. from a centered constant column) are dropped
+        keep = s > np.finfo(np.float64).eps*max(X.shape)*self.s[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # shrinkage factors s^2/(s^2+lambda) and filter factors s/(s^2+lambda)
+            self.shrink = np.where(keep, s2/(s2 + lmbd), 0.0)
+            filt = np.where(keep, s/(s2 + lmbd), 0.0)
+        self.UTz = np.dot(self.U.T, z)
+
+        # coefficients, one column per lambda
+        self.coef = np.dot(self.VT.T, filt*self.UTz[:, np.newaxis])
+        if fit_intercept:
+            self.intercept = self.z_mean - np.dot(self.X_mean, self.coef)
+        else:
+            self.intercept = np.zeros(len(self.lambdas))
+
+        # effective degrees of freedom (counting the intercept) and residual sum of squares
+        self.df = np.sum(self.shrink, axis=0) + (1 if fit_intercept else 0)
+        rss_perp = max(np.dot(z, z) - np.dot(self.UTz, self.UTz), 0.0)
+        self.rss = rss_perp + np.sum(((1 - self.shrink)*self.UTz[:, np.newaxis])**2, axis=0)
+        self.gcv = self.rss/self.n/(1 - self.df/self.n)**2
+        self._loocv = None
+
+    def predict(self, X):
+        """
+        Predictions for the rows of X, one column per lambda.
+        """
+        return np.dot(X, self.coef) + self.intercept
+
+    def fitted(self):
+        """
+        Fitted values on the training data, one column per lambda.
+        """
+        z_hat = np.dot(self.U, self.shrink*self.UTz[:, np.newaxis])
+        if self.fit_intercept:
+            z_hat += self.z_mean
+        return z_hat
+
+    def leverages(self):
+        """
+        Diagonals h_ii of the hat matrices, one column per lambda.
+        """
+        h = np.dot(self.U**2, self.shrink)
+        if self.fit_intercept:
+            h += 1.0/self.n
+        return h
+
+    @property
+    def loocv(self):
+        """
+        Exact leave-one-out mean squared error for every lambda.
+        """
+        if self._loocv is None:
+            z = self.z[:, np.newaxis]
+            residual = z - np.dot(self.U, self.shrink*self.UTz[:, np.newaxis])
+            self._loocv = np.mean((residual/(1 - self.leverages()))**2, axis=0)
+        return self._loocv
+
+    def mse(self, X_test, z_test):
+        """
+        Test mean squared error for every lambda.
+        """
+        return np.mean((np.ravel(z_test)[:, np.newaxis] - self.predict(X_test))**2, axis=0)
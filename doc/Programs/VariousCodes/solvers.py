@@ -0,0 +1,175 @@
+"""
+Factorized solvers for the least squares problems of OLS and Ridge,
+
+    beta = argmin |z - X beta|^2 + lambda |beta|^2,
+
+which replace explicit inversion of X^T X. Every backend factorizes X once
+and caches the factorization, keyed on the contents of X, so that repeated
+solves with the same X (other right hand sides, or other lambdas for Ridge)
+only cost O(n p) or O(p^2). No backend allocates anything of size n x n.
+
+    cholesky  Cholesky factor of X^T X + lambda I. Fastest, but squares the
+              condition number of X. One factor is kept per lambda.
+    qr        thin QR of X. Ridge solves with the small matrix R^T R + lambda I.
+    svd       thin SVD of X = U diag(s) V^T. Ridge for any lambda is a rescaling
+              of U^T z by s/(s^2+lambda); OLS drops singular values below
+              rcond*max(s), like a pseudoinverse.
+    lsqr      iterative, never forms X^T X; for large or sparse X.
+
+Use get_solver('svd') or one of the classes directly:
+
+    solver = SVDSolver()
+    for lmbd in lambdas:
+        beta = solver.solve(X, z, lmbd)
+"""
+import numpy as np
+from scipy import linalg
+from scipy.sparse.linalg import lsqr
+from designmatrix import fingerprint
+
+
+class LinearSolver:
+    """
+    Common part of the backends: caching of the factorization of the
+    last X seen. Subclasses implement _factorize, _solve and may override
+    inv_gram.
+    """
+    def __init__(self):
+        self.key = None
+        self.factors = None
+
+    def factorize(self, X):
+        """
+        Factorizes X, unless it is the same matrix as last time.
+        """
+        key = (X.shape, fingerprint(X))
+        if key != self.key:
+            self.factors = self._factorize(np.asarray(X, dtype=np.float64))
+            self.key = key
+        return self.factors
+
+    def solve(self, X, z, lambda_=0.0):
+        """
+        Returns the OLS (lambda_ = 0) or Ridge coefficients for the design
+        matrix X and data z. z may also hold several right hand sides as columns.
+        """
+        self.factorize(X)
+        return self._solve(X, z, lambda_)
+
+    def inv_gram(self, X, lambda_=0.0):
+        """
+        Returns (X^T X + lambda I)^-1, e.g. for the variance of beta.
+        """
+        G = np.dot(X.T, X)
+        G[np.diag_indices_from(G)] += lambda_
+        return linalg.cho_solve(linalg.cho_factor(G), np.eye(len(G)))
+
+
+class CholeskySolver(LinearSolver):
+    def _factorize(self, X):
+        return {'XT': X.T, 'G': np.dot(X.T, X), 'cho': {}}
+
+    def _cho(self, lambda_):
+        cho = self.factors['cho']
+        if lambda_ not in cho:
+            G = self.factors['G'].copy()
+            G[np.diag_indices_from(G)] += lambda_
+            cho[lambda_] = linalg.cho_factor(G)
+        return cho[lambda_]
+
+    def _solve(self, X, z, lambda_):
+        return linalg.cho_solve(self._cho(lambda_), np.dot(self.factors['XT'], z))
+
+    def inv_gram(self, X, lambda_=0.0):
+        self.factorize(X)
+        return linalg.cho_solve(self._cho(lambda_), np.eye(X.shape[1]))
+
+
+class QRSolver(LinearSolver):
+    def _factorize(self, X):
+        Q, R = linalg.qr(X, mode='economic')
+        return {'Q': Q, 'R': R}
+
+    def _solve(self, X, z, lambda_):
+        Q, R = self.factors['Q'], self.factors['R']
+        if lambda_ == 0:
+            return linalg.solve_triangular(R, np.dot(Q.T, z))
+        # (R^T R + lambda I) beta = R^T Q^T z
+        G = np.dot(R.T, R)
+        G[np.diag_indices_from(G)] += lambda_
+        return linalg.cho_solve(linalg.cho_factor(G), np.dot(R.T, np.dot(Q.T, z)))
+
+    def inv_gram(self, X, lambda_=0.0):
+        self.factorize(X)
+        R = self.factors['R']
+        if lambda_ == 0:
+            Rinv = linalg.solve_triangular(R, np.eye(len(R)))
+            return np.dot(Rinv, Rinv.T)
+        return LinearSolver.inv_gram(self, R, lambda_)
+
+
+class SVDSolver(LinearSolver):
+    def __init__(self, rcond=1e-15):
+        LinearSolver.__init__(self)
+        self.rcond = rcond
+
+    def _factorize(self, X):
+        U, s, VT = linalg.svd(X, full_matrices=False)
+        return {'U': U, 's': s, 'VT': VT}
+
+    def _filter(self, lambda_):
+        """
+        The diagonal of (S^2 + lambda I)^-1 S.
+        """
+        s = self.factors['s']
+        if lambda_ == 0:
+            d = np.zeros_like(s)
+            keep = s > self.rcond*s[0]
+            d[keep] = 1.0/s[keep]
+            return d
+        return s/(s**2 + lambda_)
+
+    def _solve(self, X, z, lambda_):
+        U, VT = self.factors['U'], self.factors['VT']
+        d = self._filter(lambda_)
+        UTz = np.dot(U.T, z)
+        if UTz.ndim > 1:
+            d = d[:, np.newaxis]
+        return np.dot(VT.T, d*UTz)
+
+    def inv_gram(self, X, lambda_=0.0):
+        self.factorize(X)
+        s, VT = self.factors['s'], self.factors['VT']
+        d = self._filter(lambda_)/np.where(s > 0, s, 1.0)
+        return np.dot(VT.T*d, VT)
+
+
+class LSQRSolver(LinearSolver):
+    def __init__(self, atol=1e-10, btol=1e-10, iter_lim=None):
+        LinearSolver.__init__(self)
+        self.atol, self.btol, self.iter_lim = atol, btol, iter_lim
+
+    def factorize(self, X):
+        # nothing to factorize, lsqr only uses products with X and X^T
+        return None
+
+    def _solve(self, X, z, lambda_):
+        if np.ndim(z) > 1:
+            return np.column_stack([self._solve(X, zi, lambda_) for zi in np.transpose(z)])
+        # scipy's default of 2p iterations is too few for our ill-conditioned design matrices
+        iter_lim = self.iter_lim or 10*X.shape[1]
+        return lsqr(X, z, damp=np.sqrt(lambda_), atol=self.atol, btol=self.btol,
+                    iter_lim=iter_lim)[0]
+
+
+SOLVERS = {'cholesky': CholeskySolver, 'qr': QRSolver, 'svd': SVDSolver, 'lsqr': LSQRSolver}
+
+
+def get_solver(name='svd', **kwargs):
+    """
+    Returns a new solver of the given kind: 'cholesky', 'qr', 'svd' or 'lsqr'.
+    """
+    try:
+        return SOLVERS[name](**kwargs)
+    except KeyError:
+        raise ValueError("unknown solver {}, choose one of {}".format(name, sorted(SOLVERS)))
@@ -0,0 +1,227 @@
+"""
+Gradient boosting of the histogram CART trees of fastcart.py, with the
+second order (Newton) steps of XGBoost.
+
+The model is F(x) = F_0 + eta sum_m f_m(x), with one output per class for
+the softmax loss. In round m the gradients g_i and Hessians h_i of the loss
+at the current F(x_i) are computed, and a tree is grown on the criterion
+fastcart.Newton: a leaf j with gradient sum G_j and Hessian sum H_j gets
+the value
+
+    w_j = -G_j/(H_j + lambda),
+
+the minimum of the second order expansion of the loss, and the splits are
+chosen by the gain G_L^2/(H_L + lambda) + G_R^2/(H_R + lambda) - G^2/(H + lambda).
+For the squared loss (h = 1, lambda = 0) this is the least squares tree on
+the residuals. The losses are
+
+    squared     (F - y)^2/2               g = F - y,    h = 1
+    logistic    log(1 + e^F) - y F        g = p - y,    h = p(1 - p),   p = 1/(1 + e^-F)
+    softmax     log sum_k e^F_k - F_y     g_k = p_k - [y = k], h_k = p_k(1 - p_k)
+
+The features are binned once (fastcart.bin_features, at most 256 uint8
+bins), so a round costs a few np.bincount passes over the rows of the
+sample per feature (the larger child's histogram is the parent's minus the
+smaller one's) and a sweep over the bins.
+
+Shrinkage is the learning rate eta. Every round grows its trees on a random
+fraction subsample of the rows, and every split is searched among a random
+fraction colsample of the features. With a validation set the validation
+loss is tracked round by round, training stops after early_stopping_rounds
+rounds without improvement, and the model is cut back to the best round.
+"""
+import numpy as np
+from fastcart import HistogramCARTBuilder, FlatTree, Newton, bin_features, stack_trees
+
+
+# Largest number of (tree, row) pairs predicted at a time
+BATCH = 2**22
+
+
+def sigmoid(x):
+    return np.exp(-np.logaddexp(0, -x))
+
+
+def softmax(F):
+    e = np.exp(F - F.max(axis=1, keepdims=True))
+    return e/e.sum(axis=1, keepdims=True)
+
+
+class SquaredLoss:
+    """
+    Squared error of a regression.
+    """
+    n_outputs = 1
+
+    def init_score(self, y):
+        return np.array([np.mean(y)])
+
+    def gradients(self, y, F):
+        return F - y[:, np.newaxis], np.ones_like(F)
+
+    def loss(self, y, F):
+        return np.mean((F[:, 0] - y)**2)/2
+
+
+class LogisticLoss:
+    """
+    Cross entropy of a binary classification, y in {0, 1}.
+    """
+    n_outputs = 1
+
+    def init_score(self, y):
+        p = np.clip(np.mean(y), 1e-12, 1 - 1e-12)
+        return np.array([np.log(p/(1 - p))])
+
+    def gradients(self, y, F):
+        p = sigmoid(F)
+        return p - y[:, np.newaxis], p*(1 - p)
+
+    def loss(self, y, F):
+        return np.mean(np.logaddexp(0, F[:, 0]) - y*F[:, 0])
+
+    def probabilities(self, F):
+        p = sigmoid(F[:, 0])
+        return np.column_stack((1 - p, p))
+
+
+class SoftmaxLoss:
+    """
+    Cross entropy of a classification with n_outputs classes, y in 0,...,n_outputs-1.
+    """
+    def __init__(self, n_outputs):
+        self.n_outputs = n_outputs
+
+    def init_score(self, y):
+        p = np.clip(np.bincount(y, minlength=self.n_outputs)/len(y), 1e-12, None)
+        return np.log(p) - np.mean(np.log(p))
+
+    def gradients(self, y, F):
+        p = softmax(F)
+        p_y = p.copy()
+        p_y[np.arange(len(y)), y] -= 1
+        return p_y, p*(1 - p)
+
+    def loss(self, y, F):
+        top = F.max(axis=1)
+        logsumexp = top + np.log(np.sum(np.exp(F - top[:, np.newaxis]), axis=1))
+        return np.mean(logsumexp - F[np.arange(len(y)), y])
+
+    def probabilities(self, F):
+        return softmax(F)
+
+
+class GradientBoosting:
+    """
+    Gradient boosted trees, see the module docstring. loss is 'squared',
+    'logistic' or 'softmax'; max_depth and min_size are the stopping rules
+    of cart.py, reg_lambda and min_child_weight those of fastcart.Newton.
+    After fit, train_loss and valid_loss hold the loss after every round,
+    and best_round the number of rounds kept.
+    """
+    def __init__(self, loss='squared', n_rounds=100, learning_rate=0.1, max_depth=3, min_size=1,
+                 reg_lambda=1.0, min_child_weight=1.0, subsample=1.0, colsample=1.0, max_bins=256,
+                 early_stopping_rounds=None, seed=None):
+        if loss not in ('squared', 'logistic', 'softmax'):
+            raise ValueError("loss must be 'squared', 'logistic' or 'softmax'")
+        if n_rounds < 1:
+            raise ValueError("n_rounds must be at least 1")
+        self.loss = loss
+        self.n_rounds = n_rounds
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.min_size = min_size
+        self.reg_lambda = reg_lambda
+        self.min_child_weight = min_child_weight
+        self.subsample = subsample
+        self.colsample = colsample
+        self.max_bins = max_bins
+        self.early_stopping_rounds = early_stopping_rounds
+        self.seed = seed
+
+    def _targets(self, y):
+        if self.loss == 'squared':
+            return np.ravel(y).astype(np.float64)
+        # classes coded as 0,...,K-1
+        return np.searchsorted(self.classes, np.ravel(y))
+
+    def fit(self, X, y, X_valid=None, y_valid=None):
+        X = np.asarray(X, dtype=np.float64)
+        n, p = X.shape
+        if self.loss == 'squared':
+            self._loss = SquaredLoss()
+        else:
+            self.classes = np.unique(y)
+            if self.loss == 'logistic' and len(self.classes) != 2:
+                raise ValueError("loss='logistic' needs exactly two classes, use 'softmax' for more")
+            if len(self.classes) < 2:
+                raise ValueError("classification needs at least two classes")
+            self._loss = LogisticLoss() if self.loss == 'logistic' else SoftmaxLoss(len(self.classes))
+        y = self._targets(y)
+        rng = np.random.default_rng(self.seed)
+        binned = bin_features(X, self.max_bins)
+        n_sample = max(1, int(round(self.subsample*n)))
+        max_features = max(1, int(round(self.colsample*p)))
+
+        self.init_score = self._loss.init_score(y)
+        F = np.tile(self.init_score, (n, 1))
+        valid = X_valid is not None
+        if valid:
+            X_valid = np.asarray(X_valid, dtype=np.float64)
+            y_valid = self._targets(y_valid)
+            F_valid = np.tile(self.init_score, (len(X_valid), 1))
+        self.rounds, self.train_loss, self.valid_loss = [], [], []
+        best_loss, self.best_round = np.inf, 0
+        for m in range(self.n_rounds):
+            g, h = self._loss.gradients(y, F)
+            sample = np.sort(rng.choice(n, n_sample, replace=False)) if n_sample < n else None
+            trees = []
+            for k in range(self._loss.n_outputs):
+                criterion = Newton(g[:, k], h[:, k], self.reg_lambda, self.min_child_weight)
+                builder = HistogramCARTBuilder(X, None, self.max_depth, self.min_size, criterion=criterion,
+                                               sample=sample, max_features=max_features, rng=rng, binned=binned)
+                tree = FlatTree.from_dict(builder.build())
+                tree.value = self.learning_rate*tree.value.astype(np.float64)
+                F[:, k] += tree.predict(X)
+                if valid:
+                    F_valid[:, k] += tree.predict(X_valid)
+                trees.append(tree)
+            self.rounds.append(trees)
+            self.train_loss.append(self._loss.loss(y, F))
+            if not valid:
+                continue
+            self.valid_loss.append(self._loss.loss(y_valid, F_valid))
+            if self.valid_loss[-1] < best_loss:
+                best_loss, self.best_round = self.valid_loss[-1], m + 1
+            elif self.early_stopping_rounds is not None and m + 1 - self.best_round >= self.early_stopping_rounds:
+                break
+        if not valid:
+            self.best_round = len(self.rounds)
+        self.rounds = self.rounds[:self.best_round]
+        self.trees, self.roots = stack_trees([tree for trees in self.rounds for tree in trees])
+        return self
+
+    def decision_function(self, X):
+        """
+        The raw outputs F(x) of every row of X (rows x outputs).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n_outputs = len(self.init_score)
+        F = np.tile(self.init_score, (len(X), 1))
+        step = max(1, BATCH//len(self.roots))
+        for start in range(0, len(X), step):
+            values = self.trees.value[self.trees.apply(X[start:start + step], self.roots)]
+            # the trees are ordered round by round, output by output
+            F[start:start + step] += values.reshape(-1, n_outputs, values.shape[1]).sum(axis=0).T
+        return F
+
+    def predict_proba(self, X):
+        return self._loss.probabilities(self.decision_function(X))
+
+    def predict(self, X):
+        F = self.decision_function(X)
+        if self.loss == 'squared':
+            return F[:, 0]
+        if self.loss == 'logistic':
+            return self.classes[(F[:, 0] > 0).astype(int)]
+        return self.classes[np.argmax(F, axis=1)]
@@ -2,6 +2,8 @@
 from random import seed
 from random import randrange
 from csv import reader
+import numpy as np
+import fastcart
  
 # Load a CSV file
 def load_csv(filename):
@@ -15,17 +17,17 @@ def str_column_to_float(dataset, column):
 	for row in dataset:
 		row[column] = float(row[column].strip())
  
-# Split a dataset into k folds
+# Split a dataset into k folds, given as arrays of row indices
 def cross_validation_split(dataset, n_folds):
 	dataset_split = list()
-	dataset_copy = list(dataset)
+	dataset_copy = list(range(len(dataset)))
 	fold_size = int(len(dataset) / n_folds)
 	for i in range(n_folds):
 		fold = list()
 		while len(fold) < fold_size:
 			index = randrange(len(dataset_copy))
 			fold.append(dataset_copy.pop(index))
-		dataset_split.append(fold)
+		dataset_split.append(np.array(fold))
 	return dataset_split
  
 # Calculate accuracy percentage
@@ -36,21 +38,18 @@ def accuracy_metric(actual, predicted):
 			correct += 1
 	return correct / float(len(actual)) * 100.0
  
-# Evaluate an algorithm using a cross validation split
+# Evaluate an algorithm using a cross validation split. The dataset is one array, and the
+# training and test sets of every fold are taken from it by the row indices of the folds
 def evaluate_algorithm(dataset, algorithm, n_folds, *args):
-	folds = cross_validation_split(dataset, n_folds)
+	data = np.array(dataset, dtype=float)
+	folds = cross_validation_split(data, n_folds)
 	scores = list()
-	for fold in folds:
-		train_set = list(folds)
-		train_set.remove(fold)
-		train_set = sum(train_set, [])
-		test_set = list()
-		for row in fold:
-			row_copy = list(row)
-			test_set.append(row_copy)
-			row_copy[-1] = None
+	for i, fold in enumerate(folds):
+		train_set = data[np.concatenate(folds[:i] + folds[i+1:])]
+		test_set = data[fold]
+		test_set[:, -1] = np.nan
 		predicted = algorithm(train_set, test_set, *args)
-		actual = [row[-1] for row in fold]
+		actual = data[fold, -1].tolist()
 		accuracy = accuracy_metric(actual, predicted)
 		scores.append(accuracy)
 	return scores
@@ -127,11 +126,12 @@ def split(node, max_depth, min_size, depth):
 		node['right'] = get_split(right)
 		split(node['right'], max_depth, min_size, depth+1)
  
-# Build a decision tree
-def build_tree(train, max_depth, min_size):
-	root = get_split(train)
-	split(root, max_depth, min_size, 1)
-	return root
+# Build a decision tree. get_split and split above show the algorithm; the tree is
+# built by fastcart.py, which finds the same splits with presorted features, or
+# with max_bins from histograms of the features binned into at most max_bins bins
+def build_tree(train, max_depth, min_size, max_bins=None):
+	data = np.array(train, dtype=float)
+	return fastcart.build_tree(data[:, :-1], data[:, -1], max_depth, min_size, max_bins)
  
 # Make a prediction with a decision tree
 def predict(node, row):
@@ -147,13 +147,12 @@ def predict(node, row):
 			return node['right']
  
 # Classification and Regression Tree Algorithm
-def decision_tree(train, test, max_depth, min_size):
-	tree = build_tree(train, max_depth, min_size)
-	predictions = list()
-	for row in test:
-		prediction = predict(tree, row)
-		predictions.append(prediction)
-	return(predictions)
+def decision_tree(train, test, max_depth, min_size, max_bins=None):
+	tree = build_tree(train, max_depth, min_size, max_bins)
+	# all test rows at once, with the tree compiled into flat arrays
+	flat = fastcart.FlatTree.from_dict(tree)
+	predictions = flat.predict(np.asarray(test, dtype=float)[:, :-1])
+	return(predictions.tolist())
  
 # Test CART on Bank Note dataset
 seed(1)
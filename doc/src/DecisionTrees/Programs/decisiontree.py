@@ -1,5 +1,5 @@
 import re
-import math
+import numpy as np
 from collections import deque
 
 # x is examples in training set
@@ -14,8 +14,27 @@ class Node(object):
 		self.next = None
 		self.childs = None
 
+# Integer codes of a list of values, numbered in order of first appearance,
+# and the list of distinct values (code i is values[i])
+def encode(values):
+	distinct, first, codes = np.unique(np.asarray(values), return_index=True, return_inverse=True)
+	order = np.argsort(first)
+	rank = np.empty_like(order)
+	rank[order] = np.arange(len(order))
+	return rank[codes.ravel()], distinct[order].tolist()
+
+# Entropy (base 2) of each row of a table of counts
+def entropyOfCounts(counts):
+	counts = np.asarray(counts, dtype=float)
+	total = counts.sum(axis=-1, keepdims=True)
+	p = np.divide(counts, total, out=np.zeros_like(counts), where=total > 0)
+	logp = np.log2(p, out=np.zeros_like(p), where=p > 0)
+	return -np.sum(p*logp, axis=-1)
+
 # Simple class of Decision Tree
-# Aimed for who want to learn Decision Tree, so it is not optimized
+# Aimed for who want to learn Decision Tree. Labels and the values of each attribute
+# are coded as small integers once, sample ids are index arrays, and the entropies
+# and information gains come from count tables built with np.bincount
 class DecisionTree(object):
 	def __init__(self, sample, attributes, labels):
 		self.sample = sample
@@ -24,90 +43,68 @@ class DecisionTree(object):
 		self.labelCodes = None
 		self.labelCodesCount = None
 		self.initLabelCodes()
+		self.initAttributeCodes()
 		# print(self.labelCodes)
 		self.root = None
-		self.entropy = self.getEntropy([x for x in range(len(self.labels))])
+		self.entropy = self.getEntropy(np.arange(len(self.labels)))
 
 	def initLabelCodes(self):
-		self.labelCodes = []
-		self.labelCodesCount = []
-		for l in self.labels:
-			if l not in self.labelCodes:
-				self.labelCodes.append(l)
-				self.labelCodesCount.append(0)
-			self.labelCodesCount[self.labelCodes.index(l)] += 1
+		self.labelIds, self.labelCodes = encode(self.labels)
+		self.labelCodesCount = np.bincount(self.labelIds, minlength=len(self.labelCodes)).tolist()
+
+	def initAttributeCodes(self):
+		# one column of codes per attribute, and the values of each attribute
+		self.attributeIds = np.zeros((len(self.sample), len(self.attributes)), dtype=int)
+		self.attributeValues = []
+		for attributeId in range(len(self.attributes)):
+			codes, values = encode([row[attributeId] for row in self.sample])
+			self.attributeIds[:, attributeId] = codes
+			self.attributeValues.append(values)
 
 	def getLabelCodeId(self, sampleId):
-		return self.labelCodes.index(self.labels[sampleId])
+		return self.labelIds[sampleId]
 
 	def getAttributeValues(self, sampleIds, attributeId):
-		vals = []
-		for sid in sampleIds:
-			val = self.sample[sid][attributeId]
-			if val not in vals:
-				vals.append(val)
-		# print(vals)
-		return vals
+		# values in order of first appearance among the samples
+		codes = self.attributeIds[sampleIds, attributeId]
+		distinct, first = np.unique(codes, return_index=True)
+		return [self.attributeValues[attributeId][c] for c in distinct[np.argsort(first)]]
 
 	def getEntropy(self, sampleIds):
-		entropy = 0
-		labelCount = [0] * len(self.labelCodes)
-		for sid in sampleIds:
-			labelCount[self.getLabelCodeId(sid)] += 1
-		# print("-ge", labelCount)
-		for lv in labelCount:
-			# print(lv)
-			if lv != 0:
-				entropy += -lv/len(sampleIds) * math.log(lv/len(sampleIds), 2)
-			else:
-				entropy += 0
-		return entropy
+		labelCount = np.bincount(self.labelIds[sampleIds], minlength=len(self.labelCodes))
+		return entropyOfCounts(labelCount)
 
 	def getDominantLabel(self, sampleIds):
-		labelCodesCount = [0] * len(self.labelCodes)
-		for sid in sampleIds:
-			labelCodesCount[self.labelCodes.index(self.labels[sid])] += 1
-		return self.labelCodes[labelCodesCount.index(max(labelCodesCount))]
+		labelCodesCount = np.bincount(self.labelIds[sampleIds], minlength=len(self.labelCodes))
+		return self.labelCodes[np.argmax(labelCodesCount)]
+
+	def getContingencyTable(self, sampleIds, attributeId):
+		# counts of the samples with each value (rows) and label (columns)
+		nLabels = len(self.labelCodes)
+		nValues = len(self.attributeValues[attributeId])
+		cells = self.attributeIds[sampleIds, attributeId]*nLabels + self.labelIds[sampleIds]
+		return np.bincount(cells, minlength=nValues*nLabels).reshape(nValues, nLabels)
 
 	def getInformationGain(self, sampleIds, attributeId):
-		gain = self.getEntropy(sampleIds)
-		attributeVals = []
-		attributeValsCount = []
-		attributeValsIds = []
-		for sid in sampleIds:
-			val = self.sample[sid][attributeId]
-			if val not in attributeVals:
-				attributeVals.append(val)
-				attributeValsCount.append(0)
-				attributeValsIds.append([])
-			vid = attributeVals.index(val)
-			attributeValsCount[vid] += 1
-			attributeValsIds[vid].append(sid)
-		# print("-gig", self.attributes[attributeId])
-		for vc, vids in zip(attributeValsCount, attributeValsIds):
-			# print("-gig", vids)
-			gain -= vc/len(sampleIds) * self.getEntropy(vids)
-		return gain
+		table = self.getContingencyTable(sampleIds, attributeId)
+		valueCount = table.sum(axis=1)
+		gain = entropyOfCounts(table.sum(axis=0))
+		return gain - np.sum(valueCount/float(len(sampleIds))*entropyOfCounts(table))
 
 	def getAttributeMaxInformationGain(self, sampleIds, attributeIds):
-		attributesEntropy = [0] * len(attributeIds)
-		for i, attId in zip(range(len(attributeIds)), attributeIds):
-			attributesEntropy[i] = self.getInformationGain(sampleIds, attId)
-		maxId = attributeIds[attributesEntropy.index(max(attributesEntropy))]
+		attributesEntropy = [self.getInformationGain(sampleIds, attId) for attId in attributeIds]
+		maxId = attributeIds[int(np.argmax(attributesEntropy))]
 		return self.attributes[maxId], maxId
 
 	def isSingleLabeled(self, sampleIds):
-		label = self.labels[sampleIds[0]]
-		for sid in sampleIds:
-			if self.labels[sid] != label:
-				return False
-		return True
+		labelIds = self.labelIds[sampleIds]
+		return bool(np.all(labelIds == labelIds[0]))
 
 	def getLabel(self, sampleId):
 		return self.labels[sampleId]
 
 	def id3(self):
-		sampleIds = [x for x in range(len(self.sample))]
+		sampleIds = np.arange(len(self.sample))
 		attributeIds = [x for x in range(len(self.attributes))]
 		self.root = self.id3Recv(sampleIds, attributeIds, self.root)
 
@@ -125,26 +122,21 @@ class DecisionTree(object):
 		# print(bestAttrName)
 		root.value = bestAttrName
 		root.childs = []  # Create list of children
-		for value in self.getAttributeValues(sampleIds, bestAttrId):
-			# print(value)
+		codes = self.attributeIds[sampleIds, bestAttrId]
+		distinct, first = np.unique(codes, return_index=True)
+		for code in distinct[np.argsort(first)]:
 			child = Node()
-			child.value = value
+			child.value = self.attributeValues[bestAttrId][code]
 			root.childs.append(child)  # Append new child node to current
 									   # root
-			childSampleIds = []
-			for sid in sampleIds:
-				if self.sample[sid][bestAttrId] == value:
-					childSampleIds.append(sid)
-			if len(childSampleIds) == 0:
-				child.next = self.getDominantLabel(sampleIds)
-			else:
-				# print(bestAttrName, bestAttrId)
-				# print(attributeIds)
-				if len(attributeIds) > 0 and bestAttrId in attributeIds:
-					toRemove = attributeIds.index(bestAttrId)
-					attributeIds.pop(toRemove)
-				child.next = self.id3Recv(
-					childSampleIds, attributeIds, child.next)
+			childSampleIds = sampleIds[codes == code]
+			# print(bestAttrName, bestAttrId)
+			# print(attributeIds)
+			if len(attributeIds) > 0 and bestAttrId in attributeIds:
+				toRemove = attributeIds.index(bestAttrId)
+				attributeIds.pop(toRemove)
+			child.next = self.id3Recv(
+				childSampleIds, attributeIds, child.next)
 		return root
 
 	def printTree(self):
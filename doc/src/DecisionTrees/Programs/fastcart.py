@@ -0,0 +1,413 @@
+"""
+CART trees with presorted features, the split search of cart.py without
+copying rows.
+
+cart.py tries every value of every feature as a threshold and counts the
+classes on both sides of each candidate anew, O(n^2) per feature and node.
+Here each feature is sorted once for the whole training set. A node is
+represented by a (features x rows) array of row indices, each row of it
+sorted by its feature, so the candidate splits x < threshold of a feature are
+the positions j in its sorted rows where the value changes. With the
+cumulative class counts L_j of the first j rows (R_j = total - L_j) the
+weighted Gini index of all splits of the feature is one vectorized sweep,
+
+    G_j = (n - |L_j|^2/j - |R_j|^2/(n - j))/n,
+
+where |.|^2 is the sum of the squared counts. Regression trees (the
+criterion SquaredError) sweep the cumulative sums of the targets instead.
+The index array of a child is obtained by a stable partition of every row
+of the parent's array with a mask of the rows going left, which keeps them
+sorted; no data are copied. A node then costs O(features x rows x classes),
+and a tree of depth d O(d features n classes).
+
+For large data sets the features can instead be quantized once into at
+most 256 bins (uint8 codes, the approach of LightGBM and XGBoost's hist
+method). A node then keeps a histogram of the class counts per bin, and
+the splits are searched over bin boundaries; see HistogramCARTBuilder.
+
+The trees are the nested dicts of cart.py, {'index', 'value', 'left',
+'right'}, with the class values (or regression values) as leaves, so
+cart.predict works on them. For prediction on many rows they are compiled
+into the flat arrays of FlatTree, which also saves and loads them as one
+.npz file. Bootstrap samples and a random subset of the features at every
+node, for the random forests of forest.py, are options of the builders.
+"""
+from __future__ import division
+import numpy as np
+
+
+class Gini(object):
+    """
+    Gini index of the classes y. The statistics of a row are its one-hot
+    class vector, so those of a set of rows are its class counts.
+    """
+    def __init__(self, y):
+        self.classes, self.codes = np.unique(y, return_inverse=True)
+        self.n_stats = len(self.classes)
+
+    def stats(self, rows):
+        return np.eye(self.n_stats)[self.codes[rows]]
+
+    def histogram(self, cells, rows, size):
+        cells = cells*self.n_stats + self.codes[rows, np.newaxis]
+        return np.bincount(cells.ravel(), minlength=size*self.n_stats).reshape(size, self.n_stats)
+
+    def count(self, stats):
+        return stats.sum(axis=-1)
+
+    def score(self, left, right):
+        """
+        Weighted Gini index of splits into left and right (lower is better).
+        """
+        n_left, n_right = self.count(left), self.count(right)
+        n = n_left + n_right
+        return (n - np.sum(left**2, axis=-1)/n_left - np.sum(right**2, axis=-1)/n_right)/n
+
+    def leaf(self, total):
+        """
+        Most common class.
+        """
+        return self.classes[np.argmax(total)].item()
+
+
+class SquaredError(object):
+    """
+    Sum of squared errors of a regression on y, optionally with weights w.
+    The statistics of a row are (w y, w); a leaf predicts the weighted mean
+    S/W, and a split lowers the squared error by S_L^2/W_L + S_R^2/W_R - S^2/W.
+    """
+    def __init__(self, y, weights=None):
+        y = np.ravel(y).astype(np.float64)
+        w = np.ones(len(y)) if weights is None else np.ravel(weights).astype(np.float64)
+        self._stats = np.column_stack((w*y, w))
+        self.n_stats = 2
+
+    def stats(self, rows):
+        return self._stats[rows]
+
+    def histogram(self, cells, rows, size):
+        n_features = cells.shape[1]
+        return np.column_stack([np.bincount(cells.ravel(), weights=np.repeat(self._stats[rows, k], n_features),
+                                            minlength=size) for k in range(self.n_stats)])
+
+    def count(self, stats):
+        return stats[..., 1]
+
+    def score(self, left, right):
+        return -(left[..., 0]**2/left[..., 1] + right[..., 0]**2/right[..., 1])
+
+    def leaf(self, total):
+        return float(total[0]/total[1])
+
+
+class Newton(SquaredError):
+    """
+    Second order step of a loss with gradients g and Hessians h per row, as
+    in XGBoost. The statistics of a row are (-g, h). A leaf takes the value
+    v = -G/(H + reg_lambda), which minimizes G v + (H + reg_lambda) v^2/2,
+    and a split gains G_L^2/(H_L + reg_lambda) + G_R^2/(H_R + reg_lambda)
+    - G^2/(H + reg_lambda). Splits leaving a child with H < min_child_weight
+    are not allowed.
+    """
+    def __init__(self, gradient, hessian, reg_lambda=1.0, min_child_weight=1.0):
+        self._stats = np.column_stack((-np.ravel(gradient), np.ravel(hessian))).astype(np.float64)
+        self.n_stats = 2
+        self.reg_lambda = reg_lambda
+        self.min_child_weight = min_child_weight
+
+    def score(self, left, right):
+        score = -(left[..., 0]**2/(left[..., 1] + self.reg_lambda) + right[..., 0]**2/(right[..., 1] + self.reg_lambda))
+        score[(left[..., 1] < self.min_child_weight) | (right[..., 1] < self.min_child_weight)] = np.inf
+        return score
+
+    def leaf(self, total):
+        return float(total[0]/(total[1] + self.reg_lambda))
+
+
+CRITERIA = {'gini': Gini, 'mse': SquaredError}
+
+
+class CARTBuilder(object):
+    """
+    Builds a tree of the rows of X with targets y, with the stopping rules
+    of cart.split (max_depth, min_size). criterion is 'gini'
+    (classification), 'mse' (regression) or a criterion object like Gini.
+    sample (row indices, repetitions allowed, e.g. a bootstrap sample)
+    selects the training rows, all rows by default. With max_features the
+    split of every node is searched among that many features drawn at random
+    with rng (a Generator, np.random by default), as in random forests.
+    """
+    def __init__(self, X, y, max_depth, min_size, criterion='gini', sample=None, max_features=None, rng=None):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.criterion = CRITERIA[criterion](y) if isinstance(criterion, str) else criterion
+        self.max_depth = max_depth
+        self.min_size = min_size
+        self.sample = np.arange(len(self.X)) if sample is None else np.asarray(sample, dtype=np.intp)
+        n_features = self.X.shape[1]
+        self.max_features = n_features if max_features is None else min(max_features, n_features)
+        self.rng = rng
+        self._mask = np.zeros(len(self.X), dtype=bool)
+
+    def features(self):
+        """
+        Features searched for the split of a node.
+        """
+        n_features = self.X.shape[1]
+        if self.max_features == n_features:
+            return np.arange(n_features)
+        rng = np.random if self.rng is None else self.rng
+        return np.sort(rng.choice(n_features, self.max_features, replace=False))
+
+    def root(self):
+        # rows sorted by each feature, one row of the array per feature
+        order = np.argsort(self.X[self.sample], axis=0, kind='mergesort')
+        return self.sample[order].T.copy()
+
+    def rows(self, node):
+        return node[0]
+
+    def terminal(self, rows):
+        """
+        Leaf value of the rows.
+        """
+        return self.criterion.leaf(self.criterion.stats(rows).sum(axis=0))
+
+    def best_split(self, node):
+        """
+        (feature, number of rows going left, threshold) of the best split of
+        the node, or None if all its rows have the same features.
+        """
+        best_score, best = np.inf, None
+        if node.shape[1] < 2:
+            return best
+        for feature in self.features():
+            rows = node[feature]
+            x = self.X[rows, feature]
+            left = np.cumsum(self.criterion.stats(rows), axis=0)
+            right = left[-1] - left[:-1]
+            score = self.criterion.score(left[:-1], right)
+            # splits x < x[j] for j = 1,...,n-1, not between equal values
+            score[x[1:] == x[:-1]] = np.inf
+            j = np.argmin(score)
+            if score[j] < best_score:
+                best_score, best = score[j], (feature, j + 1, float(x[j + 1]))
+        return best
+
+    def partition(self, node, split):
+        """
+        Index arrays of the two children, still sorted by each feature.
+        """
+        feature, n_left = split[:2]
+        self._mask[node[feature, :n_left]] = True
+        goes_left = self._mask[node]
+        self._mask[node[feature, :n_left]] = False
+        n_features = node.shape[0]
+        return node[goes_left].reshape(n_features, -1), node[~goes_left].reshape(n_features, -1)
+
+    def split(self, node, depth):
+        """
+        Tree of the node at the given depth, as in cart.split.
+        """
+        split = self.best_split(node)
+        if split is None:
+            leaf = self.terminal(self.rows(node))
+            return {'index': 0, 'value': np.inf, 'left': leaf, 'right': leaf}
+        left, right = self.partition(node, split)
+        tree = {'index': split[0], 'value': split[-1]}
+        if depth >= self.max_depth:
+            tree['left'], tree['right'] = self.terminal(self.rows(left)), self.terminal(self.rows(right))
+            return tree
+        for side, child in (('left', left), ('right', right)):
+            if len(self.rows(child)) <= self.min_size:
+                tree[side] = self.terminal(self.rows(child))
+            else:
+                tree[side] = self.split(child, depth + 1)
+        return tree
+
+    def build(self):
+        return self.split(self.root(), 1)
+
+
+def bin_features(X, max_bins=256):
+    """
+    Quantizes every feature into at most max_bins bins. Returns the uint8
+    bin codes (rows x features) and for each feature the thresholds t, data
+    values such that bin b holds t[b-1] <= x < t[b].
+    """
+    if not 2 <= max_bins <= 256:
+        raise ValueError('max_bins must be between 2 and 256')
+    X = np.asarray(X, dtype=np.float64)
+    n = len(X)
+    codes = np.empty(X.shape, dtype=np.uint8)
+    thresholds = []
+    for feature in range(X.shape[1]):
+        x = np.sort(X[:, feature])
+        t = np.unique(x[(np.arange(1, max_bins)*n)//max_bins])
+        t = t[t > x[0]]
+        codes[:, feature] = np.searchsorted(t, X[:, feature], side='right')
+        thresholds.append(t)
+    return codes, thresholds
+
+
+class HistogramCARTBuilder(CARTBuilder):
+    """
+    CARTBuilder on binned features (see bin_features). A node is its row
+    indices together with its histogram, the statistics of the criterion
+    (e.g. the class counts) summed in every bin of every feature (features x
+    bins x statistics). Only the smaller child's histogram is counted, with
+    np.bincount over its rows; the larger child's is the parent's minus the
+    smaller one's. The split search is a sweep over the bins instead of over
+    the rows, so a node costs O(rows x features) for the counting plus
+    O(features x bins x statistics). binned, the result of bin_features,
+    can be given to share one binning between many trees.
+    """
+    def __init__(self, X, y, max_depth, min_size, max_bins=256, criterion='gini', sample=None,
+                 max_features=None, rng=None, binned=None):
+        CARTBuilder.__init__(self, X, y, max_depth, min_size, criterion, sample, max_features, rng)
+        self.bins, self.thresholds = bin_features(self.X, max_bins) if binned is None else binned
+        self.n_bins = max(len(t) for t in self.thresholds) + 1
+        # offset of each feature in the flattened histogram
+        self._offset = np.arange(self.X.shape[1])*self.n_bins
+
+    def histogram(self, rows):
+        cells = self.bins[rows].astype(np.intp) + self._offset
+        hist = self.criterion.histogram(cells, rows, len(self._offset)*self.n_bins)
+        return hist.reshape(len(self._offset), self.n_bins, self.criterion.n_stats)
+
+    def root(self):
+        return self.sample, self.histogram(self.sample)
+
+    def best_split(self, node):
+        """
+        (feature, last bin going left, threshold) of the best split of the
+        node, or None.
+        """
+        rows, hist = node
+        features = self.features()
+        hist = hist[features]
+        left = np.cumsum(hist, axis=1)[:, :-1].astype(np.float64)
+        right = hist.sum(axis=1)[:, np.newaxis] - left
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = self.criterion.score(left, right)
+        score[~(self.criterion.count(left) > 0) | ~(self.criterion.count(right) > 0)] = np.inf
+        i, b = np.unravel_index(np.argmin(score), score.shape)
+        if not np.isfinite(score[i, b]):
+            return None
+        feature = features[i]
+        return feature, b, float(self.thresholds[feature][b])
+
+    def partition(self, node, split):
+        rows, hist = node
+        feature, b = split[:2]
+        goes_left = self.bins[rows, feature] <= b
+        left, right = rows[goes_left], rows[~goes_left]
+        if len(left) <= len(right):
+            hist_left = self.histogram(left)
+            return (left, hist_left), (right, hist - hist_left)
+        hist_right = self.histogram(right)
+        return (left, hist - hist_right), (right, hist_right)
+
+
+class FlatTree(object):
+    """
+    A tree compiled into flat arrays, one entry per node (node 0 is the
+    root): feature and threshold of the split x[feature] < threshold, the
+    indices left and right of the children (-1 for leaves) and the value of
+    the leaves. predict advances all rows one level at a time with fancy
+    indexing, so a batch costs one vectorized step per level of the tree.
+    """
+    def __init__(self, feature, threshold, left, right, value):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value)
+        self.depth = self._depth()
+
+    def _depth(self):
+        depth = np.zeros(len(self.feature), dtype=np.intp)
+        # children always come after their parents
+        for i in range(len(self.feature)):
+            if self.left[i] >= 0:
+                depth[self.left[i]] = depth[self.right[i]] = depth[i] + 1
+        return int(depth.max())
+
+    @classmethod
+    def from_dict(cls, tree):
+        """
+        Compiles a nested dict tree of cart.py, numbering the nodes breadth first.
+        """
+        feature, threshold, left, right, value = [], [], [], [], []
+        queue = [tree]
+        for node in queue:
+            if isinstance(node, dict):
+                feature.append(node['index']); threshold.append(node['value'])
+                left.append(len(queue)); right.append(len(queue) + 1)
+                queue.extend((node['left'], node['right']))
+                value.append(0)
+            else:
+                feature.append(-1); threshold.append(np.nan)
+                left.append(-1); right.append(-1)
+                value.append(node)
+        return cls(feature, threshold, left, right, value)
+
+    def apply(self, X, roots=None):
+        """
+        Index of the leaf reached by every row of X. The arrays may hold
+        several trees one after the other (a forest); then roots are the
+        indices of their root nodes, and the result is (trees x rows).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n = len(X)
+        start = np.zeros(1, dtype=np.intp) if roots is None else np.asarray(roots, dtype=np.intp)
+        node = np.repeat(start, n)
+        active = np.arange(len(node))
+        for _ in range(self.depth):
+            at = node[active]
+            inner = self.left[at] >= 0
+            active, at = active[inner], at[inner]
+            if len(active) == 0:
+                break
+            goes_left = X[active % n, self.feature[at]] < self.threshold[at]
+            node[active] = np.where(goes_left, self.left[at], self.right[at])
+        return node if roots is None else node.reshape(len(start), n)
+
+    def predict(self, X):
+        return self.value[self.apply(X)]
+
+    def save(self, fileName):
+        np.savez(fileName, feature=self.feature, threshold=self.threshold,
+                 left=self.left, right=self.right, value=self.value)
+
+    @classmethod
+    def load(cls, fileName):
+        data = np.load(fileName)
+        return cls(data['feature'], data['threshold'], data['left'], data['right'], data['value'])
+
+
+def stack_trees(trees):
+    """
+    The FlatTrees of an ensemble concatenated into one FlatTree, and the
+    indices of their root nodes, for FlatTree.apply(X, roots).
+    """
+    sizes = np.array([len(tree.feature) for tree in trees])
+    roots = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    shift = lambda a, offset: np.where(a >= 0, a + offset, -1)
+    stacked = FlatTree(np.concatenate([tree.feature for tree in trees]),
+                       np.concatenate([tree.threshold for tree in trees]),
+                       np.concatenate([shift(tree.left, r) for tree, r in zip(trees, roots)]),
+                       np.concatenate([shift(tree.right, r) for tree, r in zip(trees, roots)]),
+                       np.concatenate([tree.value for tree in trees]))
+    return stacked, roots
+
+
+def build_tree(X, y, max_depth, min_size, max_bins=None, criterion='gini'):
+    """
+    Tree of the rows of X with targets y (a Gini classification tree by
+    default), in the format of cart.build_tree. With max_bins the features
+    are binned into at most max_bins (<= 256) bins and the tree is grown
+    from histograms.
+    """
+    if max_bins is None:
+        return CARTBuilder(X, y, max_depth, min_size, criterion).build()
+    return HistogramCARTBuilder(X, y, max_depth, min_size, max_bins, criterion).build()
@@ -0,0 +1,174 @@
+"""
+Random forests and bagging of the CART trees of fastcart.py.
+
+Every tree is grown on its own bootstrap sample, an array of n row indices
+drawn with replacement; the rows themselves are never copied. With
+max_features the split of every node is searched among a random subset of
+the features ('sqrt' of them by default, the usual choice for
+classification); max_features=None gives plain bagging of trees.
+
+The trees are grown by the workers of resampling.Resampler (in
+../../../Programs/VariousCodes). With the process backend the features and
+targets (and the bin codes, if max_bins is given) are copied once into
+shared memory, and each worker maps them when it starts. The features are
+binned once for all trees. Tree i draws its sample and its feature subsets
+from generator i spawned from one seed, so a forest is reproducible
+whatever the number of workers.
+
+The rows left out of a bootstrap sample (about a third of them) are
+predicted by the worker right after growing the tree, so the out-of-bag
+error comes with the training and needs no extra pass over the data.
+
+The trees are compiled into one FlatTree with the nodes of all trees one
+after the other, and a batch of rows is run through all of them together,
+one vectorized step per level. Classification forests vote, regression
+forests average. save and load keep a forest in one .npz file.
+
+Scripts using the process backend must guard their main code with
+if __name__ == '__main__'.
+"""
+import os
+import sys
+from functools import partial
+import numpy as np
+from fastcart import CARTBuilder, HistogramCARTBuilder, FlatTree, bin_features, stack_trees
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../Programs/VariousCodes'))
+from resampling import Resampler
+
+
+# Largest number of (tree, row) pairs predicted at a time
+BATCH = 2**22
+
+
+def _grow(params, data, rng, i):
+    """
+    Tree i of the forest, with the indices of its out-of-bag rows and their
+    predictions.
+    """
+    X, y = data['X'], data['y']
+    n = len(X)
+    sample = rng.integers(0, n, n)
+    if 'bins' in data:
+        builder = HistogramCARTBuilder(X, y, params['max_depth'], params['min_size'], criterion=params['criterion'],
+                                       sample=sample, max_features=params['max_features'], rng=rng,
+                                       binned=(data['bins'], params['thresholds']))
+    else:
+        builder = CARTBuilder(X, y, params['max_depth'], params['min_size'], params['criterion'],
+                              sample, params['max_features'], rng)
+    tree = FlatTree.from_dict(builder.build())
+    oob = np.flatnonzero(np.bincount(sample, minlength=n) == 0)
+    return tree, oob, tree.predict(X[oob])
+
+
+class RandomForest:
+    """
+    Forest of n_trees trees grown on bootstrap samples, see the module
+    docstring. criterion is 'gini' (classification) or 'mse' (regression);
+    max_depth and min_size are the stopping rules of cart.py, max_bins
+    switches to histogram trees. After fit, oob_prediction holds the
+    out-of-bag prediction of every training row (nan for rows that were in
+    every sample) and oob_error the misclassification rate or mean squared
+    error over the rows that have one.
+    """
+    def __init__(self, n_trees=100, max_depth=10, min_size=1, criterion='gini', max_features='sqrt',
+                 max_bins=None, backend='process', n_workers=None, seed=None):
+        if criterion not in ('gini', 'mse'):
+            raise ValueError("criterion must be 'gini' or 'mse'")
+        self.n_trees = n_trees
+        self.max_depth = max_depth
+        self.min_size = min_size
+        self.criterion = criterion
+        self.max_features = max_features
+        self.max_bins = max_bins
+        self.backend = backend
+        self.n_workers = n_workers
+        self.seed = seed
+
+    def _n_features(self, p):
+        if self.max_features is None:
+            return None
+        if self.max_features == 'sqrt':
+            return max(1, int(np.sqrt(p)))
+        return min(int(self.max_features), p)
+
+    def fit(self, X, y):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        y = np.ravel(y)
+        if self.criterion == 'gini':
+            self.classes = np.unique(y)
+        else:
+            y = y.astype(np.float64)
+        params = {'max_depth': self.max_depth, 'min_size': self.min_size, 'criterion': self.criterion,
+                  'max_features': self._n_features(X.shape[1])}
+        data = {'X': X, 'y': y}
+        if self.max_bins is not None:
+            data['bins'], params['thresholds'] = bin_features(X, self.max_bins)
+        resampler = Resampler(self.backend, self.n_workers, self.seed)
+        results = resampler.run(partial(_grow, params), self.n_trees, data)
+        self.trees, self.roots = stack_trees([tree for tree, oob, prediction in results])
+        self._oob(y, results)
+        return self
+
+    def _oob(self, y, results):
+        n = len(y)
+        if self.criterion == 'gini':
+            votes = np.zeros((n, len(self.classes)))
+            for tree, oob, prediction in results:
+                np.add.at(votes, (oob, np.searchsorted(self.classes, prediction)), 1)
+            seen = votes.sum(axis=1) > 0
+            self.oob_prediction = np.full(n, np.nan)
+            self.oob_prediction[seen] = self.classes[np.argmax(votes[seen], axis=1)]
+            self.oob_error = np.mean(self.oob_prediction[seen] != y[seen])
+        else:
+            total, count = np.zeros(n), np.zeros(n)
+            for tree, oob, prediction in results:
+                total[oob] += prediction
+                count[oob] += 1
+            seen = count > 0
+            self.oob_prediction = np.full(n, np.nan)
+            self.oob_prediction[seen] = total[seen]/count[seen]
+            self.oob_error = np.mean((self.oob_prediction[seen] - y[seen])**2)
+
+    def tree_predictions(self, X):
+        """
+        Predictions of every tree for every row of X (trees x rows).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        step = max(1, BATCH//len(self.roots))
+        return np.hstack([self.trees.value[self.trees.apply(X[start:start + step], self.roots)]
+                          for start in range(0, len(X), step)])
+
+    def predict(self, X):
+        """
+        Majority vote (classification) or mean (regression) of the trees.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        step = max(1, BATCH//len(self.roots))
+        predictions = []
+        for start in range(0, len(X), step):
+            values = self.trees.value[self.trees.apply(X[start:start + step], self.roots)]
+            if self.criterion == 'mse':
+                predictions.append(values.mean(axis=0))
+                continue
+            n_classes = len(self.classes)
+            codes = np.searchsorted(self.classes, values) + n_classes*np.arange(values.shape[1])
+            votes = np.bincount(codes.ravel(), minlength=values.shape[1]*n_classes)
+            predictions.append(self.classes[np.argmax(votes.reshape(-1, n_classes), axis=1)])
+        return np.concatenate(predictions)
+
+    def save(self, fileName):
+        extra = {'classes': self.classes} if self.criterion == 'gini' else {}
+        np.savez(fileName, feature=self.trees.feature, threshold=self.trees.threshold, left=self.trees.left,
+                 right=self.trees.right, value=self.trees.value, roots=self.roots,
+                 criterion=self.criterion, **extra)
+
+    @classmethod
+    def load(cls, fileName):
+        data = np.load(fileName)
+        forest = cls(n_trees=len(data['roots']), criterion=str(data['criterion']))
+        forest.trees = FlatTree(data['feature'], data['threshold'], data['left'], data['right'], data['value'])
+        forest.roots = data['roots']
+        if forest.criterion == 'gini':
+            forest.classes = data['classes']
+        return forest
@@ -5,6 +5,7 @@ from sklearn.datasets import load_breast_cancer
 import scikitplot as skplt
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.model_selection import cross_validate
+from boosting import GradientBoosting
 
 # Load the data
 cancer = load_breast_cancer()
@@ -26,6 +27,15 @@ accuracy = cross_validate(gd_clf,X_test_scaled,y_test,cv=10)['test_score']
 print(accuracy)
 print("Test set accuracy with Random Forests and scaled data: {:.2f}".format(gd_clf.score(X_test_scaled,y_test)))
 
+# The same with the boosting engine of boosting.py (second order steps on the logistic loss),
+# with shrinkage, row and column subsampling and early stopping on a validation set
+X_fit, X_valid, y_fit, y_valid = train_test_split(X_train_scaled, y_train, random_state=0)
+boost = GradientBoosting('logistic', n_rounds=1000, learning_rate=0.1, max_depth=3, subsample=0.8,
+                         colsample=0.5, early_stopping_rounds=20, seed=0)
+boost.fit(X_fit, y_fit, X_valid, y_valid)
+print("Boosting rounds kept: {}".format(boost.best_round))
+print("Test set accuracy with own gradient boosting: {:.2f}".format(np.mean(boost.predict(X_test_scaled) == y_test)))
+
 import scikitplot as skplt
 y_pred = gd_clf.predict(X_test_scaled)
 skplt.metrics.plot_confusion_matrix(y_test, y_pred, normalize=True)
@@ -1,7 +1,7 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import GradientBoostingRegressor
+from boosting import GradientBoosting
 from sklearn.preprocessing import StandardScaler
 import scikitplot as skplt
 from sklearn.metrics import mean_squared_error
@@ -24,7 +24,10 @@ X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
 for degree in range(1,maxdegree):
-    model = GradientBoostingRegressor(max_depth=degree, n_estimators=100, learning_rate=1.0)  
+    # boosting.py; without regularization (reg_lambda=0) the squared loss trees are the
+    # least squares trees of sklearn's GradientBoostingRegressor
+    model = GradientBoosting('squared', n_rounds=100, learning_rate=1.0, max_depth=degree,
+                             reg_lambda=0, min_child_weight=0)
     model.fit(X_train_scaled,y_train)
     y_pred = model.predict(X_test_scaled)
     polydegree[degree] = degree
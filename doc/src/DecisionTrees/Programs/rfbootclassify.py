@@ -3,8 +3,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import make_pipeline
-from sklearn.utils import resample
-from sklearn.tree import DecisionTreeRegressor
+from forest import RandomForest
 
 n = 100
 n_boostraps = 100
@@ -25,30 +24,27 @@ scaler.fit(X_train)
 X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
-for degree in range(1,maxdepth):
-    model = DecisionTreeRegressor(max_depth=degree) 
-    y_pred = np.empty((y_test.shape[0], n_boostraps))
-    for i in range(n_boostraps):
-        x_, y_ = resample(X_train_scaled, y_train)
-        model.fit(x_, y_)
-        y_pred[:, i] = model.predict(X_test_scaled)#.ravel()
-
-    polydegree[degree] = degree
-    error[degree] = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
-    bias[degree] = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
-    variance[degree] = np.mean( np.var(y_pred, axis=1, keepdims=True) )
-    print('Polynomial degree:', degree)
-    print('Error:', error[degree])
-    print('Bias^2:', bias[degree])
-    print('Var:', variance[degree])
-    print('{} >= {} + {} = {}'.format(error[degree], bias[degree], variance[degree], bias[degree]+variance[degree]))
-
-plt.xlim(1,maxdepth)
-plt.plot(polydegree, error, label='Error')
-plt.plot(polydegree, bias, label='bias')
-plt.plot(polydegree, variance, label='Variance')
-plt.legend()
-plt.show()
-
-
-
+# The bagged trees are grown by forest.py on bootstrap index samples in a pool of processes
+# (max_features=None: every split sees all features); its workers need the main guard.
+if __name__ == '__main__':
+    for degree in range(1,maxdepth):
+        model = RandomForest(n_boostraps, max_depth=degree, criterion='mse', max_features=None)
+        model.fit(X_train_scaled, y_train)
+        y_pred = model.tree_predictions(X_test_scaled).T
+
+        polydegree[degree] = degree
+        error[degree] = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
+        bias[degree] = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
+        variance[degree] = np.mean( np.var(y_pred, axis=1, keepdims=True) )
+        print('Polynomial degree:', degree)
+        print('Error:', error[degree])
+        print('Bias^2:', bias[degree])
+        print('Var:', variance[degree])
+        print('{} >= {} + {} = {}'.format(error[degree], bias[degree], variance[degree], bias[degree]+variance[degree]))
+
+    plt.xlim(1,maxdepth)
+    plt.plot(polydegree, error, label='Error')
+    plt.plot(polydegree, bias, label='bias')
+    plt.plot(polydegree, variance, label='Variance')
+    plt.legend()
+    plt.show()
@@ -1,4 +1,6 @@
 
+import os
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
@@ -6,6 +8,9 @@ from sklearn.pipeline import make_pipeline
 from sklearn.utils import resample
 from sklearn.ensemble import RandomForestRegressor
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../Programs/VariousCodes'))
+from resampling import Resampler, StreamingMoments, bias_variance
+
 np.random.seed(2018)
 
 n = 500
@@ -28,18 +33,21 @@ scaler.fit(X_train)
 X_train_scaled = scaler.transform(X_train)
 X_test_scaled = scaler.transform(X_test)
 
+# One bootstrap replicate: resample the training data and fit a forest. Each replicate gets its
+# own generator, spawned from one SeedSequence, so the replicates can run in parallel on a pool of
+# threads (resampling.Resampler) and still give the same result as a serial run.
+def bootstrap_predict(data, rng, i):
+    x_, y_ = resample(X_train_scaled, y_train, random_state=rng.integers(2**31))
+    model = RandomForestRegressor(random_state=rng.integers(2**31))
+    model.fit(x_, y_.ravel())
+    return model.predict(X_test_scaled)
+
 for degree in range(maxdegree):
-    model = RandomForestRegressor()
-    y_pred = np.empty((y_test.shape[0], n_boostraps))
-    for i in range(n_boostraps):
-        x_, y_ = resample(X_train_scaled, y_train)
-        model.fit(x_, y_.ravel())
-        y_pred[:, i] = model.predict(X_test_scaled)
+    # mean and variance of the predictions are accumulated as the replicates come in
+    moments = Resampler('thread', seed=[2018, degree]).run(bootstrap_predict, n_boostraps, aggregate=StreamingMoments)
 
     polydegree[degree] = degree
-    error[degree] = np.mean( np.mean((y_test - y_pred)**2, axis=1, keepdims=True) )
-    bias[degree] = np.mean( (y_test - np.mean(y_pred, axis=1, keepdims=True))**2 )
-    variance[degree] = np.mean( np.var(y_pred, axis=1, keepdims=True) )
+    error[degree], bias[degree], variance[degree] = bias_variance(y_test, moments)
     print('Polynomial degree:', degree)
     print('Error:', error[degree])
     print('Bias^2:', bias[degree])
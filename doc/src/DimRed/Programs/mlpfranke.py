@@ -1,10 +1,14 @@
 # Common imports
+import os
+import sys
 import numpy as np
 from sklearn.neural_network import MLPRegressor
-from sklearn.metrics import accuracy_score
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../Programs/VariousCodes'))
+from gridsearch import GridSearch
+
 def FrankeFunction(x,y):
 	term1 = 0.75*np.exp(-(0.25*(9*x-2)**2) - 0.25*((9*y-2)**2))
 	term2 = 0.75*np.exp(-((9*x+1)**2)/49.0 - 0.1*(9*y+1))
@@ -30,39 +34,43 @@ def create_X(x, y, n ):
 	return X
 
 
-# Making meshgrid of datapoints and compute Franke's function
-n = 4
-N = 100
-x = np.sort(np.random.uniform(0, 1, N))
-y = np.sort(np.random.uniform(0, 1, N))
-z = FrankeFunction(x, y)
-X = create_X(x, y, n=n)    
+def fit_scikit(data, params, budget, rng):
+	dnn = MLPRegressor(hidden_layer_sizes=(n_hidden_neurons), activation='logistic',
+			alpha=params['lmbd'], learning_rate_init=params['eta'], max_iter=budget,
+			random_state=rng.integers(2**31))
+	dnn.fit(data['X'], data['y'])
+	return dnn.score(data['X'], data['y']), dnn
+
 
-# only training data, no advanced splitting
-X_train = X
-Y_train = z
 # only one simple layer with 100 neurons
 n_hidden_neurons = 100
 epochs = 100
-# store models for later use
-eta_vals = np.logspace(-5, 1, 7)
-lmbd_vals = np.logspace(-5, 1, 7)
-# store the models for later use
-DNN_scikit = np.zeros((len(eta_vals), len(lmbd_vals)), dtype=object)
-train_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-sns.set()
-for i, eta in enumerate(eta_vals):
-    for j, lmbd in enumerate(lmbd_vals):
-        dnn = MLPRegressor(hidden_layer_sizes=(n_hidden_neurons), activation='logistic',
-                            alpha=lmbd, learning_rate_init=eta, max_iter=epochs)
-        dnn.fit(X_train, Y_train)
-        DNN_scikit[i][j] = dnn
-        train_accuracy[i][j] = dnn.score(X_train, Y_train)
 
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(train_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Training Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
+if __name__ == '__main__':
+    # Making meshgrid of datapoints and compute Franke's function
+    n = 4
+    N = 100
+    x = np.sort(np.random.uniform(0, 1, N))
+    y = np.sort(np.random.uniform(0, 1, N))
+    z = FrankeFunction(x, y)
+    X = create_X(x, y, n=n)    
+
+    # only training data, no advanced splitting
+    X_train = X
+    Y_train = z
+    eta_vals = np.logspace(-5, 1, 7)
+    lmbd_vals = np.logspace(-5, 1, 7)
+    # grid search in a pool of processes, keeping only the best model
+    search = GridSearch(fit_scikit, {'eta': eta_vals, 'lmbd': lmbd_vals}, {'X': X_train, 'y': Y_train},
+                        keep=1, budgets=[epochs], seed=2018).run()
+    score, params, dnn = search.best[0]
+    print("Best R2 score ", score, " for ", params)
+    train_accuracy = search.grid()
+    sns.set()
 
+    fig, ax = plt.subplots(figsize = (10, 10))
+    sns.heatmap(train_accuracy, annot=True, ax=ax, cmap="viridis")
+    ax.set_title("Training Accuracy")
+    ax.set_ylabel("$\eta$")
+    ax.set_xlabel("$\lambda$")
+    plt.show()
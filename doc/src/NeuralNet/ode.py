@@ -3,69 +3,27 @@ tf.disable_v2_behavior()
 tf.reset_default_graph()
 
 # import necessary packages
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn import datasets
-
-
-# ensure the same random numbers appear every time
-np.random.seed(0)
-
-plt.rcParams['figure.figsize'] = (12,12)
-
-
-# download MNIST dataset
-digits = datasets.load_digits()
-
-# define inputs and labels
-inputs = digits.images
-labels = digits.target
-
-print("inputs = (n_inputs, pixel_width, pixel_height) = " + str(inputs.shape))
-print("labels = (n_inputs) = " + str(labels.shape))
-
-
-# flatten the image
-# the value -1 means dimension is inferred from the remaining dimensions: 8x8 = 64
-n_inputs = len(inputs)
-inputs = inputs.reshape(n_inputs, -1)
-print("X = (n_inputs, n_features) = " + str(inputs.shape))
-
-
-# choose some random images to display
-indices = np.arange(n_inputs)
-random_indices = np.random.choice(indices, size=5)
-
-for i, image in enumerate(digits.images[random_indices]):
-    plt.subplot(1, 5, i+1)
-    plt.axis('off')
-    plt.imshow(image, cmap=plt.cm.gray_r, interpolation='nearest')
-    plt.title("Label: %d" % digits.target[random_indices[i]])
-plt.show()
-
 from keras.utils import to_categorical
 from sklearn.model_selection import train_test_split
+from keras import backend as K
+from keras.models import Sequential
+from keras.layers import Dense
+from keras.regularizers import l2
+from keras.optimizers import SGD
 
-# one-hot representation of labels
-labels = to_categorical(labels)
-
-# split into train and test data
-train_size = 0.8
-test_size = 1 - train_size
-X_train, X_test, Y_train, Y_test = train_test_split(inputs, labels, train_size=train_size,
-                                                    test_size=test_size)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../Programs/VariousCodes'))
+from gridsearch import GridSearch, print_row
 
 epochs = 100
 batch_size = 100
 n_neurons_layer1 = 100
 n_neurons_layer2 = 50
 n_categories = 10
-eta_vals = np.logspace(-5, 1, 7)
-lmbd_vals = np.logspace(-5, 1, 7)
-from keras.models import Sequential
-from keras.layers import Dense
-from keras.regularizers import l2
-from keras.optimizers import SGD
 
 def create_neural_network_keras(n_neurons_layer1, n_neurons_layer2, n_categories, eta, lmbd):
     model = Sequential()
@@ -78,46 +36,91 @@ def create_neural_network_keras(n_neurons_layer1, n_neurons_layer2, n_categories
     
     return model
 
-DNN_keras = np.zeros((len(eta_vals), len(lmbd_vals)), dtype=object)
-        
-for i, eta in enumerate(eta_vals):
-    for j, lmbd in enumerate(lmbd_vals):
-        DNN = create_neural_network_keras(n_neurons_layer1, n_neurons_layer2, n_categories,eta=eta, lmbd=lmbd)
-        DNN.fit(X_train, Y_train, epochs=epochs, batch_size=batch_size, verbose=0)
-        scores = DNN.evaluate(X_test, Y_test)
-        
-        DNN_keras[i][j] = DNN
-        
-        print("Learning rate = ", eta)
-        print("Lambda = ", lmbd)
-        print("Test accuracy: %.3f" % scores[1])
-        print()
-
-import seaborn as sns
-
-sns.set()
-
-train_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-test_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-
-for i in range(len(eta_vals)):
-    for j in range(len(lmbd_vals)):
-        DNN = DNN_keras[i][j]
-
-        train_accuracy[i][j] = DNN.evaluate(X_train, Y_train)[1]
-        test_accuracy[i][j] = DNN.evaluate(X_test, Y_test)[1]
-
-        
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(train_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Training Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
-
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Test Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
+# every training in a fresh keras session, seeded from rng
+def fit_keras(data, params, budget, rng):
+    K.clear_session()
+    seed = rng.integers(2**31)
+    np.random.seed(seed)
+    tf.set_random_seed(seed)
+    DNN = create_neural_network_keras(n_neurons_layer1, n_neurons_layer2, n_categories,
+                                      eta=params['eta'], lmbd=params['lmbd'])
+    DNN.fit(data['X_train'], data['Y_train'], epochs=budget, batch_size=batch_size, verbose=0)
+    return {'train_accuracy': DNN.evaluate(data['X_train'], data['Y_train'], verbose=0)[1],
+            'test_accuracy': DNN.evaluate(data['X_test'], data['Y_test'], verbose=0)[1]}, DNN
+
+if __name__ == '__main__':
+    # ensure the same random numbers appear every time
+    np.random.seed(0)
+
+    plt.rcParams['figure.figsize'] = (12,12)
+
+
+    # download MNIST dataset
+    digits = datasets.load_digits()
+
+    # define inputs and labels
+    inputs = digits.images
+    labels = digits.target
+
+    print("inputs = (n_inputs, pixel_width, pixel_height) = " + str(inputs.shape))
+    print("labels = (n_inputs) = " + str(labels.shape))
+
+
+    # flatten the image
+    # the value -1 means dimension is inferred from the remaining dimensions: 8x8 = 64
+    n_inputs = len(inputs)
+    inputs = inputs.reshape(n_inputs, -1)
+    print("X = (n_inputs, n_features) = " + str(inputs.shape))
+
+
+    # choose some random images to display
+    indices = np.arange(n_inputs)
+    random_indices = np.random.choice(indices, size=5)
+
+    for i, image in enumerate(digits.images[random_indices]):
+        plt.subplot(1, 5, i+1)
+        plt.axis('off')
+        plt.imshow(image, cmap=plt.cm.gray_r, interpolation='nearest')
+        plt.title("Label: %d" % digits.target[random_indices[i]])
+    plt.show()
+
+    # one-hot representation of labels
+    labels = to_categorical(labels)
+
+    # split into train and test data
+    train_size = 0.8
+    test_size = 1 - train_size
+    X_train, X_test, Y_train, Y_test = train_test_split(inputs, labels, train_size=train_size,
+                                                        test_size=test_size)
+
+
+    eta_vals = np.logspace(-5, 1, 7)
+    lmbd_vals = np.logspace(-5, 1, 7)
+
+    # grid search in a pool of processes. TensorFlow needs workers started as fresh
+    # interpreters (spawn), and keras models are only scored, not sent back (keep=0)
+    search = GridSearch(fit_keras, {'eta': eta_vals, 'lmbd': lmbd_vals},
+                        {'X_train': X_train, 'Y_train': Y_train, 'X_test': X_test, 'Y_test': Y_test},
+                        metric='test_accuracy', keep=0, budgets=[epochs], seed=0,
+                        start_method='spawn', report=print_row).run()
+
+    import seaborn as sns
+
+    sns.set()
+
+    train_accuracy = search.grid('train_accuracy')
+    test_accuracy = search.grid('test_accuracy')
+
+    fig, ax = plt.subplots(figsize = (10, 10))
+    sns.heatmap(train_accuracy, annot=True, ax=ax, cmap="viridis")
+    ax.set_title("Training Accuracy")
+    ax.set_ylabel("$\eta$")
+    ax.set_xlabel("$\lambda$")
+    plt.show()
+
+    fig, ax = plt.subplots(figsize = (10, 10))
+    sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
+    ax.set_title("Test Accuracy")
+    ax.set_ylabel("$\eta$")
+    ax.set_xlabel("$\lambda$")
+    plt.show()
@@ -1,6 +1,7 @@
 
 # Common imports
 import os
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -9,6 +10,8 @@ import sklearn.linear_model as skl
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 from sklearn.model_selection import  train_test_split
 from sklearn.svm import SVR
+sys.path.append('../../Programs/VariousCodes')
+from datacache import cached
 
 # Where to save the figures and data files
 PROJECT_ROOT_DIR = "Results"
@@ -34,10 +37,9 @@ def save_fig(fig_id):
     plt.savefig(image_path(fig_id) + ".png", format='png')
 
 #infile = open(data_path("EoS.csv"),'r')
-infile = open(data_path("MassEval2016.dat"),'r')
 # Read the EoS data as  csv file and organize the data into two arrays with density and energies
-# Read the experimental data with Pandas
-Masses = pd.read_fwf(infile, usecols=(2,3,4,6,11),
+# Read the experimental data with Pandas, parsed once and then loaded from a binary cache
+Masses = cached(data_path("MassEval2016.dat"), pd.read_fwf, usecols=(2,3,4,6,11),
               names=('N', 'Z', 'A', 'Element', 'Ebinding'),
               widths=(1,3,5,5,5,1,3,4,1,13,11,11,9,1,2,11,9,1,3,1,12,11,1),
               header=39,
@@ -1,5 +1,6 @@
 # Common imports
 import os
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -8,6 +9,8 @@ from sklearn.model_selection import train_test_split
 from sklearn.utils import resample
 from sklearn.metrics import mean_squared_error
 from IPython.display import display
+sys.path.append('../../Programs/VariousCodes')
+from datacache import cached
 from pylab import plt, mpl
 plt.style.use('seaborn')
 mpl.rcParams['font.family'] = 'serif'
@@ -35,10 +38,9 @@ def data_path(dat_id):
 def save_fig(fig_id):
     plt.savefig(image_path(fig_id) + ".png", format='png')
 
-infile = open(data_path("chddata.csv"),'r')
-
 # Read the chd data as  csv file and organize the data into arrays with age group, age, and chd
-chd = pd.read_csv(infile, names=('ID', 'Age', 'Agegroup', 'CHD'))
+# (parsed once and then loaded from a binary cache)
+chd = cached(data_path("chddata.csv"), pd.read_csv, names=('ID', 'Age', 'Agegroup', 'CHD'))
 chd.columns = ['ID', 'Age', 'Agegroup', 'CHD']
 output = chd['CHD']
 age = chd['Age']
@@ -15,6 +15,8 @@ import pandas as pd
 import seaborn as sns
 sns.set()
 import math
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../Programs/VariousCodes'))
+from resampling import Resampler, StreamingMoments
 
 from sklearn.model_selection import train_test_split, cross_val_score, KFold
 from sklearn.preprocessing import StandardScaler
@@ -26,11 +28,16 @@ from sklearn.utils import resample
 
 # Bootstrap
 
-def Bootstrap(x1,x2, y, N_boot=500, method = 'ols', degrees = 5, random_state = 42):
+def Bootstrap(x1,x2, y, N_boot=500, method = 'ols', degrees = 5, random_state = 42, n_workers = None):
     """
     Computes bias^2, variance and the mean squared error using bootstrap resampling method
     for the provided data and the method.
     
+    The bootstrap samples are fitted in parallel on a pool of threads (resampling.Resampler). Every
+    sample is drawn with its own generator spawned from random_state, so the result does not depend
+    on the number of workers. The predictions and betas are not stored, their mean and variance over
+    the samples are accumulated as the fits come in (resampling.StreamingMoments).
+    
     Arguments:
     x1: 1D numpy array, covariate
     x2: 1D numpy array, covariate
@@ -38,27 +45,26 @@ def Bootstrap(x1,x2, y, N_boot=500, method = 'ols', degrees = 5, random_state =
     method: string type, accepts 'ols', 'ridge' or 'lasso' as arguments
     degree: integer type, polynomial degree for generating the design matrix
     random_state: integer, ensures the same split when using the train_test_split functionality
+                  and the same bootstrap samples
+    n_workers: integer, the number of threads (default: number of cores)
     
     Returns: Bias_vec, Var_vec, MSE_vec, betaVariance_vec
              numpy arrays. Bias, Variance, MSE and the variance of beta for the predicted model
     """
     ##split x1, x2 and y arrays as a train and test data and generate design matrix
     x1_train, x1_test,x2_train, x2_test, y_train, y_test = train_test_split(x1,x2, y, test_size=0.2, random_state = random_state)
-    y_pred_test = np.zeros((y_test.shape[0], N_boot))
-    X_test = designMatrix(x1_test, x2_test, degrees)
-    
-    betaMatrix = np.zeros((X_test.shape[1], N_boot))
+    X_test_raw = designMatrix(x1_test, x2_test, degrees)
     
-    ##resample and fit the corresponding method on the train data
-    for i in range(N_boot):
-        x1_,x2_, y_ = resample(x1_train, x2_train, y_train)
+    def replicate(data, rng, i):
+        ##resample and fit the corresponding method on the train data
+        idx = rng.integers(0, len(y_train), len(y_train))
+        x1_, x2_, y_ = x1_train[idx], x2_train[idx], y_train[idx]
         X_train = designMatrix(x1_, x2_, degrees)
         scaler = StandardScaler()
         scaler.fit(X_train)
         X_train = scaler.transform(X_train)
         X_train[:, 0] = 1
-        X_test = designMatrix(x1_test, x2_test, degrees)
-        X_test = scaler.transform(X_test)
+        X_test = scaler.transform(X_test_raw)
         X_test[:, 0] = 1
         
         if method == 'ols':
@@ -70,22 +76,25 @@ def Bootstrap(x1,x2, y, N_boot=500, method = 'ols', degrees = 5, random_state =
         if method == 'lasso':
             manual_regression = linregOwn(method = 'lasso')
             beta =  manual_regression.fit(X_train, y_, lambda_ = 0.05)
-            
-        ##predict on the same test data
-        y_pred_test[:, i] = np.dot(X_test, beta)
-        betaMatrix[:, i] = beta
-    y_test = y_test.reshape(len(y_test),1) 
+        
+        ##predict on the same test data, one vector with the prediction followed by beta
+        return np.concatenate((np.dot(X_test, beta), beta))
+    
+    moments = Resampler('thread', n_workers, random_state).run(replicate, N_boot, aggregate=StreamingMoments)
+    n_test = len(y_test)
+    y_pred_mean, beta_mean = moments.mean[:n_test], moments.mean[n_test:]
+    y_pred_m2, beta_m2 = moments.m2[:n_test], moments.m2[n_test:]
       
     Bias_vec = []
     Var_vec  = []
     MSE_vec  = []
     betaVariance_vec = []
     R2_score = []
-    y_test = y_test.reshape(len(y_test),1)
-    MSE = np.mean( np.mean((y_test - y_pred_test)**2, axis=1, keepdims=True) )
-    bias = np.mean( (y_test - np.mean(y_pred_test, axis=1, keepdims=True))**2 )
-    variance = np.mean( np.var(y_pred_test, axis=1, keepdims=True) )
-    betaVariance = np.var(betaMatrix, axis=1)
+    ## MSE = mean_i mean_b (y_i - y_pred_ib)^2 = bias^2 + variance
+    bias = np.mean( (y_test - y_pred_mean)**2 )
+    variance = np.mean( y_pred_m2/N_boot )
+    MSE = bias + variance
+    betaVariance = beta_m2/N_boot
     print("-------------------------------------------------------------")
     print("Degree: %d" % degrees)
     print('MSE:', np.round(MSE, 3))
@@ -149,6 +158,9 @@ class CrossValidation:
         x2_shuff = x2[shf]
         y_shuff = y[shf]
         
+        if getattr(self.LinearRegression, 'method', None) in ('ols', 'ridge'):
+            return self._kFoldLinear(x1_shuff, x2_shuff, y_shuff, k, M, degree)
+        
         for i in range(k):
             # x_k and y_k are the hold out data for fold k
             x1_k = x1_shuff[i*M:(i+1)*M]
@@ -188,6 +200,65 @@ class CrossValidation:
         #print('Bias: {}' .format(np.round(np.mean(bias_k),3)))
         #print('MSE_train {}' .format(np.round(np.mean(MSE_train),3)))
         return means
+    
+    def _kFoldLinear(self, x1, x2, y, k, M, degree):
+        """
+        kFoldCV for OLS and Ridge without refitting on every fold. The design matrix is built once,
+        and the train data of fold i has the Gram matrix X^T X - X_i^T X_i, X_i being the rows of fold i.
+        The scaling of the train data is an affine map of the columns, X_scaled = X A, so the scaled Gram
+        matrix is A^T (X^T X - X_i^T X_i) A, with the means and standard deviations read off the same
+        matrix (the first column of X is the intercept). Only a p x p system is solved per fold.
+        
+        Arguments:
+        x1, x2, y: shuffled 1D numpy arrays
+        k: integer, the number of splits
+        M: integer, the size of each fold
+        degree: integer type, the number of polynomials, complexity parameter
+        """
+        lambda_ = self.lambda_ if self.LinearRegression.method == 'ridge' else 0
+        X = self.DesignMatrix(x1, x2, degree)
+        n, p = X.shape
+        XTX, XTy, yTy = np.dot(X.T, X), np.dot(X.T, y), np.dot(y, y)
+        
+        MSE_train = []
+        MSE_k     = []
+        R2_k      = []
+        var_k     = []
+        bias_k    = []
+        
+        for i in range(k):
+            X_k = X[i*M:(i+1)*M]
+            y_k = y[i*M:(i+1)*M]
+            
+            ## statistics of the train data, and the scaling x -> (x - mean)/std as a matrix A
+            n_train = n - M
+            G_train = XTX - np.dot(X_k.T, X_k)
+            b_train = XTy - np.dot(X_k.T, y_k)
+            mean = G_train[0]/n_train
+            std = np.sqrt(np.maximum(np.diag(G_train)/n_train - mean**2, 0))
+            std[0] = 1
+            A = np.diag(1/std)
+            A[0, 1:] = -mean[1:]/std[1:]
+            G_scaled = np.dot(A.T, np.dot(G_train, A))
+            G_scaled[np.diag_indices(p)] += lambda_
+            b_scaled = np.dot(A.T, b_train)
+            beta = np.linalg.solve(G_scaled, b_scaled)
+            G_scaled[np.diag_indices(p)] -= lambda_
+            
+            ## train error |y - X beta|^2 = y^T y - 2 beta^T X^T y + beta^T X^T X beta
+            rss_train = yTy - np.dot(y_k, y_k) - 2*np.dot(beta, b_scaled) + np.dot(beta, np.dot(G_scaled, beta))
+            MSE_train.append(rss_train/n_train)
+            
+            ## Predict on the hold out data and calculate statistic of interest
+            y_predict = np.dot(X_k, np.dot(A, beta))
+            MSE_k.append(np.sum((y_k-y_predict)**2, axis=0, keepdims=True)/len(y_predict))
+            R2_k.append(1.0 - np.sum((y_k - y_predict)**2, axis=0, keepdims=True) / np.sum((y_k - np.mean(y_k))**2, axis=0, keepdims=True) )
+            var_k.append(np.var(y_predict,axis=0, keepdims=True))
+            bias_k.append((y_k - np.mean(y_predict, axis=0, keepdims=True))**2 )
+        
+        means = [np.mean(MSE_k), np.mean(R2_k), np.mean(var_k), 
+                 np.mean(bias_k),np.mean(MSE_train)]
+        return means
 
 
 # Franke Function
@@ -241,6 +312,7 @@ class linregOwn:
         self._R2            = None
         self._betaVariance  = None
         self.lambda_        = None
+        self._svdCache      = None
         
     def fit(self, X_train, y_train, lambda_ = 0):
         """
@@ -284,11 +356,9 @@ class linregOwn:
         """
         self.X_train = X_train
         self.y_test = y_train
-        U, S, VT = np.linalg.svd(self.X_train, full_matrices=True)
-        S_inverse = np.zeros(shape=self.X_train.shape)
-        ##S is a vector, with shape of the number of columns
-        S_inverse[:S.shape[0], :S.shape[0]] = np.diag(1/S)
-        self.beta = np.dot(VT.T, np.dot(S_inverse.T, np.dot(U.T, self.y_train)))
+        U, S, VT = self._svd(X_train)
+        ##thin SVD: U is m x p, so no m x m matrices are formed. beta = V S^-1 U^T y
+        self.beta = np.dot(VT.T, np.dot(U.T, self.y_train)/S)
         #self.beta = np.linalg.inv(np.dot(X.T,X)).dot(X.T, y)
         
     def _ridgeFit(self, X_train, y_train, lambda_):
@@ -308,7 +378,18 @@ class linregOwn:
         self.X_train = X_train
         self.y_train = y_train
         self.lambda_ = lambda_
-        self.beta = np.dot(np.linalg.inv(np.dot(X_train.T,X_train) + self.lambda_ * np.eye(X_train.shape[1])), np.dot(X_train.T,y_train))
+        ##same thin SVD for every lambda: beta = V (S^2 + lambda I)^-1 S U^T y
+        U, S, VT = self._svd(X_train)
+        self.beta = np.dot(VT.T, S/(S**2 + self.lambda_)*np.dot(U.T, y_train))
+    
+    def _svd(self, X_train):
+        """
+        Thin SVD of the design matrix. It is cached, so refitting on the same X_train
+        (e.g. Ridge for many lambdas) does not factorize again.
+        """
+        if self._svdCache is None or self._svdCache[0] is not X_train:
+            self._svdCache = (X_train, np.linalg.svd(X_train, full_matrices=False))
+        return self._svdCache[1]
     
     def _lassoFitSKL(self, X_train, y_train, lambda_):
         """
@@ -497,13 +578,19 @@ def designMatrix(x, y, k=5):
     k: integer type. complexity parameter (i.e polynomial degree) 
     """
     
-    xb = np.ones((x.size, 1))
-    
+    ## powers x^i, y^i are computed once and the columns are written into a preallocated array
+    px = np.ones((k+1, x.size))
+    py = np.ones((k+1, y.size))
     for i in range(1, k+1):
+        px[i] = px[i-1]*x
+        py[i] = py[i-1]*y
+    xb = np.empty((x.size, (k+1)*(k+2)//2))
+    col = 0
+    for i in range(k+1):
         for j in range(i+1):
-            xb = np.c_[xb, (x**(i-j))*(y**j)]
+            np.multiply(px[i-j], py[j], out=xb[:, col])
+            col += 1
 
-    xb[:, 0] = 1
     return xb
 
 
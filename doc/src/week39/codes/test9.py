@@ -37,13 +37,12 @@ X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
 
 nlambdas = 10
 lmbd_vals = np.logspace(-4, 0, nlambdas)
-MSERidgePredict = np.zeros(nlambdas)
-for i in range(nlambdas):
-    lmb = lmbd_vals[i]
-    RegRidge = linear_model.Ridge(lmb,fit_intercept=False)
-    RegRidge.fit(X_train,y_train)
-    ypredictRidge = RegRidge.predict(X_test)
-    MSERidgePredict[i] = MSE(y_test,ypredictRidge)
+# Ridge (no intercept) for all lambdas from one thin SVD of X_train:
+# beta(lambda) = V diag(s/(s^2+lambda)) U^T y, one column per lambda
+U, s, VT = np.linalg.svd(X_train, full_matrices=False)
+BetaRidge = VT.T @ ((s/(s**2 + lmbd_vals.reshape(-1,1))).T * (U.T @ y_train).reshape(-1,1))
+ypredictRidge = X_test @ BetaRidge
+MSERidgePredict = np.mean((y_test.reshape(-1,1) - ypredictRidge)**2, axis=0)
 
 beta = np.random.randn(X_train.shape[1],1)
 loss = np.mean((y_train.reshape(-1,1) - X_train@beta)**2)
@@ -8,7 +8,7 @@ import matplotlib.pyplot as plt
 from sklearn import datasets
 
 def sigmoid(x):
-    return 1/(1 + np.exp(-x))
+    return 0.5*(np.tanh(x/2) + 1)
 
 def feed_forward(X):
     # weighted sum of inputs to the hidden layer
@@ -18,7 +18,7 @@ def feed_forward(X):
     
     # weighted sum of inputs to the output layer
     z_o = np.matmul(a_h, output_weights) + output_bias
-    # softmax output
+    # sigmoid output
     # axis 0 holds each input and axis 1 the probabilities of each category
     probabilities = sigmoid(z_o)
     return probabilities
@@ -33,8 +33,11 @@ def predict(X):
 # ensure the same random numbers appear every time
 np.random.seed(0)
 
+# precision of the data and the weights; np.float32 halves the memory and is about twice as fast in matmul
+dtype = np.float64
+
 # Design matrix
-X = np.array([ [0, 0], [0, 1], [1, 0],[1, 1]],dtype=np.float64)
+X = np.array([ [0, 0], [0, 1], [1, 0],[1, 1]],dtype=dtype)
 
 # The XOR gate
 yXOR = np.array( [ 0, 1 ,1, 0])
@@ -52,12 +55,12 @@ n_features = 2
 # we make the weights normally distributed using numpy.random.randn
 
 # weights and bias in the hidden layer
-hidden_weights = np.random.randn(n_features, n_hidden_neurons)
-hidden_bias = np.zeros(n_hidden_neurons) + 0.01
+hidden_weights = np.random.randn(n_features, n_hidden_neurons).astype(dtype)
+hidden_bias = np.zeros(n_hidden_neurons, dtype=dtype) + 0.01
 
 # weights and bias in the output layer
-output_weights = np.random.randn(n_hidden_neurons, n_categories)
-output_bias = np.zeros(n_categories) + 0.01
+output_weights = np.random.randn(n_hidden_neurons, n_categories).astype(dtype)
+output_bias = np.zeros(n_categories, dtype=dtype) + 0.01
 
 probabilities = feed_forward(X)
 print(probabilities)
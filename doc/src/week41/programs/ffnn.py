@@ -1,62 +1,57 @@
 
 # import necessary packages
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.neural_network import MLPClassifier
-from sklearn.metrics import accuracy_score
 import seaborn as sns
 
-# ensure the same random numbers appear every time
-np.random.seed(0)
-
-# Design matrix
-X = np.array([ [0, 0], [0, 1], [1, 0],[1, 1]],dtype=np.float64)
-
-# The XOR gate
-yXOR = np.array( [ 0, 1 ,1, 0])
-# The OR gate
-yOR = np.array( [ 0, 1 ,1, 1])
-# The AND gate
-yAND = np.array( [ 0, 0 ,0, 1])
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../Programs/VariousCodes'))
+from gridsearch import GridSearch, print_row
 
 # Defining the neural network
-n_inputs, n_features = X.shape
 n_hidden_neurons = 2
 n_categories = 2
-n_features = 2
-
-eta_vals = np.logspace(-5, 1, 7)
-lmbd_vals = np.logspace(-5, 1, 7)
-# store models for later use
-DNN_scikit = np.zeros((len(eta_vals), len(lmbd_vals)), dtype=object)
-epochs = 100
-batch_size = 100
-
-for i, eta in enumerate(eta_vals):
-    for j, lmbd in enumerate(lmbd_vals):
-        dnn = MLPClassifier(hidden_layer_sizes=(n_hidden_neurons), activation='logistic',
-                            alpha=lmbd, learning_rate_init=eta, max_iter=epochs)
-        dnn.fit(X, yXOR)
-        DNN_scikit[i][j] = dnn
-        print("Learning rate  = ", eta)
-        print("Lambda = ", lmbd)
-        print("Accuracy score on data set: ", dnn.score(X, yXOR))
-        print()
 
-sns.set()
-test_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-for i in range(len(eta_vals)):
-    for j in range(len(lmbd_vals)):
-        dnn = DNN_scikit[i][j]
-        test_pred = dnn.predict(X)
-        test_accuracy[i][j] = accuracy_score(yXOR, test_pred)
-
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Test Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
+def fit_scikit(data, params, budget, rng):
+    dnn = MLPClassifier(hidden_layer_sizes=(n_hidden_neurons), activation='logistic',
+                        alpha=params['lmbd'], learning_rate_init=params['eta'], max_iter=budget,
+                        random_state=rng.integers(2**31))
+    dnn.fit(data['X'], data['y'])
+    return dnn.score(data['X'], data['y']), dnn
+
+if __name__ == '__main__':
+    # Design matrix
+    X = np.array([ [0, 0], [0, 1], [1, 0],[1, 1]],dtype=np.float64)
+
+    # The XOR gate
+    yXOR = np.array( [ 0, 1 ,1, 0])
+    # The OR gate
+    yOR = np.array( [ 0, 1 ,1, 1])
+    # The AND gate
+    yAND = np.array( [ 0, 0 ,0, 1])
+
+    eta_vals = np.logspace(-5, 1, 7)
+    lmbd_vals = np.logspace(-5, 1, 7)
+    epochs = 100
+
+    # grid search in a pool of processes, with the same random numbers every time (seed),
+    # keeping only the best model
+    search = GridSearch(fit_scikit, {'eta': eta_vals, 'lmbd': lmbd_vals}, {'X': X, 'y': yXOR},
+                        keep=1, budgets=[epochs], seed=0, report=print_row).run()
+    score, params, dnn = search.best[0]
+    print("Best accuracy ", score, " for ", params)
+
+    sns.set()
+    test_accuracy = search.grid()
+
+    fig, ax = plt.subplots(figsize = (10, 10))
+    sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
+    ax.set_title("Test Accuracy")
+    ax.set_ylabel("$\eta$")
+    ax.set_xlabel("$\lambda$")
+    plt.show()
 
 
 
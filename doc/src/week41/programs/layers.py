@@ -0,0 +1,426 @@
+"""
+Layered feed-forward neural network with preallocated buffers.
+
+A network is a stack of Dense layers, z = a W + b, each followed by an
+activation (sigmoid, tanh or ReLU for the hidden layers) and, at the
+output, by softmax or sigmoid. With the cross-entropy cost the error of the
+output layer is simply
+
+    delta_L = probabilities - Y,
+
+and backpropagation runs as in nnown.py, layer by layer:
+
+    dC/dW_l = a_{l-1}^T delta_l,   dC/db_l = sum over the batch of delta_l,
+    delta_{l-1} = (delta_l W_l^T) * f'(z_{l-1}).
+
+All arrays a step needs, the activations, the errors delta and the
+temporaries of f', are allocated once for every batch size and reused;
+matmul and the ufuncs write into them with out=, and the activations are
+computed in place in the buffer of z. The gradients and the updates of the
+weights and biases are done in place as well, so a training step allocates
+no arrays at all. The weight decay lambda is applied as W <- (1 - eta lambda) W,
+which is the same update as adding lambda W to the gradient.
+
+Minibatches serves the training data epoch by epoch: the rows are permuted
+once per epoch, and the batches are consecutive pieces of the permutation,
+so every epoch visits every row exactly once at O(n) cost. A batch is
+gathered with np.take into a reused buffer, optionally on a background
+thread while the previous batch is being trained on (numpy releases the GIL
+while copying), or the whole shuffled data set is copied once per epoch and
+the batches are views of it.
+
+The dtype of a network is that of its weights, activations and gradients.
+float32 halves the memory and roughly doubles the matmul throughput of
+CPU BLAS. With master_weights the updates are accumulated in float64
+copies of the weights, which are rounded to float32 after every step, so
+small updates eta*gradient are not lost against large weights. The cost
+can be multiplied by loss_scale during backpropagation (and the gradients
+divided by it in the update) to keep small gradients from underflowing.
+With loss_scale='dynamic' the scale starts at 2^15, a step whose gradients
+are not finite is skipped and halves the scale, and the scale is doubled
+again after 2000 good steps.
+
+The kernels below work in place and cannot overflow: the sigmoid is
+evaluated as (1 + tanh(x/2))/2, softmax subtracts the largest logit of
+every row before exponentiating, and the cross-entropies are computed from
+the logits,
+
+    log softmax(z)_k = z_k - m - log sum_j exp(z_j - m),   m = max_j z_j,
+    -y log p - (1 - y) log(1 - p) = log(1 + e^z) - y z,   p = sigmoid(z),
+
+so large logits give large finite costs instead of log(0) = -inf and NaN.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+# Number of rows evaluated at a time by predict_probabilities
+BATCH = 4096
+
+
+def sigmoid(x, out=None):
+    """
+    1/(1 + exp(-x)) = (1 + tanh(x/2))/2 without overflow, in place with out=x.
+    """
+    out = np.multiply(x, 0.5, out=out)
+    np.tanh(out, out=out)
+    np.multiply(out, 0.5, out=out)
+    np.add(out, 0.5, out=out)
+    return out
+
+
+def softmax(z, out=None, work=None):
+    """
+    Softmax of every row of z; out=z works in place, work is a (rows x 1)
+    buffer for the row maxima and sums.
+    """
+    out = np.empty_like(z) if out is None else out
+    work = np.empty((len(z), 1), dtype=z.dtype) if work is None else work
+    np.max(z, axis=1, keepdims=True, out=work)
+    np.subtract(z, work, out=out)
+    np.exp(out, out=out)
+    np.sum(out, axis=1, keepdims=True, out=work)
+    np.divide(out, work, out=out)
+    return out
+
+
+def log_softmax(z, out=None, work=None):
+    """
+    Logarithm of the softmax of every row of z, see the module docstring.
+    """
+    out = np.empty_like(z) if out is None else out
+    work = np.empty((len(z), 1), dtype=z.dtype) if work is None else work
+    np.max(z, axis=1, keepdims=True, out=work)
+    np.subtract(z, work, out=out)
+    np.logaddexp.reduce(out, axis=1, keepdims=True, out=work)
+    np.subtract(out, work, out=out)
+    return out
+
+
+def softmax_cross_entropy(z, Y, out=None, work=None):
+    """
+    Mean cross-entropy of the logits z (rows x classes) and the one-hot Y,
+    and its gradient with respect to z times the number of rows, softmax(z)
+    - Y, written to out (out=z works in place).
+    """
+    out = log_softmax(z, out, work)
+    cost = -np.vdot(Y, out)/len(z)
+    np.exp(out, out=out)
+    np.subtract(out, Y, out=out)
+    return cost, out
+
+
+def sigmoid_cross_entropy(z, Y, out=None):
+    """
+    Mean (over the rows) cross-entropy of independent sigmoid outputs with
+    logits z and targets Y, and the gradient sigmoid(z) - Y in out, which
+    must not be z.
+    """
+    out = np.empty_like(z) if out is None else out
+    cost = -np.vdot(Y, z)
+    np.logaddexp(0, z, out=out)
+    cost = (cost + np.sum(out))/len(z)
+    sigmoid(z, out=out)
+    np.subtract(out, Y, out=out)
+    return cost, out
+
+
+class Sigmoid:
+    def forward(self, a):
+        sigmoid(a, out=a)
+
+    def backward(self, a, delta, tmp):
+        # delta *= a (1 - a)
+        np.subtract(1, a, out=tmp)
+        np.multiply(tmp, a, out=tmp)
+        np.multiply(delta, tmp, out=delta)
+
+
+class Tanh:
+    def forward(self, a):
+        np.tanh(a, out=a)
+
+    def backward(self, a, delta, tmp):
+        # delta *= 1 - a^2
+        np.multiply(a, a, out=tmp)
+        np.subtract(1, tmp, out=tmp)
+        np.multiply(delta, tmp, out=delta)
+
+
+class ReLU:
+    def forward(self, a):
+        np.maximum(a, 0, out=a)
+
+    def backward(self, a, delta, tmp):
+        np.greater(a, 0, out=tmp)
+        np.multiply(delta, tmp, out=delta)
+
+
+class Softmax:
+    def forward(self, a, work):
+        softmax(a, out=a, work=work)
+
+    def cost(self, z, Y, buffers):
+        # cross-entropy of the logits z, which are overwritten
+        return softmax_cross_entropy(z, Y, out=z, work=buffers['total'])[0]
+
+
+class SigmoidOutput(Sigmoid):
+    # output layers take a work buffer, like Softmax
+    def forward(self, a, work):
+        sigmoid(a, out=a)
+
+    def cost(self, z, Y, buffers):
+        return sigmoid_cross_entropy(z, Y, out=buffers['delta'][-1])[0]
+
+
+ACTIVATIONS = {'sigmoid': Sigmoid, 'tanh': Tanh, 'relu': ReLU}
+
+
+class Dense:
+    """
+    Fully connected layer with weights (n_inputs x n_outputs) and biases of
+    the given dtype, and float64 master copies of them with master_weights.
+    """
+    def __init__(self, n_inputs, n_outputs, dtype=np.float64, master_weights=False):
+        self.weights = np.random.randn(n_inputs, n_outputs).astype(dtype)
+        self.bias = (np.zeros(n_outputs) + 0.01).astype(dtype)
+        self.weights_gradient = np.zeros_like(self.weights)
+        self.bias_gradient = np.zeros_like(self.bias)
+        self.master = None
+        if master_weights:
+            self.master = (self.weights.astype(np.float64), self.bias.astype(np.float64))
+
+    def forward(self, a_in, z):
+        np.matmul(a_in, self.weights, out=z)
+        np.add(z, self.bias, out=z)
+
+    def backward(self, a_in, delta, delta_in=None):
+        np.matmul(a_in.T, delta, out=self.weights_gradient)
+        np.sum(delta, axis=0, out=self.bias_gradient)
+        if delta_in is not None:
+            np.matmul(delta, self.weights.T, out=delta_in)
+
+    def update(self, eta, lmbd=0.0, scale=1.0):
+        """
+        SGD step with the gradients divided by scale.
+        """
+        weights, bias = self.master if self.master is not None else (self.weights, self.bias)
+        if lmbd > 0.0:
+            np.multiply(weights, 1 - eta*lmbd, out=weights)
+        np.multiply(self.weights_gradient, eta/scale, out=self.weights_gradient)
+        np.subtract(weights, self.weights_gradient, out=weights)
+        np.multiply(self.bias_gradient, eta/scale, out=self.bias_gradient)
+        np.subtract(bias, self.bias_gradient, out=bias)
+        if self.master is not None:
+            np.copyto(self.weights, weights, casting='same_kind')
+            np.copyto(self.bias, bias, casting='same_kind')
+
+    def finite(self):
+        # the sums are inf or nan if any gradient is
+        return np.isfinite(np.sum(self.weights_gradient)) and np.isfinite(np.sum(self.bias_gradient))
+
+
+class Minibatches:
+    """
+    Minibatches of the rows of X and Y, see the module docstring. The last
+    batch of an epoch holds the remaining rows. With copy=True the epoch is
+    a shuffled copy of the data (twice the memory, no gathering per batch);
+    otherwise each batch is gathered into one of two reused buffers, with
+    prefetch=True the next one on a background thread. The batches are only
+    valid until the next one is requested. rng is a Generator or np.random.
+    """
+    def __init__(self, X, Y, batch_size, rng=None, copy=False, prefetch=False):
+        self.X, self.Y = X, Y
+        self.n_inputs = len(X)
+        self.batch_size = min(batch_size, self.n_inputs)
+        self.rng = np.random if rng is None else rng
+        self.copy = copy
+        self.prefetch = prefetch and not copy
+        if copy:
+            self._X, self._Y = np.empty_like(X), np.empty_like(Y)
+        self._buffers = {}
+
+    def __len__(self):
+        # batches per epoch
+        return -(-self.n_inputs//self.batch_size)
+
+    def _buffer(self, size, k):
+        # buffer k (0 or 1) for batches of the given size
+        if (size, k) not in self._buffers:
+            self._buffers[size, k] = (np.empty((size,) + self.X.shape[1:], dtype=self.X.dtype),
+                                      np.empty((size,) + self.Y.shape[1:], dtype=self.Y.dtype))
+        return self._buffers[size, k]
+
+    def _gather(self, rows, k):
+        X_batch, Y_batch = self._buffer(len(rows), k)
+        np.take(self.X, rows, axis=0, out=X_batch)
+        np.take(self.Y, rows, axis=0, out=Y_batch)
+        return X_batch, Y_batch
+
+    def epoch(self):
+        """
+        The batches (X_batch, Y_batch) of one epoch.
+        """
+        permutation = self.rng.permutation(self.n_inputs)
+        starts = range(0, self.n_inputs, self.batch_size)
+        if self.copy:
+            np.take(self.X, permutation, axis=0, out=self._X)
+            np.take(self.Y, permutation, axis=0, out=self._Y)
+            for start in starts:
+                yield self._X[start:start + self.batch_size], self._Y[start:start + self.batch_size]
+        elif not self.prefetch:
+            for start in starts:
+                yield self._gather(permutation[start:start + self.batch_size], 0)
+        else:
+            with ThreadPoolExecutor(1) as pool:
+                batches = [permutation[start:start + self.batch_size] for start in starts]
+                pending = pool.submit(self._gather, batches[0], 0)
+                for k in range(len(batches)):
+                    batch = pending.result()
+                    # batch k - 1 has been trained on, so its buffer takes batch k + 1
+                    if k + 1 < len(batches):
+                        pending = pool.submit(self._gather, batches[k + 1], (k + 1) % 2)
+                    yield batch
+
+
+class Network:
+    """
+    Dense layers of the given sizes (inputs, hidden layers..., outputs), with
+    the activation after every hidden layer and softmax or sigmoid output.
+    dtype, master_weights and loss_scale are explained in the module
+    docstring.
+    """
+    def __init__(self, sizes, activation='sigmoid', output='softmax', dtype=np.float64,
+                 master_weights=False, loss_scale=1.0):
+        if output not in ('softmax', 'sigmoid'):
+            raise ValueError("output must be 'softmax' or 'sigmoid'")
+        self.sizes = tuple(sizes)
+        self.dtype = np.dtype(dtype)
+        self.dynamic = loss_scale == 'dynamic'
+        self.loss_scale = 2.0**15 if self.dynamic else float(loss_scale)
+        self._good_steps = 0
+        self.layers = [Dense(n_in, n_out, dtype, master_weights) for n_in, n_out in zip(self.sizes[:-1], self.sizes[1:])]
+        self.activations = [ACTIVATIONS[activation]() for layer in self.layers[:-1]]
+        self.output = Softmax() if output == 'softmax' else SigmoidOutput()
+        self._buffers = {}
+
+    def buffers(self, batch_size):
+        """
+        The activations, errors and temporaries of every layer for a batch
+        of batch_size rows, allocated the first time that size is seen.
+        """
+        if batch_size not in self._buffers:
+            self._buffers[batch_size] = {
+                'a': [np.empty((batch_size, n), dtype=self.dtype) for n in self.sizes[1:]],
+                'delta': [np.empty((batch_size, n), dtype=self.dtype) for n in self.sizes[1:]],
+                'tmp': [np.empty((batch_size, n), dtype=self.dtype) for n in self.sizes[1:-1]],
+                'total': np.empty((batch_size, 1), dtype=self.dtype)}
+        return self._buffers[batch_size]
+
+    def feed_forward(self, X, logits=False):
+        """
+        Output probabilities of the rows of X (the logits z of the output
+        layer with logits=True), a view of the buffer of the output layer
+        (overwritten by the next call with the same batch size).
+        """
+        buffers = self.buffers(len(X))
+        a = X
+        for layer, activation, z in zip(self.layers, self.activations, buffers['a']):
+            layer.forward(a, z)
+            activation.forward(z)
+            a = z
+        z = buffers['a'][-1]
+        self.layers[-1].forward(a, z)
+        if not logits:
+            self.output.forward(z, buffers['total'])
+        return z
+
+    def backpropagation(self, X, Y):
+        """
+        Gradients of the cross-entropy of the last feed_forward(X) with
+        respect to all weights and biases, times loss_scale.
+        """
+        buffers = self.buffers(len(X))
+        a, delta = buffers['a'], buffers['delta']
+        np.subtract(a[-1], Y, out=delta[-1])
+        if self.loss_scale != 1.0:
+            np.multiply(delta[-1], self.loss_scale, out=delta[-1])
+        for l in range(len(self.layers) - 1, 0, -1):
+            self.layers[l].backward(a[l - 1], delta[l], delta[l - 1])
+            self.activations[l - 1].backward(a[l - 1], delta[l - 1], buffers['tmp'][l - 1])
+        self.layers[0].backward(X, delta[0])
+
+    def update(self, eta, lmbd=0.0):
+        if self.dynamic:
+            if not all(layer.finite() for layer in self.layers):
+                self.loss_scale /= 2
+                self._good_steps = 0
+                return
+            self._good_steps += 1
+            if self._good_steps == 2000:
+                self.loss_scale *= 2
+                self._good_steps = 0
+        for layer in self.layers:
+            layer.update(eta, lmbd, self.loss_scale)
+
+    def train_step(self, X, Y, eta, lmbd=0.0):
+        self.feed_forward(X)
+        self.backpropagation(X, Y)
+        self.update(eta, lmbd)
+
+    def predict_probabilities(self, X, batch_size=BATCH):
+        probabilities = np.empty((len(X), self.sizes[-1]), dtype=self.dtype)
+        for start in range(0, len(X), batch_size):
+            stop = min(start + batch_size, len(X))
+            probabilities[start:stop] = self.feed_forward(np.asarray(X[start:stop], dtype=self.dtype))
+        return probabilities
+
+    def predict(self, X):
+        return np.argmax(self.predict_probabilities(X), axis=1)
+
+    def cost(self, X, Y, batch_size=BATCH):
+        """
+        Mean cross-entropy of the predictions for X and the targets Y,
+        computed from the logits.
+        """
+        total = 0.0
+        for start in range(0, len(X), batch_size):
+            stop = min(start + batch_size, len(X))
+            z = self.feed_forward(np.asarray(X[start:stop], dtype=self.dtype), logits=True)
+            total += (stop - start)*self.output.cost(z, np.asarray(Y[start:stop], dtype=self.dtype),
+                                                     self.buffers(stop - start))
+        return total/len(X)
+
+
+if __name__ == '__main__':
+    # Accuracy parity of float32, with and without master weights, against float64: the same
+    # seeded network is trained on the digits data (1797 rows, 64 -> 30 -> 10) for 100 epochs
+    # of batches of 100, i.e. 1800 steps. The gradients are summed over the batch, so eta must
+    # be small: at eta = 5e-4 the probabilities agree to about 1e-6, while at eta = 5e-3 the
+    # float32 and float64 trajectories can drift apart after about 1000 steps.
+    from sklearn.datasets import load_digits
+
+    X, y = load_digits(return_X_y=True)
+    X = X/16.0
+    Y = np.eye(10)[y]
+
+    def train(dtype, master_weights, eta=5e-4, epochs=100):
+        np.random.seed(2018)
+        network = Network((64, 30, 10), dtype=dtype, master_weights=master_weights)
+        batches = Minibatches(X.astype(dtype), Y.astype(dtype), 100, rng=np.random.default_rng(2018))
+        for epoch in range(epochs):
+            for X_batch, Y_batch in batches.epoch():
+                network.train_step(X_batch, Y_batch, eta)
+        return network.predict_probabilities(X).astype(np.float64)
+
+    reference = train(np.float64, False)
+    accuracy = np.mean(np.argmax(reference, axis=1) == y)
+    for name, master_weights in (('float32', False), ('float32 + master weights', True)):
+        probabilities = train(np.float32, master_weights)
+        difference = np.max(np.abs(probabilities - reference))
+        accuracy32 = np.mean(np.argmax(probabilities, axis=1) == y)
+        print("%-25s accuracy %.4f (float64 %.4f), largest probability difference %.1e"
+              % (name, accuracy32, accuracy, difference))
+        assert difference < 1e-4, "probabilities differ from float64 by %g" % difference
+        assert abs(accuracy32 - accuracy) <= 0.002, "accuracy differs from float64"
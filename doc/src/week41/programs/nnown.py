@@ -1,10 +1,16 @@
 
 # import necessary packages
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.neural_network import MLPClassifier
 from sklearn.metrics import accuracy_score
 import seaborn as sns
+from layers import Network, Minibatches
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../../Programs/VariousCodes'))
+from gridsearch import GridSearch, print_row
 
 # ensure the same random numbers appear every time
 np.random.seed(0)
@@ -26,11 +32,16 @@ n_hidden_neurons = 2
 n_categories = 2
 n_features = 2
 
-def sigmoid(x):
-    return 1/(1 + np.exp(-x))
-
-
 class NeuralNetwork:
+    """
+    Feed-forward network trained with minibatch SGD, built from the layers
+    of layers.py. n_hidden_neurons is the size of the hidden layer, or a
+    tuple of sizes for several hidden layers. Y_data are one-hot vectors or
+    integer labels. Every epoch trains on all rows once, in iterations
+    batches; with prefetch the next batch is gathered on a background thread.
+    dtype=np.float32 trains in single precision, see layers.py for
+    master_weights and loss_scale.
+    """
     def __init__(
             self,
             X_data,
@@ -40,10 +51,17 @@ class NeuralNetwork:
             epochs=10,
             batch_size=100,
             eta=0.1,
-            lmbd=0.0):
-
-        self.X_data_full = X_data
-        self.Y_data_full = Y_data
+            lmbd=0.0,
+            activation='sigmoid',
+            output='sigmoid',
+            prefetch=False,
+            dtype=np.float64,
+            master_weights=False,
+            loss_scale=1.0):
+
+        # the data are converted once to the dtype of the network
+        self.X_data_full = np.asarray(X_data, dtype=dtype)
+        self.Y_data_full = np.asarray(Y_data if np.ndim(Y_data) == 2 else np.eye(n_categories)[Y_data], dtype=dtype)
 
         self.n_inputs = X_data.shape[0]
         self.n_features = X_data.shape[1]
@@ -52,59 +70,26 @@ class NeuralNetwork:
 
         self.epochs = epochs
         self.batch_size = batch_size
-        self.iterations = self.n_inputs // self.batch_size
+        self.iterations = -(-self.n_inputs // self.batch_size)
+        self.prefetch = prefetch
         self.eta = eta
         self.lmbd = lmbd
 
-        self.create_biases_and_weights()
-
-        
-    def create_biases_and_weights(self):
-        self.hidden_weights = np.random.randn(self.n_features, self.n_hidden_neurons)
-        self.hidden_bias = np.zeros(self.n_hidden_neurons) + 0.01
-
-        self.output_weights = np.random.randn(self.n_hidden_neurons, self.n_categories)
-        self.output_bias = np.zeros(self.n_categories) + 0.01
+        hidden = tuple(np.atleast_1d(n_hidden_neurons))
+        self.network = Network((self.n_features,) + hidden + (n_categories,), activation, output,
+                               dtype, master_weights, loss_scale)
 
     def feed_forward(self):
         # feed-forward for training
-        self.z_h = np.matmul(self.X_data, self.hidden_weights) + self.hidden_bias
-        self.a_h = sigmoid(self.z_h)
-
-        self.z_o = np.matmul(self.a_h, self.output_weights) + self.output_bias
-
-        exp_term = sigmoid(self.z_o)
-        self.probabilities = exp_term
+        self.probabilities = self.network.feed_forward(self.X_data)
 
     def feed_forward_out(self, X):
         # feed-forward for output
-        z_h = np.matmul(X, self.hidden_weights) + self.hidden_bias
-        a_h = sigmoid(z_h)
-
-        z_o = np.matmul(a_h, self.output_weights) + self.output_bias
-        
-        exp_term = sigmoid(z_o)
-        probabilities = exp_term 
-        return probabilities
+        return self.network.predict_probabilities(X)
 
     def backpropagation(self):
-        error_output = self.probabilities - self.Y_data
-        error_hidden = np.matmul(error_output, self.output_weights.T) * self.a_h * (1 - self.a_h)
-
-        self.output_weights_gradient = np.matmul(self.a_h.T, error_output)
-        self.output_bias_gradient = np.sum(error_output, axis=0)
-
-        self.hidden_weights_gradient = np.matmul(self.X_data.T, error_hidden)
-        self.hidden_bias_gradient = np.sum(error_hidden, axis=0)
-
-        if self.lmbd > 0.0:
-            self.output_weights_gradient += self.lmbd * self.output_weights
-            self.hidden_weights_gradient += self.lmbd * self.hidden_weights
-
-        self.output_weights -= self.eta * self.output_weights_gradient
-        self.output_bias -= self.eta * self.output_bias_gradient
-        self.hidden_weights -= self.eta * self.hidden_weights_gradient
-        self.hidden_bias -= self.eta * self.hidden_bias_gradient
+        self.network.backpropagation(self.X_data, self.Y_data)
+        self.network.update(self.eta, self.lmbd)
 
     def predict(self, X):
         probabilities = self.feed_forward_out(X)
@@ -115,58 +100,40 @@ class NeuralNetwork:
         return probabilities
 
     def train(self):
-        data_indices = np.arange(self.n_inputs)
+        # the rows are permuted once per epoch and served in batches (see layers.py)
+        batches = Minibatches(self.X_data_full, self.Y_data_full, self.batch_size, prefetch=self.prefetch)
 
         for i in range(self.epochs):
-            for j in range(self.iterations):
-                # pick datapoints with replacement
-                chosen_datapoints = np.random.choice(
-                    data_indices, size=self.batch_size, replace=False
-                )
-
-                # minibatch training data
-                self.X_data = self.X_data_full[chosen_datapoints]
-                self.Y_data = self.Y_data_full[chosen_datapoints]
-
+            for self.X_data, self.Y_data in batches.epoch():
                 self.feed_forward()
                 self.backpropagation()
 
+def fit_numpy(data, params, budget, rng):
+    np.random.seed(rng.integers(2**31))
+    dnn = NeuralNetwork(data['X'], data['y'], eta=params['eta'], lmbd=params['lmbd'], epochs=budget,
+                        batch_size=batch_size, n_hidden_neurons=n_hidden_neurons, n_categories=n_categories)
+    dnn.train()
+    return accuracy_score(data['y'], dnn.predict(data['X'])), dnn
+
 epochs = 100
 batch_size = 100
 
-eta_vals = np.logspace(-5, 1, 7)
-lmbd_vals = np.logspace(-5, 1, 7)
-# store the models for later use
-DNN_numpy = np.zeros((len(eta_vals), len(lmbd_vals)), dtype=object)
-
-# grid search
-for i, eta in enumerate(eta_vals):
-    for j, lmbd in enumerate(lmbd_vals):
-        dnn = NeuralNetwork(X, yXOR, eta=eta, lmbd=lmbd, epochs=epochs, batch_size=batch_size,
-                            n_hidden_neurons=n_hidden_neurons, n_categories=n_categories)
-        dnn.train()
-        DNN_numpy[i][j] = dnn
-        test_predict = dnn.predict(X)
-        print("Learning rate  = ", eta)
-        print("Lambda = ", lmbd)
-        print("Accuracy score on test set: ", accuracy_score(yXOR, test_predict))
-        print()
-
-sns.set()
-test_accuracy = np.zeros((len(eta_vals), len(lmbd_vals)))
-
-for i in range(len(eta_vals)):
-    for j in range(len(lmbd_vals)):
-        dnn = DNN_numpy[i][j]
-        test_pred = dnn.predict(X)
-        test_accuracy[i][j] = accuracy_score(yXOR, test_pred)
-
-fig, ax = plt.subplots(figsize = (10, 10))
-sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
-ax.set_title("Test Accuracy")
-ax.set_ylabel("$\eta$")
-ax.set_xlabel("$\lambda$")
-plt.show()
-
-
-
+if __name__ == '__main__':
+    eta_vals = np.logspace(-5, 1, 7)
+    lmbd_vals = np.logspace(-5, 1, 7)
+
+    # grid search in a pool of processes, keeping only the best network
+    search = GridSearch(fit_numpy, {'eta': eta_vals, 'lmbd': lmbd_vals}, {'X': X, 'y': yXOR},
+                        keep=1, budgets=[epochs], seed=0, report=print_row).run()
+    score, params, dnn = search.best[0]
+    print("Best accuracy ", score, " for ", params)
+
+    sns.set()
+    test_accuracy = search.grid()
+
+    fig, ax = plt.subplots(figsize = (10, 10))
+    sns.heatmap(test_accuracy, annot=True, ax=ax, cmap="viridis")
+    ax.set_title("Test Accuracy")
+    ax.set_ylabel("$\eta$")
+    ax.set_xlabel("$\lambda$")
+    plt.show()
@@ -8,7 +8,7 @@ from mpl_toolkits.mplot3d import axes3d
 ## Set up the network
 
 def sigmoid(z):
-    return 1/(1 + np.exp(-z))
+    return 0.5*(np.tanh(z/2) + 1)
 
 def deep_neural_network(deep_params, x):
     # x is now a point and a 1D numpy array; make it a column vector
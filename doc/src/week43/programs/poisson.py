@@ -4,7 +4,7 @@ import autograd.numpy.random as npr
 from matplotlib import pyplot as plt
 
 def sigmoid(z):
-    return 1/(1 + np.exp(-z))
+    return 0.5*(np.tanh(z/2) + 1)
 
 def deep_neural_network(deep_params, x):
     # N_hidden is the number of hidden layers
@@ -42,7 +42,7 @@ def cost_function(P, x, t):
 
 ## The neural network
 def sigmoid(z):
-    return 1/(1 + np.exp(-z))
+    return 0.5*(np.tanh(z/2) + 1)
 
 def deep_neural_network(deep_params, x):
     # x is now a point and a 1D numpy array; make it a column vector